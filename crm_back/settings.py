@@ -69,9 +69,20 @@ INSTALLED_APPS = [
 
 
 MIDDLEWARE = [
+    # Per-request read replica routing (outermost, so it sees every write)
+    'trainers.middleware.ReplicaRoutingMiddleware',
+    # Query count / DB time per request, Server-Timing header (QUERY_BUDGET_ENABLED)
+    'trainers.query_budget.QueryBudgetMiddleware',
+    # Latency / query count per view for /metrics (METRICS_ENABLED)
+    'trainers.metrics.MetricsMiddleware',
+    # gzip/brotli for large JSON API bodies (trainers/json_api.py)
+    'trainers.json_api.JsonCompressionMiddleware',
     'django.middleware.security.SecurityMiddleware',
-    'whitenoise.middleware.WhiteNoiseMiddleware', 
+    # WhiteNoiseMiddleware with an async __call__ (whitenoise 6 is sync only)
+    'trainers.middleware.StaticFilesMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
+    # Renew the session only when its remaining lifetime gets short
+    'trainers.middleware.SlidingSessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
@@ -121,6 +132,81 @@ elif len(sys.argv) > 1 and sys.argv[1] != 'collectstatic':
         "default": dj_database_url.parse(os.environ.get("DATABASE_URL")),
     }
 
+# WAL, synchronous=NORMAL, a busy timeout and BEGIN IMMEDIATE on SQLite
+# databases (trainers/sqlite_tuning.py), applied below through OPTIONS.
+# Off unless SQLITE_TUNING=True: WAL is a persistent change to the file.
+SQLITE_TUNING = os.getenv("SQLITE_TUNING", "False") == "True"
+
+# Read replica for the reporting views (see trainers/db_router.py)
+# e.g. DATABASE_REPLICA_URL=postgres://... or sqlite:///replica.sqlite3
+if os.getenv("DATABASE_REPLICA_URL") and "DATABASES" in globals():
+    DATABASES["replica"] = dj_database_url.parse(os.environ.get("DATABASE_REPLICA_URL"))
+
+DATABASE_ROUTERS = ['trainers.db_router.ReplicaRouter']
+
+if SQLITE_TUNING and "DATABASES" in globals():
+    from trainers.sqlite_tuning import sqlite_options
+
+    for database in DATABASES.values():
+        if database["ENGINE"] == "django.db.backends.sqlite3":
+            database.setdefault("OPTIONS", {}).update(sqlite_options())
+
+# URL names whose GET reads may be served by the replica
+REPLICA_READ_VIEWS = [
+    'api_financial_report',
+    'api_monthly_breakdown',
+    'api_daily_breakdown',
+    'api_timeseries',
+    'export_xls',
+    'export_data',
+    'dashboard',
+]
+
+# Per-request query budgets (trainers/query_budget.py): on in DEBUG and tests,
+# QUERY_BUDGET=True turns it on in production (warnings only)
+RUNNING_TESTS = len(sys.argv) > 1 and sys.argv[1] == 'test'
+QUERY_BUDGET_ENABLED = os.getenv("QUERY_BUDGET", str(DEBUG or RUNNING_TESTS)) == "True"
+QUERY_BUDGET_RAISE = RUNNING_TESTS
+
+# In-process metrics served at /metrics (trainers/metrics.py). Every gunicorn
+# worker writes its snapshot to METRICS_DIR: clear it when the server starts.
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", str(not RUNNING_TESTS)) == "True"
+METRICS_DIR = os.getenv("METRICS_DIR", os.path.join(BASE_DIR, "metrics"))
+# Scraper credential: "Authorization: Bearer <METRICS_TOKEN>" (superusers can always read)
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+
+# Route the I/O-bound endpoints (document upload, invoice PDF, financial report)
+# to their async views. crm_back/asgi.py turns it on: under WSGI every async
+# view would need its own event loop.
+ASYNC_VIEWS = os.getenv("ASYNC_VIEWS", "False") == "True"
+
+# JSON APIs (trainers/json_api.py): largest ?per_page= served, and the body
+# size from which responses are compressed
+API_MAX_PER_PAGE = int(os.getenv("API_MAX_PER_PAGE", "200"))
+JSON_COMPRESS_MIN_BYTES = int(os.getenv("JSON_COMPRESS_MIN_BYTES", "1024"))
+# Most points a chart series returns (trainers/payments/timeseries.py): longer
+# ranges get coarser buckets, the daily/monthly breakdowns answer 400
+TIMESERIES_MAX_POINTS = int(os.getenv("TIMESERIES_MAX_POINTS", "120"))
+
+# Per-organization token buckets and cost limits of the expensive endpoints
+# (trainers/throttling.py). THROTTLE_CACHE must be shared between workers
+# (Redis...) for the limits to hold server-wide.
+THROTTLE_ENABLED = os.getenv("THROTTLE_ENABLED", str(not RUNNING_TESTS)) == "True"
+THROTTLE_CACHE = "default"
+# Per-scope overrides of trainers.throttling.DEFAULT_RATES, e.g.
+# THROTTLE_RATES = {"export": (20, 60)}
+THROTTLE_RATES = {}
+# Behind a reverse proxy the client address is the last X-Forwarded-For entry
+THROTTLE_BEHIND_PROXY = os.getenv("THROTTLE_BEHIND_PROXY", "False") == "True"
+# Signup availability checks (trainers/availability.py): the Bloom filter of
+# taken usernames/slugs is rebuilt from the database this often
+AVAILABILITY_REFRESH_SECONDS = int(os.getenv("AVAILABILITY_REFRESH_SECONDS", "600"))
+# Files sent through the public registration form are written here and pushed
+# to storage by process_storage_ops, which must see the same directory
+UPLOAD_STAGING_ROOT = os.getenv("UPLOAD_STAGING_ROOT", str(BASE_DIR / "upload_staging"))
+# Longest ?start=/?end= range of the financial reports and charts
+REPORT_MAX_RANGE_DAYS = int(os.getenv("REPORT_MAX_RANGE_DAYS", "3660"))
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
@@ -174,6 +260,19 @@ STORAGES = {
            "BACKEND": "whitenoise.storage.CompressedManifestStaticFilesStorage",
        },
    }
+
+# Local filesystem stand-in for Cloudinary (offline development / tests)
+LOCAL_MEDIA_STORAGE = os.getenv("LOCAL_MEDIA_STORAGE", "False") == "True"
+if LOCAL_MEDIA_STORAGE:
+    MEDIA_ROOT = BASE_DIR / 'media'
+    STORAGES["default"] = {
+        "BACKEND": "django.core.files.storage.FileSystemStorage",
+    }
+
+# Generated invoice PDFs (bounded on-disk LRU, see trainers/payments/invoice_cache.py)
+INVOICE_CACHE_DIR = os.getenv("INVOICE_CACHE_DIR", os.path.join(BASE_DIR, "invoice_cache"))
+INVOICE_CACHE_MAX_BYTES = int(os.getenv("INVOICE_CACHE_MAX_MB", "200")) * 1024 * 1024
+
 CKEDITOR_BASEPATH = "/static/ckeditor/"
 CLOUDINARY_STORAGE = {
     'CLOUD_NAME': os.getenv('CLOUDINARY_CLOUD_NAME'),
@@ -254,18 +353,31 @@ CSRF_TRUSTED_ORIGINS = [
 
 
 
+# Hits/misses per key namespace are counted for /metrics
+CACHES = {
+    'default': {
+        'BACKEND': 'trainers.metrics.MeteredLocMemCache',
+    }
+}
+
 # Production - use Redis (uncomment when ready)
 # CACHES = {
 #     'default': {
-#         'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+#         'BACKEND': 'trainers.metrics.MeteredRedisCache',
 #         'LOCATION': 'redis://127.0.0.1:6379/1',
 #         'TIMEOUT': 300,
 #     }
 # }
 
 # Session Settings
+# cached_db: reads from the cache, writes through to the database.
+# SESSION_ENGINE=django.contrib.sessions.backends.signed_cookies keeps them out of the database.
+SESSION_ENGINE = os.getenv("SESSION_ENGINE", "django.contrib.sessions.backends.cached_db")
 SESSION_COOKIE_AGE = 86400  # 24 hours
-SESSION_SAVE_EVERY_REQUEST = True
+# Sliding expiry without a write per request (trainers.middleware.SlidingSessionMiddleware):
+# re-save once less than this share of the session lifetime is left
+SESSION_SAVE_EVERY_REQUEST = False
+SESSION_RENEW_THRESHOLD = 0.5
 
 #email
 EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
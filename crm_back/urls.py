@@ -18,8 +18,10 @@ from django.contrib import admin
 from django.urls import path,include
 from django.conf import settings
 from django.conf.urls.static import static
+from trainers.metrics import metrics_view
 
 urlpatterns = [
     path('nojoum_admin/', admin.site.urls),
     path('',include('trainers.urls')),
+    path('metrics', metrics_view, name='metrics'),
 ]
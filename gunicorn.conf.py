@@ -0,0 +1,48 @@
+"""
+Gunicorn settings, read from the working directory: `gunicorn crm_back.wsgi`
+
+preload_app imports Django once in the master; when_ready then warms the URL
+resolver, templates and invoice fonts (trainers/warmup.py) before any worker
+is forked, so workers start warm and share those pages copy-on-write.
+GUNICORN_WARM_CACHES=True also runs warm_caches in the master, which seeds
+the per-process LocMem cache of every worker.
+
+ASGI (async views, see settings.ASYNC_VIEWS):
+    GUNICORN_WORKER_CLASS=uvicorn_worker.UvicornWorker gunicorn crm_back.asgi:application
+"""
+import multiprocessing
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+worker_class = os.getenv('GUNICORN_WORKER_CLASS', 'sync')
+# One event loop per core serves many requests; sync workers serve one each
+ASGI = worker_class.startswith('uvicorn')
+workers = int(os.getenv(
+    'WEB_CONCURRENCY',
+    multiprocessing.cpu_count() if ASGI else multiprocessing.cpu_count() * 2 + 1,
+))
+timeout = int(os.getenv('GUNICORN_TIMEOUT', '120'))
+preload_app = os.getenv('GUNICORN_PRELOAD', 'True') == 'True'
+accesslog = '-'
+
+WARM_CACHES = os.getenv('GUNICORN_WARM_CACHES', 'False') == 'True'
+
+
+def when_ready(server):
+    """Master, after preload, before the first fork"""
+    if not preload_app:
+        return
+    from trainers.warmup import warm_process
+
+    timings = warm_process()
+    server.log.info(
+        'Warm start: urls %.0f ms, %d templates %.0f ms, invoice fonts %.0f ms',
+        timings['urls'] * 1000, timings['templates_compiled'],
+        timings['templates'] * 1000, timings['invoice_fonts'] * 1000,
+    )
+    if WARM_CACHES:
+        from django.core.management import call_command
+        from django.db import connections
+
+        call_command('warm_caches')
+        connections.close_all()
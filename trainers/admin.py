@@ -4,6 +4,8 @@ from django.contrib.auth.models import User
 from trainers.models import *
 from django.utils import timezone
 from django.utils.html import format_html
+from django.db.models import Count, OuterRef, Q, Subquery, Sum
+from django.db.models.functions import Coalesce
 
 class OrganizationFilter(admin.SimpleListFilter):
     """Filter by organization for superusers"""
@@ -12,7 +14,7 @@ class OrganizationFilter(admin.SimpleListFilter):
 
     def lookups(self, request, model_admin):
         if request.user.is_superuser:
-            return [(org.id, org.name) for org in OrganizationInfo.objects.all()]
+            return list(OrganizationInfo.objects.values_list('id', 'name'))
         return []
 
     def queryset(self, request, queryset):
@@ -41,6 +43,8 @@ class OrganizationAdmin(admin.ModelAdmin):
 
 class BaseOrganizationAdmin(admin.ModelAdmin):
     """Base admin for models with organization field"""
+    # Large tenants: skip the unfiltered COUNT(*) on every changelist
+    show_full_result_count = False
     
     def get_queryset(self, request):
         qs = super().get_queryset(request)
@@ -91,18 +95,16 @@ class PaymentsAdmin(BaseOrganizationAdmin):
     list_display = ['trainer', 'paymentCategry', 'paymentAmount', 'paymentdate']
     list_filter = ['paymentCategry', 'paymentdate']
     search_fields = ['trainer__first_name', 'trainer__last_name']
-    date_hierarchy = 'paymentdate'
-    
-    def get_queryset(self, request):
-        qs = super().get_queryset(request)
-        return qs.select_related('trainer', 'organization')
+    date_hierarchy = 'paymentdate'  # (organization, paymentdate) index
+    list_select_related = ['trainer']
+    autocomplete_fields = ['trainer']
 
 
 class ArticleAdmin(BaseOrganizationAdmin):
     list_display = ['title', 'category', 'area', 'date', 'costs', 'participetion_price']
     list_filter = ['category', 'area', 'date']
     search_fields = ['title', 'location']
-    filter_horizontal = ['trainees']
+    autocomplete_fields = ['trainees']
     date_hierarchy = 'date'
 
 
@@ -124,10 +126,8 @@ class StaffAdmin(BaseOrganizationAdmin):
     list_display = ['user', 'organization', 'role', 'is_admin', 'salary', 'started']
     list_filter = ['is_admin', 'started']
     search_fields = ['user__username', 'user__email', 'role']
-    
-    def get_queryset(self, request):
-        qs = super().get_queryset(request)
-        return qs.select_related('user', 'organization')
+    list_select_related = ['user', 'organization']
+    raw_id_fields = ['user']
 
 
 class EmailedAdmin(BaseOrganizationAdmin):
@@ -135,10 +135,21 @@ class EmailedAdmin(BaseOrganizationAdmin):
     list_filter = ['category', 'sent_successfully', 'datetime']
     search_fields = ['user__first_name', 'user__last_name', 'email']
     date_hierarchy = 'datetime'
-    
-    def get_queryset(self, request):
-        qs = super().get_queryset(request)
-        return qs.select_related('user', 'organization')
+    list_select_related = ['user']
+    autocomplete_fields = ['user']
+
+@admin.register(StorageOperation)
+class StorageOperationAdmin(admin.ModelAdmin):
+    list_display = ['operation', 'name', 'status', 'attempts', 'run_after', 'claimed_at', 'updated_at']
+    list_filter = ['status', 'operation']
+    search_fields = ['name']
+    readonly_fields = ['created_at', 'updated_at']
+    actions = ['retry_operations']
+
+    def retry_operations(self, request, queryset):
+        updated = queryset.update(status='pending', attempts=0, run_after=timezone.now(), claimed_at=None)
+        self.message_user(request, f"تمت إعادة جدولة {updated} عملية")
+    retry_operations.short_description = "إعادة المحاولة"
 
 @admin.register(OrganizationPayment)
 class OrganizationPaymentAdmin(admin.ModelAdmin):
@@ -161,6 +172,10 @@ class OrganizationPaymentAdmin(admin.ModelAdmin):
         'organization__name',
         'notes'
     ]
+    list_select_related = ['organization', 'processed_by']
+    autocomplete_fields = ['organization']
+    raw_id_fields = ['processed_by']
+    show_full_result_count = False
     readonly_fields = [
         'subscription_start',
         'subscription_end',
@@ -232,6 +247,7 @@ class OrganizationInfoAdmin(admin.ModelAdmin):
         'slug',
         'email'
     ]
+    show_full_result_count = False
     readonly_fields = [
         'subscription_status_display',
         'days_remaining_display',
@@ -277,6 +293,16 @@ class OrganizationInfoAdmin(admin.ModelAdmin):
     )
     
     actions = ['activate_organizations', 'deactivate_organizations', 'check_expiration']
+
+    def get_queryset(self, request):
+        # Active trainee counts in the same query as the changelist
+        # (a subquery, so the paginator's COUNT stays a plain count)
+        active_trainers = Trainer.objects.filter(
+            organization=OuterRef('pk'), is_active=True
+        ).order_by().values('organization').annotate(count=Count('pk')).values('count')
+        return super().get_queryset(request).annotate(
+            active_trainers=Coalesce(Subquery(active_trainers), 0)
+        )
     
     def subscription_status_display(self, obj):
         status = obj.get_subscription_status_display()
@@ -318,9 +344,12 @@ class OrganizationInfoAdmin(admin.ModelAdmin):
     subscription_period_display.short_description = "فترة الاشتراك"
     
     def trainer_count(self, obj):
-        count = obj.trainers.filter(is_active=True).count()
+        count = getattr(obj, 'active_trainers', None)
+        if count is None:
+            count = obj.trainers.filter(is_active=True).count()
         return f"{count} / {obj.max_trainers}"
     trainer_count.short_description = "عدد المتدربين"
+    trainer_count.admin_order_field = 'active_trainers'
     
     def activate_organizations(self, request, queryset):
         updated = queryset.update(is_active=True)
@@ -333,16 +362,16 @@ class OrganizationInfoAdmin(admin.ModelAdmin):
     deactivate_organizations.short_description = "إلغاء تفعيل الجمعيات المختارة"
     
     def check_expiration(self, request, queryset):
-        expired_count = 0
-        for org in queryset:
-            if org.is_expired():
-                org.is_active = False
-                org.save()
-                expired_count += 1
+        checked = queryset.count()
+        expired = OrganizationInfo.objects.with_subscription_state().filter(
+            pk__in=queryset.values('pk'),
+            subscription_state=SUB_STATE_EXPIRED,
+        )
+        expired_count = expired.update(is_active=False)
         
         self.message_user(
             request,
-            f"تم فحص {queryset.count()} جمعية. تم إلغاء تفعيل {expired_count} جمعية منتهية"
+            f"تم فحص {checked} جمعية. تم إلغاء تفعيل {expired_count} جمعية منتهية"
         )
     check_expiration.short_description = "فحص الاشتراكات المنتهية"
 
@@ -354,50 +383,37 @@ class SubscriptionAdminSite(admin.AdminSite):
     index_title = "لوحة تحكم الاشتراكات"
     
     def index(self, request, extra_context=None):
-        from django.db.models import Count, Sum, Q
         from datetime import timedelta
         
         today = timezone.now().date()
         
-        # Statistics
-        total_orgs = OrganizationInfo.objects.count()
-        active_orgs = OrganizationInfo.objects.filter(is_active=True).count()
-        
-        # Expiring soon (next 30 days)
-        expiring_soon = OrganizationInfo.objects.filter(
-            subscription_end_date__lte=today + timedelta(days=30),
-            subscription_end_date__gte=today
-        ).count()
-        
-        # Expired
-        expired = OrganizationInfo.objects.filter(
-            subscription_end_date__lt=today
-        ).count()
-        
-        # Recent payments (last 30 days)
-        recent_payments = OrganizationPayment.objects.filter(
-            payment_date__gte=today - timedelta(days=30)
+        # All dashboard numbers in one query (revenue joins the payments,
+        # so organization counts are DISTINCT)
+        stats = OrganizationInfo.objects.aggregate(
+            total_orgs=Count('id', distinct=True),
+            active_orgs=Count('id', distinct=True, filter=Q(is_active=True)),
+            # Expiring soon (next 30 days)
+            expiring_soon=Count('id', distinct=True, filter=Q(
+                subscription_end_date__lte=today + timedelta(days=30),
+                subscription_end_date__gte=today,
+            )),
+            expired=Count('id', distinct=True, filter=Q(subscription_end_date__lt=today)),
+            # Recent payments (last 30 days)
+            total_revenue=Sum(
+                'subscription_payments__amount',
+                filter=Q(subscription_payments__payment_date__gte=today - timedelta(days=30)),
+            ),
         )
-        
-        total_revenue = recent_payments.aggregate(
-            total=Sum('amount')
-        )['total'] or 0
+        stats['total_revenue'] = stats['total_revenue'] or 0
         
         # Organizations needing attention
         needs_attention = OrganizationInfo.objects.filter(
-            Q(subscription_end_date__lte=today + timedelta(days=7)) |
-            Q(subscription_end_date__lt=today)
+            subscription_end_date__lte=today + timedelta(days=7)
         ).order_by('subscription_end_date')[:10]
         
         extra_context = extra_context or {}
-        extra_context.update({
-            'total_orgs': total_orgs,
-            'active_orgs': active_orgs,
-            'expiring_soon': expiring_soon,
-            'expired': expired,
-            'total_revenue': total_revenue,
-            'needs_attention': needs_attention,
-        })
+        extra_context.update(stats)
+        extra_context['needs_attention'] = needs_attention
         
         return super().index(request, extra_context)
 
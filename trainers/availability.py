@@ -0,0 +1,174 @@
+"""
+Username / organization slug availability
+The signup form checks availability on every keystroke. Taken names are kept
+in a Bloom filter per kind, built from the database and shared through the
+cache: a name the filter does not contain is available without a query, a
+possible hit (taken, or a false positive) is confirmed with exists().
+
+- the filter is rebuilt every AVAILABILITY_REFRESH_SECONDS by one worker
+  (the others keep answering from the previous one meanwhile)
+- names saved in between are added by the post_save signals in models.py and
+  a version key makes every worker reload the updated filter
+- deleted / renamed names stay in the filter until the next rebuild: they
+  only cost the confirmation query
+
+A name added by two workers at the same moment may be lost until the next
+rebuild; signup() validates again on submit, so this only affects the hint.
+
+The filter needs a cache shared by every worker (Redis...): with a
+per-process cache (LocMem) a worker would never see the names taken through
+the others, so every check then goes to the database.
+"""
+import hashlib
+import math
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+
+from .metrics import Counter
+from .models import OrganizationInfo
+from .warmup import cache_is_shared
+
+AVAILABILITY_CHECKS = Counter(
+    'crm_availability_checks_total', 'Username/slug availability checks', ('kind', 'result')
+)
+
+KINDS = {
+    # kind: (model, field)
+    'username': (User, 'username'),
+    'slug': (OrganizationInfo, 'slug'),
+}
+REFRESH_SECONDS = getattr(settings, 'AVAILABILITY_REFRESH_SECONDS', 600)
+FALSE_POSITIVE_RATE = 0.01
+# Room for the names saved between two rebuilds
+MIN_CAPACITY = 1024
+BUILD_LOCK_SECONDS = 60
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter of strings (double hashing over one blake2b digest)"""
+
+    def __init__(self, size, hashes, bits=None):
+        self.size = size
+        self.hashes = hashes
+        self.bits = bytearray(bits) if bits is not None else bytearray((size + 7) // 8)
+
+    @classmethod
+    def for_capacity(cls, capacity, false_positive_rate=FALSE_POSITIVE_RATE):
+        size = max(8, math.ceil(-capacity * math.log(false_positive_rate) / math.log(2) ** 2))
+        hashes = max(1, round(size / capacity * math.log(2)))
+        return cls(size, hashes)
+
+    def _positions(self, value):
+        digest = hashlib.blake2b(value.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hashes)]
+
+    def add(self, value):
+        for position in self._positions(value):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, value):
+        bits = self.bits
+        return all(bits[position >> 3] & (1 << (position & 7)) for position in self._positions(value))
+
+
+# ======================================================
+# Shared filters
+# ======================================================
+# cache  availability:<kind>          {'size', 'hashes', 'bits', 'built', 'version'}
+#        availability:<kind>:version  bumped on every add
+# process _local[kind] = (BloomFilter, version, built)
+
+_local = {}
+
+
+def _key(kind):
+    return f'availability:{kind}'
+
+
+def build_filter(kind):
+    """Filter of every taken name of `kind`, stored in the cache"""
+    model, field = KINDS[kind]
+    names = list(model.objects.values_list(field, flat=True).iterator(chunk_size=5000))
+    bloom = BloomFilter.for_capacity(max(MIN_CAPACITY, len(names) * 2))
+    for name in names:
+        bloom.add(name)
+    version = _next_version(kind)
+    built = time.time()
+    cache.set(_key(kind), {
+        'size': bloom.size, 'hashes': bloom.hashes, 'bits': bytes(bloom.bits),
+        'built': built, 'version': version,
+    }, None)
+    _local[kind] = (bloom, version, built)
+    return bloom
+
+
+def _next_version(kind):
+    key = f'{_key(kind)}:version'
+    cache.add(key, 0, None)
+    try:
+        return cache.incr(key)
+    except ValueError:  # evicted between add and incr
+        cache.set(key, 1, None)
+        return 1
+
+
+def _load(kind):
+    """(BloomFilter, version, built) from the cache, or None"""
+    stored = cache.get(_key(kind))
+    if stored is None:
+        return None
+    loaded = (BloomFilter(stored['size'], stored['hashes'], stored['bits']), stored['version'], stored['built'])
+    _local[kind] = loaded
+    return loaded
+
+
+def get_filter(kind):
+    """
+    Current filter of `kind`, or None while another worker builds the first one
+    Costs one cache read (the version) when the process copy is up to date.
+    """
+    version = cache.get(f'{_key(kind)}:version')
+    loaded = _local.get(kind)
+    if loaded is None or loaded[1] != version:
+        loaded = _load(kind)
+
+    if loaded is None or time.time() - loaded[2] > REFRESH_SECONDS:
+        if cache.add(f'{_key(kind)}:building', 1, BUILD_LOCK_SECONDS):
+            try:
+                return build_filter(kind)
+            finally:
+                cache.delete(f'{_key(kind)}:building')
+    return loaded[0] if loaded else None
+
+
+def mark_taken(kind, name):
+    """Add a newly saved name to the shared filter (no-op when already there)"""
+    loaded = _local.get(kind) or _load(kind)
+    if loaded is None or name in loaded[0]:
+        return  # not built yet: the first build reads it from the database
+    stored = cache.get(_key(kind))
+    if stored is None:
+        return
+    bloom = BloomFilter(stored['size'], stored['hashes'], stored['bits'])
+    bloom.add(name)
+    stored['bits'] = bytes(bloom.bits)
+    stored['version'] = _next_version(kind)
+    cache.set(_key(kind), stored, None)
+    _local[kind] = (bloom, stored['version'], stored['built'])
+
+
+def is_taken(kind, name):
+    """True when a `kind` named `name` exists; a query only on a possible hit"""
+    bloom = get_filter(kind) if cache_is_shared() else None
+    if bloom is not None and name not in bloom:
+        AVAILABILITY_CHECKS.inc(kind=kind, result='filter')
+        return False
+    model, field = KINDS[kind]
+    taken = model.objects.filter(**{field: name}).exists()
+    AVAILABILITY_CHECKS.inc(kind=kind, result='taken' if taken else 'false_positive' if bloom else 'database')
+    return taken
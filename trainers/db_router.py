@@ -0,0 +1,84 @@
+"""
+Read replica routing
+Reads from the reporting views listed in settings.REPLICA_READ_VIEWS go to the
+`replica` database. As soon as anything is written during the request, every
+following read of that request goes back to the primary (read-your-writes).
+`migrate` never touches the replica: it gets the schema from the primary
+through replication (or as a copy of the primary's file on SQLite).
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.db import DEFAULT_DB_ALIAS, connections
+
+REPLICA_DB_ALIAS = 'replica'
+
+_routing = ContextVar('replica_routing', default=None)
+
+
+class _RoutingState:
+    def __init__(self, use_replica=False):
+        self.use_replica = use_replica
+        self.wrote = False
+
+
+def replica_configured():
+    return REPLICA_DB_ALIAS in connections.databases
+
+
+@contextmanager
+def request_routing():
+    """Per-request routing state (reads stay on the primary until replica_reads)"""
+    token = _routing.set(_RoutingState())
+    try:
+        yield
+    finally:
+        _routing.reset(token)
+
+
+def enable_replica_reads():
+    """Send the remaining reads of the current request to the replica"""
+    state = _routing.get()
+    if state is not None:
+        state.use_replica = True
+
+
+@contextmanager
+def replica_reads():
+    """Route reads to the replica inside this block (outside of requests too)"""
+    token = _routing.set(_RoutingState(use_replica=True))
+    try:
+        yield
+    finally:
+        _routing.reset(token)
+
+
+class ReplicaRouter:
+    """DATABASE_ROUTERS entry; returns None (= default) whenever the replica is not wanted"""
+
+    def db_for_read(self, model, **hints):
+        state = _routing.get()
+        if state is None or not state.use_replica or state.wrote:
+            return None
+        if not replica_configured():
+            return None
+        # Reads inside a transaction on the primary must see its writes
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return None
+        return REPLICA_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        state = _routing.get()
+        if state is not None:
+            state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Same data on both aliases
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # The replica copies the primary's schema: never migrate it directly
+        if db == REPLICA_DB_ALIAS:
+            return False
+        return None
@@ -15,6 +15,8 @@ from datetime import timedelta, date
 import json
 
 from .middleware import require_organization
+from .payments.timeseries import build_timeseries
+from .registration import invalidate_active_count
 from .models import Staff, Trainer, Payments, OrganizationInfo as Organization
 
 # Constants
@@ -144,23 +146,17 @@ def api_chart_data(request):
     if cached_data:
         return JsonResponse(cached_data)
     
-    # Single optimized query with conditional aggregation
-    monthly_data = Payments.objects.filter(
-        organization=organization,
-        paymentdate__year=year
-    ).values('paymentdate__month', 'paymentCategry').annotate(
-        total=Sum('paymentAmount')
-    ).order_by('paymentdate__month')
-    
-    # Initialize data structure
-    chart_data = {category: [0] * 12 for category in PAYMENT_CATEGORIES.keys()}
-    
-    # Populate data
-    for entry in monthly_data:
-        month = entry['paymentdate__month'] - 1
-        category = entry['paymentCategry']
-        if category in chart_data:
-            chart_data[category][month] = float(entry['total'])
+    try:
+        start, end = date(int(year), 1, 1), date(int(year), 12, 31)
+    except ValueError:
+        return JsonResponse({'success': False, 'error': 'Invalid year'}, status=400)
+    
+    # One query: payments per month and category (month buckets, gap-filled)
+    points = build_timeseries(organization, start, end, 'month', fields=('by_category',))
+    chart_data = {
+        category: [float(point['by_category'][category]) for point in points]
+        for category in PAYMENT_CATEGORIES.keys()
+    }
     
     data = {
         'chart_labels': [f'{m}' for m in range(1, 13)],
@@ -496,4 +492,6 @@ def clear_organization_cache(org_id):
             try:
                 cache.delete(key)
             except:
-                pass
\ No newline at end of file
+                pass
+    # Bulk is_active updates bypass the signals that keep this count
+    invalidate_active_count(org_id)
@@ -0,0 +1,180 @@
+"""
+JSON API responses
+FastJsonResponse serializes with orjson when it is installed (stdlib json
+otherwise). Decimal, date and datetime values are encoded by the serializer,
+so views can put ORM values in the payload as they come. Both encoders give
+the same output: Decimal as a number, dates as isoformat(), UTF-8 text.
+
+JsonCompressionMiddleware compresses large JSON bodies (brotli when the
+client accepts it and the package is installed, gzip otherwise).
+api_per_page() caps the page size clients ask for; requested_fields() and
+project() implement ?fields= / ?include= sparse fieldsets.
+"""
+import datetime
+import gzip
+import json
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import HttpResponse
+from django.utils.cache import patch_vary_headers
+from django.utils.deprecation import MiddlewareMixin
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+MAX_PER_PAGE = getattr(settings, 'API_MAX_PER_PAGE', 200)
+COMPRESS_MIN_BYTES = getattr(settings, 'JSON_COMPRESS_MIN_BYTES', 1024)
+# Dynamic bodies: fast levels, most of the gain of the maximum ones
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+
+# ======================================================
+# Serialization
+# ======================================================
+
+def _default(o):
+    """Values neither encoder handles natively"""
+    if isinstance(o, Decimal):
+        return float(o)
+    if isinstance(o, (datetime.date, datetime.time)):
+        return o.isoformat()  # stdlib only; orjson writes the same string
+    return DjangoJSONEncoder().default(o)  # lazy strings, UUID, timedelta
+
+
+def dumps(data):
+    """bytes of `data` as JSON"""
+    if orjson is not None:
+        return orjson.dumps(data, default=_default, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(data, default=_default, ensure_ascii=False, separators=(',', ':')).encode()
+
+
+class FastJsonResponse(HttpResponse):
+    """JsonResponse with trainers.json_api.dumps"""
+
+    def __init__(self, data, safe=True, **kwargs):
+        if safe and not isinstance(data, dict):
+            raise TypeError('In order to allow non-dict objects to be serialized set the safe parameter to False.')
+        kwargs.setdefault('content_type', 'application/json')
+        super().__init__(content=dumps(data), **kwargs)
+
+
+def api_per_page(request, default, maximum=MAX_PER_PAGE):
+    """?per_page= clamped to 1..maximum (default when missing or invalid)"""
+    try:
+        per_page = int(request.GET.get('per_page', default))
+    except ValueError:
+        return default
+    return max(1, min(per_page, maximum))
+
+
+# ======================================================
+# Sparse fieldsets
+# ======================================================
+# A field map is {output name: (model columns it reads, getter(obj))}
+
+def requested_fields(request, available, param='fields'):
+    """
+    Names listed in ?<param>=a,b (in `available` order); all of `available`
+    when the parameter is absent. ValueError on unknown names.
+    """
+    raw = request.GET.get(param)
+    if raw is None:
+        return list(available)
+    names = {name.strip() for name in raw.split(',') if name.strip()}
+    unknown = names.difference(available)
+    if unknown:
+        raise ValueError(f"Unknown {param}: {', '.join(sorted(unknown))} (available: {', '.join(available)})")
+    return [name for name in available if name in names]
+
+
+def field_columns(field_map, names):
+    """Model columns read by the requested output fields, for .only()"""
+    return sorted({column for name in names for column in field_map[name][0]})
+
+
+def project(obj, field_map, names):
+    """{name: value} of the requested output fields"""
+    return {name: field_map[name][1](obj) for name in names}
+
+
+# ======================================================
+# Compression
+# ======================================================
+
+def accepted_encodings(header):
+    """{coding: q} of an Accept-Encoding header"""
+    encodings = {}
+    for part in header.split(','):
+        coding, _, params = part.strip().partition(';')
+        q = 1.0
+        if params.strip().startswith('q='):
+            try:
+                q = float(params.strip()[2:])
+            except ValueError:
+                q = 0.0
+        if coding:
+            encodings[coding.strip().lower()] = q
+    return encodings
+
+
+def negotiate_encoding(header):
+    """'br', 'gzip' or None for an Accept-Encoding header"""
+    encodings = accepted_encodings(header)
+    if brotli is not None and encodings.get('br', 0) > 0:
+        return 'br'
+    if encodings.get('gzip', encodings.get('*', 0)) > 0:
+        return 'gzip'
+    return None
+
+
+def compress(content, encoding):
+    if encoding == 'br':
+        return brotli.compress(content, quality=BROTLI_QUALITY)
+    return gzip.compress(content, compresslevel=GZIP_LEVEL, mtime=0)
+
+
+class JsonCompressionMiddleware(MiddlewareMixin):
+    """
+    Compress application/json responses of COMPRESS_MIN_BYTES or more
+    HTML pages are left alone: they carry the CSRF token (BREACH).
+    """
+
+    async def __acall__(self, request):
+        # No I/O: compressed on the event loop, without a thread hop
+        return self.process_response(request, await self.get_response(request))
+
+    def process_response(self, request, response):
+        if (
+            response.streaming
+            or response.has_header('Content-Encoding')
+            or not response.get('Content-Type', '').startswith('application/json')
+            or len(response.content) < COMPRESS_MIN_BYTES
+        ):
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+        encoding = negotiate_encoding(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        if encoding is None:
+            return response
+        compressed = compress(response.content, encoding)
+        if len(compressed) >= len(response.content):
+            return response
+
+        response.content = compressed
+        response['Content-Length'] = str(len(compressed))
+        response['Content-Encoding'] = encoding
+        # The compressed body is not byte-identical to the one a strong ETag names
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response['ETag'] = 'W/' + etag
+        return response
@@ -0,0 +1,248 @@
+import json
+import math
+import platform
+import resource
+import statistics
+import subprocess
+import time
+import tracemalloc
+from datetime import date
+
+import django
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from trainers.models import OrganizationInfo, Payments, Staff, Trainer
+from trainers.payments.invoice_cache import invalidate_payment
+
+# Regressions smaller than this are noise on a laptop
+NOISE_MS = 5.0
+
+
+def percentile(sorted_values, p):
+    """Nearest-rank percentile of an already sorted list"""
+    rank = math.ceil(p / 100 * len(sorted_values))
+    return sorted_values[max(rank, 1) - 1]
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmark the JSON APIs, exports and invoice PDF through the test client '
+        '(p50/p95/p99, queries, peak memory) and compare with a baseline'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--org', help='Organization slug (default: bench-0, else the largest organization)')
+        parser.add_argument('--repeat', type=int, default=20, help='Timed requests per endpoint')
+        parser.add_argument('--heavy-repeat', type=int, default=3, help='Timed requests per export')
+        parser.add_argument('--only', help='Comma separated endpoint names')
+        parser.add_argument('--warm-cache', action='store_true',
+                            help='Keep the cache between requests (default: every request is cold)')
+        parser.add_argument('--output', default='bench_results.json', help='Result file')
+        parser.add_argument('--baseline', help='Earlier result file to compare with')
+        parser.add_argument('--threshold', type=float, default=0.2, help='Allowed p95 slowdown (0.2 = +20%%)')
+        parser.add_argument('--fail-on-regression', action='store_true', help='Exit with an error on regressions')
+
+    # Measure the endpoints, not the per-organization rate limits
+    @override_settings(THROTTLE_ENABLED=False)
+    def handle(self, *args, **options):
+        organization = self.get_organization(options['org'])
+        staff = Staff.objects.filter(organization=organization).select_related('user').order_by('-is_admin', 'id').first()
+        if staff is None:
+            raise CommandError(f'لا يوجد موظف في {organization.slug}')
+        trainer = Trainer.objects.filter(organization=organization, is_active=True).order_by('id').first()
+        payment = Payments.objects.filter(organization=organization).order_by('-paymentdate', 'id').first()
+        if trainer is None or payment is None:
+            raise CommandError(f'{organization.slug}: no trainees/payments (run seed_benchmark_data)')
+
+        self.client = Client()
+        self.client.force_login(staff.user)
+        self.cold = not options['warm_cache']
+
+        scenarios = self.scenarios(organization, trainer, payment)
+        if options['only']:
+            wanted = set(options['only'].split(','))
+            scenarios = [s for s in scenarios if s[0] in wanted]
+
+        self.stdout.write("\n" + "=" * 60)
+        self.stdout.write(self.style.SUCCESS(
+            f'Benchmark {organization.slug}: {Payments.objects.filter(organization=organization).count():,} دفعة, '
+            f'{"cold" if self.cold else "warm"} cache'
+        ))
+        self.stdout.write("=" * 60)
+        self.stdout.write(f'{"endpoint":28} {"p50":>8} {"p95":>8} {"p99":>8} {"queries":>8} {"peak KB":>9}')
+
+        results = {}
+        for name, url, params, heavy, before in scenarios:
+            repeat = options['heavy_repeat'] if heavy else options['repeat']
+            results[name] = result = self.measure(url, params, repeat, before)
+            self.stdout.write(
+                f'{name:28} {result["p50_ms"]:8.1f} {result["p95_ms"]:8.1f} {result["p99_ms"]:8.1f} '
+                f'{result["queries"]:8} {result["peak_kb"]:9,}'
+                + ('' if result['status'] == 200 else self.style.ERROR(f'  HTTP {result["status"]}'))
+            )
+
+        report = {
+            'meta': self.meta(organization, options),
+            'results': results,
+        }
+        with open(options['output'], 'w') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        self.stdout.write(f'\n→ {options["output"]}')
+
+        if options['baseline']:
+            regressions = self.compare(options['baseline'], results, options['threshold'])
+            if regressions and options['fail_on_regression']:
+                raise CommandError(f'{len(regressions)} regression(s): {", ".join(regressions)}')
+
+    # ------------------------------------------------------------------
+
+    def get_organization(self, slug):
+        if slug:
+            organization = OrganizationInfo.objects.filter(slug=slug).first()
+        else:
+            organization = (
+                OrganizationInfo.objects.filter(slug='bench-0').first()
+                or OrganizationInfo.objects.alias(n=Count('payments')).order_by('-n').first()
+            )
+        if organization is None:
+            raise CommandError('No organization found (run seed_benchmark_data)')
+        return organization
+
+    def scenarios(self, organization, trainer, payment):
+        """(name, url, query params, heavy, callable run before every request)"""
+        today = timezone.now().date()
+        year_start = today.replace(month=1, day=1).isoformat()
+        month_start = today.replace(day=1).isoformat()
+        period = {'start': year_start, 'end': today.isoformat()}
+        invoice = lambda: invalidate_payment(organization.id, payment.id) if self.cold else None
+        return [
+            ('api_kpis', reverse('api_kpis'), {'period': 'month'}, False, None),
+            ('api_chart_data', reverse('api_chart_data'), {'year': today.year}, False, None),
+            ('api_payment_status', reverse('api_payment_status'), {}, False, None),
+            ('api_payments_list', reverse('api_payments_list'), {'page': 1, 'per_page': 25}, False, None),
+            ('api_payments_list_search', reverse('api_payments_list'),
+             {'search': trainer.last_name[:4], 'page': 1, 'per_page': 25}, False, None),
+            ('api_trainees_list', reverse('api_trainees_list'), {'page': 1, 'per_page': 50}, False, None),
+            ('api_trainees_list_search', reverse('api_trainees_list'),
+             {'search': trainer.first_name[:3], 'page': 1, 'per_page': 50}, False, None),
+            ('api_trainer_profile_data', reverse('api_trainer_profile_data', args=[trainer.id]), {}, False, None),
+            ('api_financial_report', reverse('api_financial_report'), period, False, None),
+            ('api_monthly_breakdown', reverse('api_monthly_breakdown'), period, False, None),
+            ('api_daily_breakdown', reverse('api_daily_breakdown'),
+             {'start': month_start, 'end': today.isoformat()}, False, None),
+            ('export_xls_month', reverse('export_xls'),
+             {'category': 'month', 'start_date': year_start, 'end_date': today.isoformat()}, True, None),
+            ('export_data_payments', reverse('export_data', args=['payments']), {}, True, None),
+            ('invoice_pdf', reverse('download_payment_invoice', args=[payment.id]), {}, False, invoice),
+        ]
+
+    def request(self, url, params, before):
+        if self.cold:
+            cache.clear()
+        if before:
+            before()
+        response = self.client.get(url, params)
+        if response.streaming:
+            b''.join(response.streaming_content)
+        return response
+
+    def measure(self, url, params, repeat, before):
+        # Warm-up: imports, template loading, connection
+        response = self.request(url, params, before)
+
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            self.request(url, params, before)
+            timings.append((time.perf_counter() - started) * 1000)
+        timings.sort()
+
+        # One extra request for queries and memory (tracing slows it down)
+        with CaptureQueriesContext(connection) as queries:
+            tracemalloc.start()
+            self.request(url, params, before)
+            _current, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+
+        return {
+            'status': response.status_code,
+            'runs': repeat,
+            'p50_ms': round(percentile(timings, 50), 2),
+            'p95_ms': round(percentile(timings, 95), 2),
+            'p99_ms': round(percentile(timings, 99), 2),
+            'mean_ms': round(statistics.fmean(timings), 2),
+            'queries': len(queries.captured_queries),
+            'peak_kb': peak // 1024,
+        }
+
+    def meta(self, organization, options):
+        try:
+            commit = subprocess.run(
+                ['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR,
+                capture_output=True, text=True, timeout=5,
+            ).stdout.strip()
+        except (OSError, subprocess.SubprocessError):
+            commit = ''
+        return {
+            'date': date.today().isoformat(),
+            'commit': commit,
+            'organization': organization.slug,
+            'payments': Payments.objects.filter(organization=organization).count(),
+            'trainees': Trainer.objects.filter(organization=organization).count(),
+            'database': connection.vendor,
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'cold_cache': self.cold,
+            'max_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        }
+
+    def compare(self, path, results, threshold):
+        try:
+            with open(path) as f:
+                baseline = json.load(f)
+        except (OSError, ValueError) as e:
+            raise CommandError(f'Cannot read baseline {path}: {e}')
+
+        self.stdout.write("\n" + "=" * 60)
+        self.stdout.write(self.style.SUCCESS(
+            f'مقارنة مع {path} ({baseline["meta"].get("commit") or "?"}, {baseline["meta"].get("payments", "?")} دفعة)'
+        ))
+        self.stdout.write("=" * 60)
+        regressions = []
+        for name, result in results.items():
+            old = baseline['results'].get(name)
+            if old is None:
+                self.stdout.write(f'{name:28} (new)')
+                continue
+            delta = result['p95_ms'] - old['p95_ms']
+            ratio = delta / old['p95_ms'] if old['p95_ms'] else 0
+            slower = ratio > threshold and delta > NOISE_MS
+            more_queries = result['queries'] > old['queries']
+            line = (
+                f'{name:28} p95 {old["p95_ms"]:8.1f} → {result["p95_ms"]:8.1f} ms ({ratio:+6.0%})  '
+                f'queries {old["queries"]} → {result["queries"]}'
+            )
+            if slower or more_queries:
+                regressions.append(name)
+                self.stdout.write(self.style.ERROR(f'✗ {line}'))
+            elif ratio < -threshold and -delta > NOISE_MS:
+                self.stdout.write(self.style.SUCCESS(f'✓ {line}'))
+            else:
+                self.stdout.write(f'  {line}')
+        if regressions:
+            self.stdout.write(self.style.ERROR(f'تراجع في الأداء: {len(regressions)}'))
+        return regressions
+
+
+# To run this command:
+# python manage.py seed_benchmark_data --orgs 10 --trainees 2800
+# python manage.py bench --output bench_baseline.json
+# python manage.py bench --baseline bench_baseline.json --fail-on-regression
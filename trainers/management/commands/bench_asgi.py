@@ -0,0 +1,180 @@
+import asyncio
+import math
+import os
+import socket
+import subprocess
+import sys
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client
+from django.urls import reverse
+from django.utils import timezone
+
+from trainers.models import OrganizationInfo, Payments, Staff
+
+SERVERS = {
+    # mode: (application, worker class, ASYNC_VIEWS)
+    'wsgi': ('crm_back.wsgi:application', 'sync', 'False'),
+    'asgi': ('crm_back.asgi:application', 'uvicorn_worker.UvicornWorker', 'True'),
+}
+
+
+def percentile(sorted_values, p):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    rank = math.ceil(p / 100 * len(sorted_values))
+    return sorted_values[max(rank, 1) - 1]
+
+
+async def fetch(port, path, cookie, timeout):
+    """One HTTP/1.1 GET on a fresh connection; returns the status code"""
+    reader, writer = await asyncio.wait_for(asyncio.open_connection('127.0.0.1', port), timeout)
+    try:
+        writer.write(
+            f'GET {path} HTTP/1.1\r\nHost: 127.0.0.1\r\nCookie: {cookie}\r\n'
+            f'Connection: close\r\n\r\n'.encode()
+        )
+        await writer.drain()
+        data = await asyncio.wait_for(reader.read(), timeout)
+    finally:
+        writer.close()
+    return int(data.split(b' ', 2)[1]) if data else 0
+
+
+async def load(port, paths, cookie, clients, timeout):
+    """`clients` concurrent connections working through `paths`; (latencies ms, errors, seconds)"""
+    queue = list(reversed(paths))
+    latencies = []
+    errors = 0
+
+    async def client():
+        nonlocal errors
+        while queue:
+            path = queue.pop()
+            started = time.perf_counter()
+            try:
+                status = await fetch(port, path, cookie, timeout)
+            except (OSError, asyncio.TimeoutError, ValueError, IndexError):
+                status = 0
+            if status == 200:
+                latencies.append((time.perf_counter() - started) * 1000)
+            else:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(clients)))
+    return sorted(latencies), errors, time.perf_counter() - started
+
+
+class Command(BaseCommand):
+    help = (
+        'WSGI (gunicorn sync workers) vs ASGI (gunicorn + uvicorn workers, async views) '
+        'under N concurrent clients: financial report and invoice PDF'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--clients', type=int, default=200, help='Concurrent connections')
+        parser.add_argument('--requests', type=int, default=1000, help='Requests per mode and endpoint')
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='Server processes')
+        parser.add_argument('--modes', default='wsgi,asgi')
+        parser.add_argument('--org', help='Organization slug (default: bench-0, else the first organization)')
+        parser.add_argument('--port', type=int, default=8790)
+        parser.add_argument('--timeout', type=float, default=60, help='Per request (s)')
+
+    def handle(self, *args, **options):
+        organization = (
+            OrganizationInfo.objects.filter(slug=options['org'] or 'bench-0').first()
+            or (None if options['org'] else OrganizationInfo.objects.order_by('id').first())
+        )
+        if organization is None:
+            raise CommandError('No organization found (run seed_benchmark_data)')
+        staff = Staff.objects.filter(organization=organization).select_related('user').order_by('-is_admin', 'id').first()
+        payment = Payments.objects.filter(organization=organization).order_by('-paymentdate', 'id').first()
+        if staff is None or payment is None:
+            raise CommandError(f'{organization.slug}: no staff/payments')
+
+        # A real session row the servers can read
+        client = Client()
+        client.force_login(staff.user)
+        cookie = f'{settings.SESSION_COOKIE_NAME}={client.cookies[settings.SESSION_COOKIE_NAME].value}'
+
+        # Distinct date ranges: every report request misses the cache
+        year_start = timezone.now().date().replace(month=1, day=1)
+        report = reverse('api_financial_report')
+        invoice = reverse('download_payment_invoice', args=[payment.id])
+        endpoints = {
+            'api_financial_report': [
+                f'{report}?start={year_start - timedelta(days=i % 365)}&end={year_start + timedelta(days=364)}'
+                for i in range(options['requests'])
+            ],
+            'invoice_pdf': [invoice] * options['requests'],
+        }
+
+        self.stdout.write("\n" + "=" * 72)
+        self.stdout.write(self.style.SUCCESS(
+            f"WSGI / ASGI: {options['clients']} عميل متزامن, {options['workers']} عملية, {organization.slug}"
+        ))
+        self.stdout.write("=" * 72)
+        self.stdout.write(
+            f'{"mode":6} {"endpoint":22} {"req/s":>8} {"p50":>8} {"p95":>8} {"p99":>8} {"errors":>7}'
+        )
+        for offset, mode in enumerate(options['modes'].split(',')):
+            application, worker_class, async_views = SERVERS[mode]
+            if mode == 'asgi' and not self.importable('uvicorn_worker'):
+                self.stdout.write(self.style.ERROR('asgi: pip install uvicorn uvicorn-worker'))
+                continue
+            port = options['port'] + offset
+            server = self.start_server(application, worker_class, async_views, port, options['workers'])
+            try:
+                for name, paths in endpoints.items():
+                    latencies, errors, seconds = asyncio.run(
+                        load(port, paths, cookie, options['clients'], options['timeout'])
+                    )
+                    self.stdout.write(
+                        f'{mode:6} {name:22} {len(latencies) / seconds:8.1f} '
+                        f'{percentile(latencies, 50):8.0f} {percentile(latencies, 95):8.0f} '
+                        f'{percentile(latencies, 99):8.0f} {errors:7}'
+                    )
+            finally:
+                server.terminate()
+                server.wait(timeout=30)
+
+    def importable(self, module):
+        return subprocess.run([sys.executable, '-c', f'import {module}'], capture_output=True).returncode == 0
+
+    def start_server(self, application, worker_class, async_views, port, workers):
+        env = dict(
+            os.environ, ASYNC_VIEWS=async_views, GUNICORN_WARM_CACHES='False', THROTTLE_ENABLED='False',
+            # Same key as this process, or the session cookie is rejected
+            DJANGO_SECRET_KEY=settings.SECRET_KEY,
+        )
+        server = subprocess.Popen(
+            [
+                sys.executable, '-m', 'gunicorn', application,
+                '--config', os.path.join(settings.BASE_DIR, 'gunicorn.conf.py'),
+                '--bind', f'127.0.0.1:{port}', '--workers', str(workers),
+                '--worker-class', worker_class, '--access-logfile', os.devnull,
+                '--backlog', '4096',
+            ],
+            cwd=settings.BASE_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        deadline = time.monotonic() + 60
+        while time.monotonic() < deadline:
+            if server.poll() is not None:
+                raise CommandError(f'gunicorn ({worker_class}) exited with {server.returncode}')
+            try:
+                socket.create_connection(('127.0.0.1', port), timeout=1).close()
+                time.sleep(1)  # workers are forked after the socket opens
+                return server
+            except OSError:
+                time.sleep(0.2)
+        server.terminate()
+        raise CommandError(f'gunicorn did not start on port {port}')
+
+
+# To run this command (needs `pip install uvicorn uvicorn-worker` for the ASGI side):
+# python manage.py bench_asgi --clients 200 --requests 1000 --workers 4
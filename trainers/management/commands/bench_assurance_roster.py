@@ -0,0 +1,97 @@
+import os
+import tempfile
+import time
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from trainers.models import OrganizationInfo, Payments, Trainer
+from trainers.payments.assurance_roster import (
+    ASSURANCE_TEMPLATE_PATH, build_assurance_roster, get_roster_template,
+)
+
+
+def sample_template():
+    """Minimal stand-in for the assurance template (header row + 5 columns)"""
+    from docx import Document
+
+    doc = Document()
+    table = doc.add_table(rows=1, cols=5)
+    for cell, title in zip(table.rows[0].cells, ['ر.ت', 'النسب', 'الاسم', 'ب.و', 'تاريخ الازدياد']):
+        cell.text = title
+    fd, path = tempfile.mkstemp(suffix='.docx')
+    os.close(fd)
+    doc.save(path)
+    return path
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = 'Benchmark the assurance Word roster on N insured trainees (data rolled back)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--count', type=int, default=5000, help='Insured trainees')
+        parser.add_argument('--org', help='Organization slug (default: first organization)')
+        parser.add_argument('--template', help='Template .docx (default: the assurance template)')
+        parser.add_argument('--repeat', type=int, default=3)
+
+    def handle(self, *args, **options):
+        organization = (
+            OrganizationInfo.objects.filter(slug=options['org']).first()
+            if options['org'] else OrganizationInfo.objects.order_by('id').first()
+        )
+        if not organization:
+            raise CommandError('No organization found')
+
+        path = options['template'] or ASSURANCE_TEMPLATE_PATH
+        if not os.path.exists(path):
+            path = sample_template()
+            self.stdout.write(self.style.WARNING(f'Template not found, using a generated one: {path}'))
+
+        started = time.perf_counter()
+        get_roster_template(path)
+        self.stdout.write(f"template parse: {(time.perf_counter() - started) * 1000:.0f} ms (once per process)")
+
+        try:
+            with transaction.atomic():
+                self.run(organization, path, options['count'], options['repeat'])
+                raise Rollback
+        except Rollback:
+            pass
+
+    def run(self, organization, path, count, repeat):
+        trainers = Trainer.objects.bulk_create([
+            Trainer(
+                organization=organization, first_name=f'متدرب{i}', last_name='الاختبار',
+                birth_day=date(2005, 1, 1) + timedelta(days=i % 3650),
+                male_female='male', category='كبار',
+            )
+            for i in range(count)
+        ], batch_size=1000)
+        Payments.objects.bulk_create([
+            Payments(
+                organization=organization, trainer=trainer, paymentCategry='assurance',
+                paymentAmount=100, paymentdate=date.today(),
+            )
+            for trainer in trainers
+        ], batch_size=1000)
+
+        payments = Payments.objects.filter(
+            organization=organization, paymentCategry='assurance', trainer__in=trainers
+        )
+        for _ in range(repeat):
+            started = time.perf_counter()
+            size = len(build_assurance_roster(payments, path))
+            seconds = time.perf_counter() - started
+            self.stdout.write(
+                f"{count} trainees  {seconds:6.2f}s  {count / seconds:8.0f} rows/s  docx={size / 1024:.0f} KB"
+            )
+        self.stdout.write(self.style.SUCCESS('Done (benchmark rows rolled back)'))
+
+
+# To run this command:
+# python manage.py bench_assurance_roster --count 5000
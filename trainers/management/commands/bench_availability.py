@@ -0,0 +1,93 @@
+import random
+import string
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import RequestFactory, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from trainers import availability
+from trainers.models import OrganizationInfo
+from trainers.views import check_slug, check_username
+
+TARGET_PER_SECOND = 1000
+
+
+def random_name(length=12):
+    return ''.join(random.choices(string.ascii_lowercase + string.digits, k=length))
+
+
+class Command(BaseCommand):
+    help = (
+        'Signup availability checks: exists() per keystroke vs the cached Bloom filter '
+        '(checks/s, queries per check, false positive rate), username and slug'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--checks', type=int, default=5000, help='Checks per case')
+        parser.add_argument('--taken-ratio', type=float, default=0.1,
+                            help='Share of checked names that already exist')
+        parser.add_argument('--seed', type=int, default=1)
+
+    @override_settings(THROTTLE_ENABLED=False)
+    def handle(self, *args, **options):
+        random.seed(options['seed'])
+        kinds = {
+            'username': (User, 'username', check_username),
+            'slug': (OrganizationInfo, 'slug', check_slug),
+        }
+
+        self.stdout.write("\n" + "=" * 72)
+        self.stdout.write(self.style.SUCCESS(
+            f"فحص التوفر: {options['checks']} فحص، {options['taken_ratio']:.0%} أسماء موجودة"
+        ))
+        self.stdout.write("=" * 72)
+        self.stdout.write(f'{"kind":9} {"case":18} {"checks/s":>10} {"queries/check":>14} {"target":>8}')
+
+        if not availability.cache_is_shared():
+            self.stdout.write(self.style.WARNING(
+                'الذاكرة المؤقتة محلية (LocMem): الفلتر معطل وكل فحص يمر بقاعدة البيانات'
+            ))
+
+        factory = RequestFactory()
+        for kind, (model, field, view) in kinds.items():
+            existing = list(model.objects.values_list(field, flat=True)[:10000])
+            if not existing:
+                raise CommandError(f'No {kind} found (run seed_benchmark_data)')
+            names = [
+                random.choice(existing) if random.random() < options['taken_ratio'] else random_name()
+                for _ in range(options['checks'])
+            ]
+
+            started = time.perf_counter()
+            bloom = availability.build_filter(kind)
+            build_ms = (time.perf_counter() - started) * 1000
+            absent = [random_name(16) for _ in range(10000)]
+            false_positives = sum(name in bloom for name in absent) / len(absent)
+            self.stdout.write(
+                f'{kind:9} filter: {model.objects.count()} names, {len(bloom.bits) / 1024:.1f} KB, '
+                f'{bloom.hashes} hashes, built in {build_ms:.0f} ms, false positives {false_positives:.2%}'
+            )
+
+            cases = {
+                'exists()': lambda name: model.objects.filter(**{field: name}).exists(),
+                'is_taken()': lambda name: availability.is_taken(kind, name),
+                'view': lambda name: view(factory.get('/', {kind: name}, REMOTE_ADDR='10.0.0.1')),
+            }
+            for case, function in cases.items():
+                with CaptureQueriesContext(connection) as queries:
+                    started = time.perf_counter()
+                    for name in names:
+                        function(name)
+                    seconds = time.perf_counter() - started
+                rate = len(names) / seconds
+                target = self.style.SUCCESS('ok') if rate >= TARGET_PER_SECOND else self.style.ERROR('below')
+                self.stdout.write(
+                    f'{kind:9} {case:18} {rate:10.0f} {len(queries) / len(names):14.3f} {target:>8}'
+                )
+
+
+# To run this command:
+# python manage.py bench_availability --checks 5000 --taken-ratio 0.1
@@ -0,0 +1,86 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# What a gunicorn worker does before serving its first request
+BOOT_SCRIPT = r'''
+import json, resource, sys, time
+started = time.perf_counter()
+import django
+django.setup()
+from django.urls import get_resolver
+get_resolver().url_patterns
+seconds = time.perf_counter() - started
+rss_kb = 0
+with open('/proc/self/status') as f:
+    for line in f:
+        if line.startswith('VmRSS:'):
+            rss_kb = int(line.split()[1])
+print(json.dumps({
+    'seconds': seconds,
+    'rss_kb': rss_kb or resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    'modules': len(sys.modules),
+    'heavy': sorted(m for m in %(heavy)r if m in sys.modules),
+}))
+'''
+
+HEAVY_MODULES = ('pandas', 'numpy', 'openpyxl', 'xlwt', 'docx', 'reportlab', 'arabic_reshaper', 'bidi')
+
+
+class Command(BaseCommand):
+    help = 'Worker cold start: time and RSS to load Django + the URLconf in a fresh interpreter, plus -X importtime'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--runs', type=int, default=5, help='Fresh interpreters to start')
+        parser.add_argument('--top', type=int, default=15, help='Slowest imports to list (cumulative)')
+
+    def boot(self, *flags):
+        result = subprocess.run(
+            [sys.executable, *flags, '-c', BOOT_SCRIPT % {'heavy': HEAVY_MODULES}],
+            cwd=settings.BASE_DIR, env=os.environ.copy(), capture_output=True, text=True,
+        )
+        if result.returncode:
+            raise CommandError(result.stderr.strip().splitlines()[-1] if result.stderr else 'boot failed')
+        return json.loads(result.stdout.strip().splitlines()[-1]), result.stderr
+
+    def handle(self, *args, **options):
+        runs = [self.boot()[0] for _ in range(options['runs'])]
+        seconds = sorted(run['seconds'] * 1000 for run in runs)
+        rss = [run['rss_kb'] / 1024 for run in runs]
+
+        self.stdout.write("\n" + "=" * 60)
+        self.stdout.write(self.style.SUCCESS(f"إقلاع العامل ({options['runs']} عمليات جديدة)"))
+        self.stdout.write("=" * 60)
+        self.stdout.write(f'boot       median {statistics.median(seconds):7.0f} ms   min {seconds[0]:7.0f} ms')
+        self.stdout.write(f'RSS/worker median {statistics.median(rss):7.1f} MB')
+        self.stdout.write(f'modules    {runs[0]["modules"]}')
+        heavy = runs[0]['heavy']
+        if heavy:
+            self.stdout.write(self.style.ERROR(f'heavy modules loaded at boot: {", ".join(heavy)}'))
+        else:
+            self.stdout.write(self.style.SUCCESS('لا توجد مكتبات ثقيلة عند الإقلاع'))
+
+        # One more boot under -X importtime: slowest top-level packages
+        _, trace = self.boot('-X', 'importtime')
+        cumulative = {}
+        for line in trace.splitlines():
+            if not line.startswith('import time:') or '|' not in line:
+                continue
+            _self, total, name = line[len('import time:'):].split('|')
+            if not total.strip().isdigit():
+                continue  # header line
+            package = name.strip().split('.')[0]
+            # nested imports are indented: keep the outermost (largest) figure per package
+            cumulative[package] = max(cumulative.get(package, 0), int(total))
+        self.stdout.write(f'\n{"package":30} {"cumulative ms":>14}')
+        for package, us in sorted(cumulative.items(), key=lambda item: -item[1])[:options['top']]:
+            self.stdout.write(f'{package:30} {us / 1000:14.1f}')
+
+
+# To run this command:
+# python manage.py bench_boot --runs 5
@@ -0,0 +1,98 @@
+import os
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+
+from trainers.models import OrganizationInfo, Payments, Trainer
+from trainers.payments import invoice_template
+from trainers.payments.invoice_bulk import iter_invoices_zip
+from trainers.payments.invoice_views import generate_invoice_number
+
+
+def build_payments(count):
+    """Unsaved payments with trainer/organization attached (no database needed)"""
+    org = OrganizationInfo(
+        id=1, name='جمعية نجوم أركانة', slug='bench', location='أركانة',
+        phone_number='0600000000', email='bench@example.com',
+    )
+    categories = [c for c, _label in Payments.CatChoices]
+    payments = []
+    for i in range(count):
+        trainer = Trainer(
+            id=i + 1, organization=org, first_name=f'متدرب{i}', last_name='الاختبار',
+            CIN=f'JB{i:06}', phone='0611111111', email=f't{i}@example.com',
+        )
+        payments.append(Payments(
+            id=i + 1, organization=org, trainer=trainer,
+            paymentdate=date(2025, 1, 1) + timedelta(days=i % 365),
+            paymentCategry=categories[i % len(categories)],
+            paymentAmount=Decimal('100.00'),
+        ))
+    return payments
+
+
+class Command(BaseCommand):
+    help = 'Benchmark bulk invoice ZIP rendering on 1 vs N processes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--count', type=int, default=1000, help='Invoices to render')
+        parser.add_argument(
+            '--workers',
+            default=f'1,{os.cpu_count() or 1}',
+            help='Comma separated process counts to compare',
+        )
+        parser.add_argument(
+            '--template',
+            action='store_true',
+            help='Single process: cold template (rebuilt per invoice) vs the shared one',
+        )
+
+    def handle(self, *args, **options):
+        payments = build_payments(options['count'])
+        if options['template']:
+            return self.bench_template(payments)
+
+        results = []
+
+        for workers in [int(w) for w in options['workers'].split(',')]:
+            stats = {}
+            size = sum(len(chunk) for chunk in iter_invoices_zip(payments, workers, stats))
+            results.append((workers, stats))
+            self.stdout.write(
+                f"workers={workers:<3} {stats['count']} invoices  "
+                f"{stats['seconds']:7.2f}s  {stats['per_second']:7.1f}/s  "
+                f"zip={size / 1024 / 1024:.1f} MB"
+            )
+
+        baseline = results[0][1]['seconds']
+        for workers, stats in results[1:]:
+            self.stdout.write(self.style.SUCCESS(
+                f"speedup {workers} vs {results[0][0]} workers: {baseline / stats['seconds']:.2f}x"
+            ))
+
+    def bench_template(self, payments):
+        """Invoices/second with styles, labels and logo rebuilt each time vs reused"""
+        def cold(payment, number):
+            invoice_template._shape.cache_clear()
+            return invoice_template.InvoiceTemplate().render(payment, number)
+
+        def warm(payment, number):
+            return invoice_template.get_invoice_template().render(payment, number)
+
+        rates = {}
+        for label, render in (('cold', cold), ('warm', warm)):
+            started = time.perf_counter()
+            for payment in payments:
+                render(payment, generate_invoice_number(payment.id, payment.paymentdate))
+            seconds = time.perf_counter() - started
+            rates[label] = len(payments) / seconds
+            self.stdout.write(f"{label:<5} {len(payments)} invoices  {seconds:7.2f}s  {rates[label]:7.1f}/s")
+
+        self.stdout.write(self.style.SUCCESS(f"speedup warm vs cold: {rates['warm'] / rates['cold']:.2f}x"))
+
+
+# To run this command:
+# python manage.py bench_invoices --count 1000 --workers 1,4
+# python manage.py bench_invoices --count 200 --template
@@ -0,0 +1,111 @@
+import json
+import statistics
+import time
+from itertools import cycle, islice
+
+from django.core.management.base import BaseCommand, CommandError
+from django.http import JsonResponse
+
+from trainers import json_api
+from trainers.models import Payments
+
+CATEGORIES = {
+    "month": "شهرية",
+    "subscription": "انخراط",
+    "assurance": "التأمين",
+    "jawaz": "جواز",
+}
+
+
+def median_ms(function, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function()
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+
+class Command(BaseCommand):
+    help = (
+        'api_payments_list-shaped payloads: JsonResponse with float/isoformat loops vs '
+        'FastJsonResponse (stdlib json and orjson), serialization time and bytes (raw/gzip/br)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', default='100,1000,10000', help='Payload sizes (rows)')
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def handle(self, *args, **options):
+        source = list(
+            Payments.objects.select_related('trainer').order_by('-paymentdate', '-id')
+            .values('id', 'paymentCategry', 'paymentAmount', 'paymentdate',
+                    'trainer__first_name', 'trainer__last_name')[:10000]
+        )
+        if not source:
+            raise CommandError('No payments found (run seed_benchmark_data)')
+
+        encoders = {'stdlib': None}
+        if json_api.orjson is not None:
+            encoders['orjson'] = json_api.orjson
+        else:
+            self.stdout.write(self.style.WARNING('orjson غير مثبت: pip install orjson'))
+
+        self.stdout.write("\n" + "=" * 72)
+        self.stdout.write(self.style.SUCCESS(f"تسلسل JSON ({options['repeat']} تكرار، الوسيط)"))
+        self.stdout.write("=" * 72)
+        self.stdout.write(f'{"rows":>6} {"response":26} {"ms":>8} {"bytes":>9} {"gzip":>8} {"br":>8}')
+        for rows in [int(n) for n in options['rows'].split(',')]:
+            values = list(islice(cycle(source), rows))
+
+            def before():
+                # The views before trainers/json_api.py: convert every value, then JsonResponse
+                return JsonResponse({'payments': [
+                    {
+                        'id': p['id'],
+                        'category': CATEGORIES.get(p['paymentCategry'], p['paymentCategry']),
+                        'trainer_name': f"{p['trainer__first_name']} {p['trainer__last_name']}",
+                        'amount': float(p['paymentAmount']),
+                        'date': p['paymentdate'].isoformat(),
+                    }
+                    for p in values
+                ]}).content
+
+            def after():
+                return json_api.FastJsonResponse({'payments': [
+                    {
+                        'id': p['id'],
+                        'category': CATEGORIES.get(p['paymentCategry'], p['paymentCategry']),
+                        'trainer_name': f"{p['trainer__first_name']} {p['trainer__last_name']}",
+                        'amount': p['paymentAmount'],
+                        'date': p['paymentdate'],
+                    }
+                    for p in values
+                ]}).content
+
+            cases = [('JsonResponse', before)]
+            for name, module in encoders.items():
+                def run(module=module):
+                    saved, json_api.orjson = json_api.orjson, module
+                    try:
+                        return after()
+                    finally:
+                        json_api.orjson = saved
+                cases.append((f'FastJsonResponse ({name})', run))
+
+            expected = json.loads(before())
+            for name, function in cases:
+                content = function()
+                if json.loads(content) != expected:
+                    raise CommandError(f'{name}: payload differs from JsonResponse')
+                ms = median_ms(function, options['repeat'])
+                gzipped = len(json_api.compress(content, 'gzip'))
+                br = len(json_api.compress(content, 'br')) if json_api.brotli else None
+                self.stdout.write(
+                    f'{rows:6} {name:26} {ms:8.2f} {len(content):9} {gzipped:8} '
+                    f'{br if br is not None else "-":>8}'
+                )
+
+
+# To run this command:
+# python manage.py bench_json --rows 100,1000,10000 --repeat 20
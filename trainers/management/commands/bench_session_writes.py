@@ -0,0 +1,93 @@
+import re
+from collections import Counter
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from trainers.models import OrganizationInfo, Staff
+
+WRITE = re.compile(r'^\s*(INSERT INTO|UPDATE|DELETE FROM)\s+"?(\w+)"?', re.IGNORECASE)
+
+DASHBOARD_APIS = ['api_kpis', 'api_chart_data', 'api_payment_status', 'api_paid_today']
+
+MODES = {
+    # Settings before the change: DB sessions saved on every request
+    'before': {
+        'SESSION_ENGINE': 'django.contrib.sessions.backends.db',
+        'SESSION_SAVE_EVERY_REQUEST': True,
+        'SESSION_RENEW_THRESHOLD': None,
+    },
+    'cached_db': {
+        'SESSION_ENGINE': 'django.contrib.sessions.backends.cached_db',
+        'SESSION_SAVE_EVERY_REQUEST': False,
+    },
+    'signed_cookies': {
+        'SESSION_ENGINE': 'django.contrib.sessions.backends.signed_cookies',
+        'SESSION_SAVE_EVERY_REQUEST': False,
+    },
+}
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = 'Database writes per N dashboard API calls for each session mode (subscription in its warning window)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--calls', type=int, default=100)
+        parser.add_argument('--org', help='Organization slug (default: first organization with an admin)')
+
+    def handle(self, *args, **options):
+        staff = Staff.objects.filter(is_admin=True).select_related('user', 'organization').order_by('id')
+        if options['org']:
+            staff = staff.filter(organization__slug=options['org'])
+        staff = staff.first()
+        if staff is None:
+            raise CommandError('No organization admin found')
+
+        self.stdout.write("\n" + "=" * 60)
+        self.stdout.write(self.style.SUCCESS(f"كتابات قاعدة البيانات لكل {options['calls']} طلب API"))
+        self.stdout.write("=" * 60)
+        self.stdout.write(f'{"mode":16} {"writes":>7} {"queries":>8}  tables')
+        for mode, overrides in MODES.items():
+            try:
+                with transaction.atomic():
+                    # Expires in 3 days: OrganizationMiddleware flashes its warning
+                    today = timezone.now().date()
+                    OrganizationInfo.objects.filter(pk=staff.organization_id).update(
+                        subscription_end_date=today + timedelta(days=3), is_active=True
+                    )
+                    with override_settings(**overrides):
+                        writes, queries = self.run(staff.user, options['calls'])
+                    raise Rollback
+            except Rollback:
+                pass
+            tables = ', '.join(f'{table}={n}' for table, n in writes.most_common())
+            self.stdout.write(f'{mode:16} {sum(writes.values()):7} {queries:8}  {tables}')
+
+    def run(self, user, calls):
+        client = Client()
+        client.force_login(user)
+        urls = [reverse(name) for name in DASHBOARD_APIS]
+        with CaptureQueriesContext(connection) as captured:
+            for i in range(calls):
+                response = client.get(urls[i % len(urls)])
+                if response.status_code != 200:
+                    raise CommandError(f'{urls[i % len(urls)]}: HTTP {response.status_code}')
+        writes = Counter()
+        for query in captured.captured_queries:
+            match = WRITE.match(query['sql'])
+            if match:
+                writes[match.group(2)] += 1
+        return writes, len(captured.captured_queries)
+
+
+# To run this command:
+# python manage.py bench_session_writes --calls 100
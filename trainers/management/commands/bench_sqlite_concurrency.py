@@ -0,0 +1,142 @@
+import multiprocessing
+import os
+import sqlite3
+import tempfile
+import time
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connection, connections, transaction
+from django.db.models import Count, Sum
+
+from trainers.models import OrganizationInfo, Payments, Trainer
+from trainers.sqlite_tuning import sqlite_options
+
+
+def percentile(values, p):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+
+def worker(role, organization_id, trainer_id, seconds, queue):
+    """One 'gunicorn worker': dashboard reads or payment writes until the deadline"""
+    connections.close_all()  # never share the parent's sqlite handle
+    today = date.today()
+    month_start = today.replace(day=1)
+    done = errors = 0
+    latencies = []
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        try:
+            if role == 'reader':
+                Payments.objects.filter(
+                    organization_id=organization_id, paymentdate__gte=month_start
+                ).aggregate(total=Sum('paymentAmount'), n=Count('id'))
+            else:
+                with transaction.atomic():
+                    Payments.objects.create(
+                        organization_id=organization_id, trainer_id=trainer_id,
+                        paymentCategry='month', paymentAmount=100, paymentdate=today,
+                    )
+            done += 1
+            latencies.append((time.perf_counter() - started) * 1000)
+        except OperationalError:  # database is locked
+            errors += 1
+    connections.close_all()
+    queue.put((role, done, errors, latencies))
+
+
+class Command(BaseCommand):
+    help = 'Readers vs writers on one SQLite file, default settings vs SQLITE_TUNING (runs on a copy)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--readers', type=int, default=3, help='Reader processes')
+        parser.add_argument('--writers', type=int, default=2, help='Writer processes')
+        parser.add_argument('--seconds', type=float, default=10)
+        parser.add_argument('--mode', choices=['both', 'default', 'tuned'], default='both')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('SQLite only')
+        trainer = Trainer.objects.order_by('id').first()
+        if trainer is None:
+            raise CommandError('No trainees found (run seed_benchmark_data)')
+        organization = OrganizationInfo.objects.get(pk=trainer.organization_id)
+
+        # Benchmark writes go to a copy of the database
+        source = connection.settings_dict['NAME']
+        fd, copy = tempfile.mkstemp(suffix='.sqlite3')
+        os.close(fd)
+        connections.close_all()
+        with sqlite3.connect(source) as src, sqlite3.connect(copy) as dst:
+            src.backup(dst)
+
+        # Without the tuning keys, whatever SQLITE_TUNING says
+        options_before = connection.settings_dict.get('OPTIONS', {})
+        self.untuned = {k: v for k, v in options_before.items() if k not in sqlite_options()}
+
+        modes = ['default', 'tuned'] if options['mode'] == 'both' else [options['mode']]
+        self.stdout.write("\n" + "=" * 72)
+        self.stdout.write(self.style.SUCCESS(
+            f"SQLite: {options['readers']} قارئ + {options['writers']} كاتب, {options['seconds']:.0f}s لكل وضع"
+        ))
+        self.stdout.write("=" * 72)
+        self.stdout.write(
+            f'{"mode":8} {"reads/s":>9} {"writes/s":>9} {"locked":>7} '
+            f'{"read p95":>9} {"read max":>9} {"write p95":>10} {"write max":>10}'
+        )
+        try:
+            for mode in modes:
+                self.run_mode(mode, copy, organization.id, trainer.id, options)
+        finally:
+            connection.settings_dict['NAME'] = source
+            connection.settings_dict['OPTIONS'] = options_before
+            connections.close_all()
+            for suffix in ('', '-wal', '-shm'):
+                if os.path.exists(copy + suffix):
+                    os.remove(copy + suffix)
+
+    def run_mode(self, mode, path, organization_id, trainer_id, options):
+        tuned = mode == 'tuned'
+        # WAL is stored in the file: switch it explicitly for both modes
+        with sqlite3.connect(path) as db:
+            db.execute(f"PRAGMA journal_mode = {'WAL' if tuned else 'DELETE'}")
+
+        # Forked workers open their connections from these settings
+        connection.settings_dict['NAME'] = path
+        connection.settings_dict['OPTIONS'] = {**self.untuned, **sqlite_options()} if tuned else self.untuned
+        connections.close_all()
+
+        context = multiprocessing.get_context('fork')
+        queue = context.Queue()
+        roles = ['reader'] * options['readers'] + ['writer'] * options['writers']
+        processes = [
+            context.Process(target=worker, args=(role, organization_id, trainer_id, options['seconds'], queue))
+            for role in roles
+        ]
+        for process in processes:
+            process.start()
+        results = [queue.get() for _ in processes]
+        for process in processes:
+            process.join()
+
+        totals = {'reader': [0, 0, []], 'writer': [0, 0, []]}
+        for role, done, errors, latencies in results:
+            totals[role][0] += done
+            totals[role][1] += errors
+            totals[role][2].extend(latencies)
+        reads, read_errors, read_ms = totals['reader']
+        writes, write_errors, write_ms = totals['writer']
+        seconds = options['seconds']
+        self.stdout.write(
+            f'{mode:8} {reads / seconds:9.0f} {writes / seconds:9.0f} {read_errors + write_errors:7} '
+            f'{percentile(read_ms, 95):9.1f} {max(read_ms, default=0):9.1f} '
+            f'{percentile(write_ms, 95):10.1f} {max(write_ms, default=0):10.1f}'
+        )
+
+
+# To run this command:
+# python manage.py bench_sqlite_concurrency --readers 3 --writers 2 --seconds 10
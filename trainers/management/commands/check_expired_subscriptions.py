@@ -1,9 +1,15 @@
-
 from django.core.management.base import BaseCommand
 from django.utils import timezone
-from trainers.models import OrganizationInfo
-from django.core.mail import send_mail
+from trainers.models import (
+    OrganizationInfo, Staff,
+    SUB_STATE_UNKNOWN, SUB_STATE_ACTIVE, SUB_STATE_EXPIRING, SUB_STATE_GRACE, SUB_STATE_EXPIRED,
+)
+from django.core.mail import EmailMessage, get_connection
 from django.conf import settings
+from trainers.metrics import count_emails, timed
+
+REMINDER_DAYS = [7, 3, 1]
+
 
 class Command(BaseCommand):
     help = 'Check for expired subscriptions and send notifications'
@@ -15,105 +21,147 @@ class Command(BaseCommand):
             help='Send email notifications to expired organizations',
         )
 
+    @timed('check_expired_subscriptions')
     def handle(self, *args, **options):
         today = timezone.now().date()
         send_emails = options['send_emails']
-        
-        # Get all organizations
-        organizations = OrganizationInfo.objects.all()
-        
+
+        # One query: every organization, already classified by the database
+        organizations = list(
+            OrganizationInfo.objects.with_subscription_state(today).values(
+                'id', 'name', 'is_active', 'subscription_end_date', 'days_left', 'subscription_state'
+            )
+        )
+
         stats = {
-            'total': 0,
-            'active': 0,
-            'expiring_soon': 0,
-            'in_grace': 0,
-            'expired': 0,
+            'total': len(organizations),
+            SUB_STATE_ACTIVE: 0,
+            SUB_STATE_EXPIRING: 0,
+            SUB_STATE_GRACE: 0,
+            SUB_STATE_EXPIRED: 0,
             'emails_sent': 0
         }
-        
+
         self.stdout.write("\n" + "="*60)
         self.stdout.write(self.style.SUCCESS(f'فحص اشتراكات الجمعيات - {today}'))
         self.stdout.write("="*60 + "\n")
-        
+
+        to_notify = []  # (org, kind)
+
         for org in organizations:
-            stats['total'] += 1
-            days_left = org.days_until_expiration
-            
-            if days_left is None:
+            state = org['subscription_state']
+            days_left = org['days_left']
+
+            if state == SUB_STATE_UNKNOWN:
                 continue
-            
-            # Update organization status
-            was_active = org.is_active
-            org.check_and_update_status()
-            
-            # Categorize
-            if org.is_expired():
-                stats['expired'] += 1
+            stats[state] += 1
+
+            if state == SUB_STATE_EXPIRED:
                 status_symbol = self.style.ERROR('✗')
                 status_text = self.style.ERROR(f'منتهي ({abs(days_left)} يوم)')
-                
-                # Deactivated?
-                if was_active and not org.is_active:
-                    self.stdout.write(
-                        self.style.WARNING(f'  → تم إلغاء تفعيل: {org.name}')
-                    )
-                
-                # Send email notification
                 if send_emails:
-                    self._send_expiration_email(org, days_left)
-                    stats['emails_sent'] += 1
-                    
-            elif org.is_in_grace_period():
-                stats['in_grace'] += 1
+                    to_notify.append((org, 'expired'))
+
+            elif state == SUB_STATE_GRACE:
                 status_symbol = self.style.WARNING('⚠')
                 status_text = self.style.WARNING(f'فترة سماح ({abs(days_left)} يوم)')
-                
-            elif days_left <= 7:
-                stats['expiring_soon'] += 1
+
+            elif state == SUB_STATE_EXPIRING:
                 status_symbol = self.style.WARNING('!')
                 status_text = self.style.WARNING(f'قرب الانتهاء ({days_left} يوم)')
-                
-                # Send reminder email
-                if send_emails and days_left in [7, 3, 1]:
-                    self._send_reminder_email(org, days_left)
-                    stats['emails_sent'] += 1
-                    
+                if send_emails and days_left in REMINDER_DAYS:
+                    to_notify.append((org, 'reminder'))
+
             else:
-                stats['active'] += 1
                 status_symbol = self.style.SUCCESS('✓')
                 status_text = self.style.SUCCESS(f'نشط ({days_left} يوم)')
-            
+
             # Print organization status
             self.stdout.write(
-                f'{status_symbol} {org.name:30} → {status_text}'
+                f'{status_symbol} {org["name"]:30} → {status_text}'
             )
-        
+            if state == SUB_STATE_EXPIRED and org['is_active']:
+                self.stdout.write(
+                    self.style.WARNING(f'  → تم إلغاء تفعيل: {org["name"]}')
+                )
+
+        # One UPDATE for the whole active → inactive transition
+        OrganizationInfo.objects.with_subscription_state(today).filter(
+            subscription_state=SUB_STATE_EXPIRED, is_active=True
+        ).update(is_active=False)
+
+        if to_notify:
+            stats['emails_sent'] = self._send_notifications(to_notify)
+
         # Print summary
         self.stdout.write("\n" + "="*60)
         self.stdout.write(self.style.SUCCESS('ملخص الفحص:'))
         self.stdout.write("="*60)
         self.stdout.write(f'إجمالي الجمعيات: {stats["total"]}')
-        self.stdout.write(self.style.SUCCESS(f'✓ نشطة: {stats["active"]}'))
-        self.stdout.write(self.style.WARNING(f'! قرب الانتهاء: {stats["expiring_soon"]}'))
-        self.stdout.write(self.style.WARNING(f'⚠ فترة سماح: {stats["in_grace"]}'))
-        self.stdout.write(self.style.ERROR(f'✗ منتهية: {stats["expired"]}'))
-        
+        self.stdout.write(self.style.SUCCESS(f'✓ نشطة: {stats[SUB_STATE_ACTIVE]}'))
+        self.stdout.write(self.style.WARNING(f'! قرب الانتهاء: {stats[SUB_STATE_EXPIRING]}'))
+        self.stdout.write(self.style.WARNING(f'⚠ فترة سماح: {stats[SUB_STATE_GRACE]}'))
+        self.stdout.write(self.style.ERROR(f'✗ منتهية: {stats[SUB_STATE_EXPIRED]}'))
+
         if send_emails:
             self.stdout.write(f'📧 رسائل مرسلة: {stats["emails_sent"]}')
-        
+
         self.stdout.write("="*60 + "\n")
 
-    def _send_expiration_email(self, org, days_overdue):
-        """Send email notification for expired subscription"""
-        subject = f'⚠️ اشتراك {org.name} منتهي'
-        
+    def _send_notifications(self, to_notify):
+        """Admin emails in one query, every message over one SMTP connection"""
+        admin_emails = {}
+        for org_id, email in Staff.objects.filter(
+            organization_id__in=[org['id'] for org, _kind in to_notify],
+            is_admin=True,
+        ).exclude(email='').values_list('organization_id', 'email'):
+            admin_emails.setdefault(org_id, []).append(email)
+
+        messages = []
+        for org, kind in to_notify:
+            recipients = admin_emails.get(org['id'])
+            if not recipients:
+                continue
+            if kind == 'expired':
+                subject, body = self._expiration_email(org, org['days_left'])
+            else:
+                subject, body = self._reminder_email(org, org['days_left'])
+            messages.append(EmailMessage(
+                subject=subject,
+                body=body,
+                from_email=settings.DEFAULT_FROM_EMAIL,
+                to=recipients,
+            ))
+
+        if not messages:
+            return 0
+
+        try:
+            connection = get_connection(fail_silently=False)
+            sent = connection.send_messages(messages) or 0
+            count_emails('subscription', sent, failed=len(messages) - sent)
+            self.stdout.write(
+                self.style.SUCCESS(f'  📧 تم إرسال {sent} رسالة')
+            )
+            return sent
+        except Exception as e:
+            count_emails('subscription', 0, failed=len(messages))
+            self.stdout.write(
+                self.style.ERROR(f'  ✗ فشل إرسال البريد: {str(e)}')
+            )
+            return 0
+
+    def _expiration_email(self, org, days_overdue):
+        """Email notification for expired subscription"""
+        subject = f'⚠️ اشتراك {org["name"]} منتهي'
+
         message = f"""
 السلام عليكم،
 
-نود إعلامكم أن اشتراك جمعية {org.name} قد انتهى منذ {abs(days_overdue)} يوم.
+نود إعلامكم أن اشتراك جمعية {org["name"]} قد انتهى منذ {abs(days_overdue)} يوم.
 
 تفاصيل الاشتراك:
-- تاريخ الانتهاء: {org.subscription_end_date}
+- تاريخ الانتهاء: {org["subscription_end_date"]}
 - الحالة: منتهي
 
 للحفاظ على خدماتكم، يرجى تجديد الاشتراك في أقرب وقت ممكن.
@@ -123,39 +171,19 @@ class Command(BaseCommand):
 شكراً لكم،
 فريق الدعم
         """
-        
-        try:
-            # Get admin emails for this organization
-            admin_emails = org.staff_set.filter(is_admin=True).values_list('email', flat=True)
-            admin_emails = [email for email in admin_emails if email]
-            
-            if admin_emails:
-                send_mail(
-                    subject=subject,
-                    message=message,
-                    from_email=settings.DEFAULT_FROM_EMAIL,
-                    recipient_list=admin_emails,
-                    fail_silently=False,
-                )
-                self.stdout.write(
-                    self.style.SUCCESS(f'  📧 تم إرسال بريد إلى {len(admin_emails)} مسؤول')
-                )
-        except Exception as e:
-            self.stdout.write(
-                self.style.ERROR(f'  ✗ فشل إرسال البريد: {str(e)}')
-            )
+        return subject, message
+
+    def _reminder_email(self, org, days_left):
+        """Reminder email before expiration"""
+        subject = f'⏰ تذكير: اشتراك {org["name"]} سينتهي خلال {days_left} يوم'
 
-    def _send_reminder_email(self, org, days_left):
-        """Send reminder email before expiration"""
-        subject = f'⏰ تذكير: اشتراك {org.name} سينتهي خلال {days_left} يوم'
-        
         message = f"""
 السلام عليكم،
 
-نود تذكيركم أن اشتراك جمعية {org.name} سينتهي خلال {days_left} يوم فقط.
+نود تذكيركم أن اشتراك جمعية {org["name"]} سينتهي خلال {days_left} يوم فقط.
 
 تفاصيل الاشتراك:
-- تاريخ الانتهاء: {org.subscription_end_date}
+- تاريخ الانتهاء: {org["subscription_end_date"]}
 - الأيام المتبقية: {days_left}
 
 للحفاظ على استمرارية خدماتكم، يرجى تجديد الاشتراك قبل انتهائه.
@@ -165,21 +193,7 @@ class Command(BaseCommand):
 شكراً لكم،
 فريق الدعم
         """
-        
-        try:
-            admin_emails = org.staff_set.filter(is_admin=True).values_list('email', flat=True)
-            admin_emails = [email for email in admin_emails if email]
-            
-            if admin_emails:
-                send_mail(
-                    subject=subject,
-                    message=message,
-                    from_email=settings.DEFAULT_FROM_EMAIL,
-                    recipient_list=admin_emails,
-                    fail_silently=False,
-                )
-        except Exception as e:
-            pass  # Silent failure for reminders
+        return subject, message
 
 
 # To run this command:
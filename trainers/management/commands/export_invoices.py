@@ -0,0 +1,51 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from trainers.metrics import timed
+from trainers.models import OrganizationInfo
+from trainers.payments.invoice_bulk import DEFAULT_WORKERS, filter_report_payments, iter_invoices_zip
+
+
+class Command(BaseCommand):
+    help = 'Render every invoice matching the reports filters into one ZIP file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('org_slug', help='Organization slug')
+        parser.add_argument('--output', default='invoices.zip', help='ZIP file to write')
+        parser.add_argument('--category', help='Payment category (month, subscription, assurance, jawaz)')
+        parser.add_argument('--start-date', help='YYYY-MM-DD')
+        parser.add_argument('--end-date', help='YYYY-MM-DD')
+        parser.add_argument('--trainer-category', help='Trainee category')
+        parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS, help='Rendering processes')
+
+    @timed('export_invoices')
+    def handle(self, *args, **options):
+        try:
+            organization = OrganizationInfo.objects.get(slug=options['org_slug'])
+        except OrganizationInfo.DoesNotExist:
+            raise CommandError(f"Organization '{options['org_slug']}' not found")
+
+        payments = filter_report_payments(
+            organization,
+            payment_category=options['category'],
+            start_date=options['start_date'],
+            end_date=options['end_date'],
+            trainer_category=options['trainer_category'],
+        ).order_by('paymentdate', 'id')
+
+        stats = {}
+        size = 0
+        with open(options['output'], 'wb') as f:
+            for chunk in iter_invoices_zip(payments.iterator(chunk_size=200), options['workers'], stats):
+                f.write(chunk)
+                size += len(chunk)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"✓ {stats['count']} إيصال → {options['output']} ({size / 1024 / 1024:.1f} MB)"
+        ))
+        self.stdout.write(
+            f"{stats['seconds']:.2f}s | {stats['per_second']:.1f} إيصال/ثانية | {options['workers']} عملية"
+        )
+
+
+# To run this command:
+# python manage.py export_invoices nojoum-arkana --category month --start-date 2025-01-01 --end-date 2025-01-31
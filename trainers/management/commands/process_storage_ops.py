@@ -0,0 +1,69 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db.models import Count
+
+from trainers.metrics import timed
+from trainers.models import StorageOperation
+from trainers.storage_ops import process_pending
+
+
+class Command(BaseCommand):
+    help = 'Run queued storage operations (remote deletes, thumbnails) with retries'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--limit',
+            type=int,
+            default=50,
+            help='Maximum operations per batch',
+        )
+        parser.add_argument(
+            '--loop',
+            action='store_true',
+            help='Keep polling the queue instead of exiting after one pass',
+        )
+        parser.add_argument(
+            '--sleep',
+            type=int,
+            default=10,
+            help='Seconds to wait between polls when the queue is empty (with --loop)',
+        )
+
+    def handle(self, *args, **options):
+        limit = options['limit']
+
+        while True:
+            total_ok = total_failed = 0
+            # Drain everything that is currently due
+            with timed('process_storage_ops'):
+                while True:
+                    ok, failed = process_pending(limit)
+                    total_ok += ok
+                    total_failed += failed
+                    if ok + failed < limit:
+                        break
+
+            if total_ok or total_failed:
+                self.stdout.write(
+                    self.style.SUCCESS(f'✓ منجزة: {total_ok}') + '  ' +
+                    self.style.ERROR(f'✗ فشلت: {total_failed}')
+                )
+
+            if not options['loop']:
+                break
+            time.sleep(options['sleep'])
+
+        counts = dict(
+            StorageOperation.objects.values_list('status').annotate(n=Count('id'))
+        )
+        self.stdout.write(
+            f"قيد الانتظار: {counts.get('pending', 0)} | "
+            f"قيد التنفيذ: {counts.get('running', 0)} | "
+            f"فشلت نهائياً: {counts.get('failed', 0)}"
+        )
+
+
+# To run this command:
+# python manage.py process_storage_ops
+# python manage.py process_storage_ops --loop --sleep 5
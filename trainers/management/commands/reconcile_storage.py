@@ -0,0 +1,59 @@
+from django.core.management.base import BaseCommand
+
+from trainers.models import StorageOperation
+from trainers.storage_ops import discard_staged, find_abandoned_staged, find_orphans
+
+
+class Command(BaseCommand):
+    help = 'Find stored blobs that no trainee or document references anymore, and abandoned staged uploads'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--prefix',
+            default='organizations',
+            help='Storage directory to scan',
+        )
+        parser.add_argument(
+            '--enqueue',
+            action='store_true',
+            help='Queue deletion of the orphaned blobs',
+        )
+        parser.add_argument(
+            '--purge-staged',
+            action='store_true',
+            help='Delete staged uploads that no upload operation will push',
+        )
+
+    def handle(self, *args, **options):
+        orphans = find_orphans(options['prefix'])
+
+        self.stdout.write("\n" + "="*60)
+        self.stdout.write(self.style.SUCCESS(f'ملفات غير مرتبطة: {len(orphans)}'))
+        self.stdout.write("="*60)
+
+        for name in orphans:
+            self.stdout.write(f'  {name}')
+
+        if options['enqueue'] and orphans:
+            StorageOperation.objects.bulk_create([
+                StorageOperation(operation='delete', name=name)
+                for name in orphans
+            ])
+            self.stdout.write(
+                self.style.WARNING(f'→ تمت جدولة حذف {len(orphans)} ملف')
+            )
+
+        abandoned = find_abandoned_staged()
+        self.stdout.write(self.style.SUCCESS(f'ملفات مؤقتة مهملة: {len(abandoned)}'))
+        for name in abandoned:
+            self.stdout.write(f'  {name}')
+
+        if options['purge_staged'] and abandoned:
+            discard_staged(abandoned)
+            self.stdout.write(self.style.WARNING(f'→ تم حذف {len(abandoned)} ملف مؤقت'))
+
+
+# To run this command:
+# python manage.py reconcile_storage
+# python manage.py reconcile_storage --enqueue
+# python manage.py reconcile_storage --purge-staged
@@ -0,0 +1,277 @@
+import random
+import time
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, transaction
+from django.utils import timezone
+
+from trainers.models import (
+    Addedpay, Article, Costs, OrganizationInfo, Payments, Staff, Trainer, TrainerDocument,
+)
+
+FIRST_NAMES = ['محمد', 'أحمد', 'يوسف', 'ياسين', 'آدم', 'عمر', 'حمزة', 'إلياس', 'مريم', 'فاطمة',
+               'سلمى', 'خديجة', 'هبة', 'إيمان', 'سارة', 'نوال', 'أيوب', 'زكرياء', 'بلال', 'أنس']
+LAST_NAMES = ['العلوي', 'الإدريسي', 'بنعلي', 'الفاسي', 'المراكشي', 'السوسي', 'البركاني', 'التازي',
+              'الحسني', 'الصنهاجي', 'أمزيان', 'أوعلي', 'بوحنيف', 'الشرقاوي', 'الأمين', 'الرحماني']
+COSTS = ['الكراء', 'الكهرباء', 'الماء', 'معدات', 'نقل', 'صيانة']
+ADDED = ['منحة', 'تبرع', 'دعم الجماعة', 'مداخيل حفل']
+
+# Payment amounts per category
+AMOUNTS = {'month': Decimal('100'), 'subscription': Decimal('50'),
+           'assurance': Decimal('100'), 'jawaz': Decimal('150')}
+
+
+class Command(BaseCommand):
+    help = (
+        'Generate a deterministic production-scale dataset (bulk_create only). '
+        '3 years ≈ 36 payments per trainee: --orgs 10 --trainees 2800 ≈ 1M payments'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--orgs', type=int, default=10, help='Organizations')
+        parser.add_argument('--trainees', type=int, default=500, help='Trainees per organization')
+        parser.add_argument('--years', type=int, default=3, help='Years of payment history')
+        parser.add_argument('--articles', type=int, default=40, help='Articles (events) per organization')
+        parser.add_argument('--staff', type=int, default=3, help='Staff accounts per organization')
+        parser.add_argument('--documents', type=float, default=0.5, help='Share of trainees with documents (0-1)')
+        parser.add_argument('--seed', type=int, default=42, help='Random seed (same seed + end date = same data)')
+        parser.add_argument('--end-date', help='Last day of history, YYYY-MM-DD (default: today)')
+        parser.add_argument('--prefix', default='bench', help='Slug / username prefix of generated rows')
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--replace', action='store_true',
+                            help='Delete a previous dataset with the same prefix first')
+
+    def handle(self, *args, **options):
+        self.options = options
+        self.prefix = options['prefix']
+        self.batch_size = options['batch_size']
+        self.end = date.fromisoformat(options['end_date']) if options['end_date'] else timezone.now().date()
+        self.start = self.end.replace(year=self.end.year - options['years'], day=1)
+        self.counts = {}
+
+        existing = OrganizationInfo.objects.filter(slug__startswith=f'{self.prefix}-')
+        if existing.exists():
+            if not options['replace']:
+                raise CommandError(f"بيانات '{self.prefix}' موجودة مسبقاً (استعمل --replace)")
+            self.delete_previous(existing)
+
+        started = time.perf_counter()
+        with transaction.atomic():
+            password = make_password('bench')  # hashed once for every account
+            organizations = self.create_organizations()
+            for index, organization in enumerate(organizations):
+                rng = random.Random(f"{options['seed']}-{index}")
+                trainers = self.create_trainers(organization, index, rng)
+                self.create_payments(organization, trainers, rng)
+                self.create_documents(trainers, rng)
+                self.create_articles(organization, trainers, rng)
+                self.create_finances(organization, rng)
+                self.create_staff(organization, index, password)
+                self.stdout.write(f'  ✓ {organization.name}: {len(trainers)} متدرب')
+        seconds = time.perf_counter() - started
+
+        self.stdout.write("\n" + "=" * 60)
+        self.stdout.write(self.style.SUCCESS(f'تم إنشاء البيانات في {seconds:.1f} ثانية'))
+        self.stdout.write("=" * 60)
+        for name, count in self.counts.items():
+            self.stdout.write(f'{name:20} {count:>10,}')
+        payments = self.counts.get('payments', 0)
+        self.stdout.write(f'{"payments/s":20} {payments / seconds:>10,.0f}')
+        self.stdout.write(f"الدخول: {self.prefix}-0-staff0 / bench")
+
+    # ------------------------------------------------------------------
+
+    def bulk(self, name, model, objects):
+        created = model.objects.bulk_create(objects, batch_size=self.batch_size)
+        self.counts[name] = self.counts.get(name, 0) + len(objects)
+        return created
+
+    def delete_previous(self, organizations):
+        """
+        One SQL DELETE per table: QuerySet.delete() would send the Payments /
+        Trainer signals, loading every row one by one. Children go first, so
+        the organizations left have nothing to cascade to.
+        """
+        ids = list(organizations.values_list('id', flat=True))
+        using = organizations.db
+        connection = connections[using]
+        quote = connection.ops.quote_name
+        querysets = (
+            Article.trainees.through.objects.filter(article__organization_id__in=ids),
+            TrainerDocument.objects.filter(trainer__organization_id__in=ids),
+            Payments.objects.filter(organization_id__in=ids),
+            Article.objects.filter(organization_id__in=ids),
+            Costs.objects.filter(organization_id__in=ids),
+            Addedpay.objects.filter(organization_id__in=ids),
+            Staff.objects.filter(organization_id__in=ids),
+            Trainer.objects.filter(organization_id__in=ids),
+            User.objects.filter(username__startswith=f'{self.prefix}-'),
+        )
+        with transaction.atomic(using=using), connection.cursor() as cursor:
+            for queryset in querysets:
+                meta = queryset.model._meta
+                select, params = queryset.values('pk').query.sql_with_params()
+                cursor.execute(
+                    f'DELETE FROM {quote(meta.db_table)} WHERE {quote(meta.pk.column)} IN ({select})', params
+                )
+            organizations.delete()
+        self.stdout.write(self.style.WARNING(f'تم حذف {len(ids)} جمعية سابقة'))
+
+    def create_organizations(self):
+        rng = random.Random(f"{self.options['seed']}-organizations")
+        organizations = []
+        for i in range(self.options['orgs']):
+            # Mix of healthy, expiring, in-grace and expired subscriptions
+            end = self.end + timedelta(days=rng.choice([-30, -5, 3, 20, 90, 200, 365]))
+            organizations.append(OrganizationInfo(
+                name=f'جمعية {i + 1}', slug=f'{self.prefix}-{i}',
+                location=rng.choice(['أكادير', 'مراكش', 'الرباط', 'فاس']),
+                rent_amount=Decimal(rng.choice([0, 500, 1000, 1500])),
+                max_trainers=self.options['trainees'] + 100,
+                subscription_status='active', subscription_tier='premium',
+                trial_start=self.start, established_date=self.start,
+                subscription_start_date=self.start, subscription_end_date=end,
+            ))
+        # bulk_create: save() would (re)start a trial
+        self.bulk('organizations', OrganizationInfo, organizations)
+        return list(OrganizationInfo.objects.filter(slug__startswith=f'{self.prefix}-').order_by('id'))
+
+    def create_trainers(self, organization, index, rng):
+        categories = [choice for choice, _label in Trainer.CatChoices]
+        belts = [choice for choice, _label in Trainer.belts]
+        trainers = []
+        for n in range(self.options['trainees']):
+            category = rng.choice(categories)
+            # Most trainees predate the history window, the rest joined during it
+            started = self.start - timedelta(days=rng.randrange(365 * 3))
+            if rng.random() < 0.3:
+                started = self.start + timedelta(days=rng.randrange((self.end - self.start).days or 1))
+            trainers.append(Trainer(
+                organization=organization,
+                first_name=rng.choice(FIRST_NAMES), last_name=f'{rng.choice(LAST_NAMES)} {n}',
+                birth_day=self.end - timedelta(days=rng.randrange(6 * 365, 40 * 365)),
+                male_female='female' if category == 'نساء' or rng.random() < 0.3 else 'male',
+                phone=f'06{rng.randrange(10 ** 8):08d}', email=f'{self.prefix}{index}.{n}@example.com',
+                CIN=f'J{rng.randrange(10 ** 6):06d}', address=organization.location,
+                belt_degree=rng.choice(belts), category=category,
+                started_day=started, is_active=rng.random() < 0.85,
+            ))
+        self.bulk('trainees', Trainer, trainers)
+        # Primary keys in a backend-independent way (MySQL bulk_create does not return them)
+        return list(Trainer.objects.filter(organization=organization).order_by('id').values_list('id', 'started_day'))
+
+    def create_payments(self, organization, trainers, rng):
+        # Positional Payments(id, organization_id, trainer_id, paymentdate, paymentCategry,
+        # paymentAmount): this loop builds the 1M rows, keyword arguments cost ~30% more
+        assert [field.attname for field in Payments._meta.concrete_fields] == [
+            'id', 'organization_id', 'trainer_id', 'paymentdate', 'paymentCategry', 'paymentAmount']
+        org_id = organization.id
+        random = rng.random
+        monthly = AMOUNTS['month']
+        yearly = [('subscription', 0.95), ('assurance', 0.9), ('jawaz', 0.3)]
+
+        # Monthly fees are paid between the 1st and the 10th
+        months = []
+        month = self.start
+        while month <= self.end:
+            months.append([day for day in (month + timedelta(days=d) for d in range(10)) if day <= self.end])
+            month = (month + timedelta(days=32)).replace(day=1)
+
+        payments = []
+        for trainer_id, started in trainers:
+            first = max(started, self.start)
+            # ~10% unpaid months
+            first_month = (first.year - self.start.year) * 12 + first.month - self.start.month
+            for days in months[first_month:]:
+                if random() < 0.9:
+                    payments.append(Payments(None, org_id, trainer_id, days[int(random() * len(days))], 'month', monthly))
+            # Yearly: subscription + assurance every season, jawaz now and then
+            for season in range(first.year, self.end.year + 1):
+                day = max(first, date(season, 9, 1) - timedelta(days=int(random() * 60)))
+                if day > self.end:
+                    continue
+                for category, probability in yearly:
+                    if random() < probability:
+                        paid = day + timedelta(days=int(random() * 5))
+                        payments.append(Payments(None, org_id, trainer_id, paid, category, AMOUNTS[category]))
+        self.bulk('payments', Payments, payments)
+
+    def create_documents(self, trainers, rng):
+        doc_types = [choice for choice, _label in TrainerDocument.DOC_TYPES]
+        documents = []
+        for trainer_id, _started in trainers:
+            if rng.random() >= self.options['documents']:
+                continue
+            for doc_type in rng.sample(doc_types, rng.randint(1, len(doc_types))):
+                # Names only: nothing is uploaded to the storage backend
+                documents.append(TrainerDocument(
+                    trainer_id=trainer_id, document_type=doc_type,
+                    file=f'benchmark/documents/{trainer_id}-{doc_types.index(doc_type)}.pdf',
+                ))
+        self.bulk('documents', TrainerDocument, documents)
+
+    def create_articles(self, organization, trainers, rng):
+        categories = [choice for choice, _label in Article.cts]
+        areas = [choice for choice, _label in Article.choices]
+        days = (self.end - self.start).days or 1
+        articles = [
+            Article(
+                organization=organization, title=f'نشاط {n + 1}',
+                date=self.start + timedelta(days=rng.randrange(days)),
+                content='<p>نشاط تجريبي</p>', category=rng.choice(categories), area=rng.choice(areas),
+                costs=Decimal(rng.randrange(0, 3000, 100)), participetion_price=Decimal(rng.choice([0, 20, 50])),
+            )
+            for n in range(self.options['articles'])
+        ]
+        self.bulk('articles', Article, articles)
+
+        trainer_ids = [trainer_id for trainer_id, _started in trainers]
+        Through = Article.trainees.through
+        links = []
+        for article_id in Article.objects.filter(organization=organization).values_list('id', flat=True):
+            for trainer_id in rng.sample(trainer_ids, min(len(trainer_ids), rng.randint(5, 30))):
+                links.append(Through(article_id=article_id, trainer_id=trainer_id))
+        self.bulk('article_trainees', Through, links)
+
+    def create_finances(self, organization, rng):
+        costs, added = [], []
+        year, month = self.start.year, self.start.month
+        while (year, month) <= (self.end.year, self.end.month):
+            for _ in range(rng.randint(2, 6)):
+                costs.append(Costs(
+                    organization=organization, cost=rng.choice(COSTS),
+                    amount=Decimal(rng.randrange(100, 5000, 50)),
+                    date=timezone.make_aware(datetime(year, month, rng.randint(1, 28))),
+                    is_recurring=rng.random() < 0.3,
+                ))
+            if rng.random() < 0.4:
+                added.append(Addedpay(
+                    organization=organization, title=rng.choice(ADDED),
+                    amount=Decimal(rng.randrange(500, 20000, 500)),
+                    date=timezone.make_aware(datetime(year, month, rng.randint(1, 28))),
+                ))
+            month += 1
+            if month > 12:
+                year, month = year + 1, 1
+        self.bulk('costs', Costs, costs)
+        self.bulk('added_payments', Addedpay, added)
+
+    def create_staff(self, organization, index, password):
+        usernames = [f'{self.prefix}-{index}-staff{n}' for n in range(self.options['staff'])]
+        self.bulk('users', User, [User(username=username, password=password) for username in usernames])
+        users = User.objects.filter(username__in=usernames).order_by('username')
+        self.bulk('staff', Staff, [
+            Staff(organization=organization, user=user, role='مالك' if n == 0 else 'مدرب',
+                  is_admin=n == 0, salary=Decimal(0 if n == 0 else 2000),
+                  email=f'{user.username}@example.com')
+            for n, user in enumerate(users)
+        ])
+
+
+# To run this command:
+# python manage.py seed_benchmark_data --orgs 10 --trainees 2800 --years 3
+# python manage.py seed_benchmark_data --orgs 2 --trainees 200 --seed 7 --replace
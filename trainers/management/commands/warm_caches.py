@@ -0,0 +1,72 @@
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from trainers.warmup import cache_is_shared, recent_organizations, warm_organization
+
+LOCK_KEY = 'warm_caches:lock'
+
+
+class Command(BaseCommand):
+    help = 'Precompute dashboard KPIs, chart data and financial summaries of recently active organizations'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=30, help='Activity window (payments or staff logins)')
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='Process pool size')
+        parser.add_argument('--refresh', action='store_true',
+                            help='Recompute entries that are still cached (default: only fill misses)')
+        parser.add_argument('--lock-timeout', type=int, default=600,
+                            help='Seconds before a crashed run stops blocking the next one')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        # Scheduled runs must not overlap (only effective with a shared cache)
+        if not cache.add(LOCK_KEY, os.getpid(), options['lock_timeout']):
+            self.stdout.write(self.style.WARNING('warm_caches يعمل بالفعل، تم التخطي'))
+            return
+        try:
+            organization_ids = recent_organizations(options['days'])
+            workers = min(options['workers'], len(organization_ids)) or 1
+            if not cache_is_shared() and workers > 1:
+                # Entries written by pool processes would die with them
+                self.stdout.write(self.style.WARNING(
+                    'الذاكرة المؤقتة محلية (LocMem): التسخين داخل هذه العملية فقط'
+                ))
+                workers = 1
+            results = self.warm(organization_ids, workers, options['refresh'])
+        finally:
+            cache.delete(LOCK_KEY)
+
+        seconds = time.perf_counter() - started
+        errors = sum(result[2] for result in results)
+        slowest = max(results, key=lambda result: result[1], default=None)
+
+        self.stdout.write("\n" + "=" * 60)
+        self.stdout.write(self.style.SUCCESS(
+            f'تم تسخين {len(results)} جمعية في {seconds:.2f}s ({workers} عملية)'
+        ))
+        self.stdout.write("=" * 60)
+        if slowest:
+            self.stdout.write(f'slowest: organization {slowest[0]} ({slowest[1]:.2f}s)')
+        if errors:
+            self.stdout.write(self.style.ERROR(f'أخطاء: {errors}'))
+
+    def warm(self, organization_ids, workers, refresh):
+        if workers <= 1:
+            return [warm_organization(pk, refresh) for pk in organization_ids]
+
+        # Children open their own connections
+        connections.close_all()
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('fork')) as pool:
+            return list(pool.map(warm_organization, organization_ids, [refresh] * len(organization_ids)))
+
+
+# To run this command:
+# python manage.py warm_caches --days 30 --workers 4
+# Cron (every 5 minutes, with a shared cache such as Redis):
+# */5 * * * * cd /path/to/project && python manage.py warm_caches
@@ -0,0 +1,416 @@
+"""
+In-process metrics (Prometheus text exposition format)
+Every process (gunicorn worker, management command) keeps its counters and
+histograms in memory and writes a snapshot to settings.METRICS_DIR/<pid>.json
+at most once per METRICS_FLUSH_SECONDS and at exit. GET /metrics sums the
+snapshots of all processes, so any worker answers for the whole server.
+Snapshots of exited processes are folded into archive.json.
+
+Clear METRICS_DIR when the server (re)starts, like prometheus_client's
+multiprocess directory.
+"""
+import atexit
+import json
+import os
+import re
+import threading
+import time
+from contextlib import ContextDecorator, ExitStack
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.cache.backends.redis import RedisCache
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.http import HttpResponse, HttpResponseForbidden
+from django.utils.crypto import constant_time_compare
+
+try:
+    import fcntl
+except ImportError:  # Windows dev machines: no compaction, files are still summed
+    fcntl = None
+
+FLUSH_SECONDS = getattr(settings, 'METRICS_FLUSH_SECONDS', 1.0)
+ARCHIVE_FILE = 'archive.json'
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+JOB_BUCKETS = (0.1, 0.5, 1, 5, 10, 30, 60, 300, 900, 3600)
+
+
+# ======================================================
+# Registry
+# ======================================================
+
+_lock = threading.Lock()
+_metrics = {}   # name -> Counter / Histogram
+_values = {}    # (name, label values) -> float (counter) or [bucket counts, sum, count]
+_last_flush = 0.0
+
+
+class Counter:
+    type = 'counter'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        _metrics[name] = self
+
+    def inc(self, amount=1, **labels):
+        key = (self.name, tuple(str(labels[label]) for label in self.labelnames))
+        with _lock:
+            _values[key] = _values.get(key, 0) + amount
+        _maybe_flush()
+
+
+class Histogram:
+    type = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        _metrics[name] = self
+
+    def observe(self, value, **labels):
+        key = (self.name, tuple(str(labels[label]) for label in self.labelnames))
+        with _lock:
+            entry = _values.get(key)
+            if entry is None:
+                entry = _values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry[0][i] += 1
+                    break
+            entry[1] += value
+            entry[2] += 1
+        _maybe_flush()
+
+
+REQUESTS = Counter('crm_http_requests_total', 'HTTP requests', ('view', 'method', 'status'))
+VIEW_LATENCY = Histogram('crm_view_latency_seconds', 'Request latency per view', ('view', 'method'))
+VIEW_QUERIES = Histogram('crm_view_db_queries', 'Database queries per request', ('view',), QUERY_BUCKETS)
+CACHE_REQUESTS = Counter('crm_cache_requests_total', 'Cache lookups per key namespace', ('namespace', 'result'))
+JOB_DURATION = Histogram('crm_job_duration_seconds', 'Exports, imports and scheduled jobs', ('job', 'status'), JOB_BUCKETS)
+EMAILS = Counter('crm_emails_total', 'Emails handed to the mail backend', ('kind', 'result'))
+
+
+class timed(ContextDecorator):
+    """`with timed('export_xls'):` or `@timed('export_xls')` → JOB_DURATION"""
+
+    def __init__(self, job):
+        self.job = job
+
+    def __enter__(self):
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        JOB_DURATION.observe(
+            time.perf_counter() - self._started,
+            job=self.job, status='error' if exc_type else 'ok',
+        )
+        return False
+
+
+def count_emails(kind, sent, failed=0):
+    if sent:
+        EMAILS.inc(sent, kind=kind, result='sent')
+    if failed:
+        EMAILS.inc(failed, kind=kind, result='failed')
+
+
+# ======================================================
+# Snapshots shared between processes
+# ======================================================
+
+def metrics_dir():
+    return getattr(settings, 'METRICS_DIR', os.path.join(settings.BASE_DIR, 'metrics'))
+
+
+def _write_json(path, data):
+    tmp = f'{path}.{os.getpid()}.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(data, f)
+    os.replace(tmp, path)
+
+
+def _snapshot():
+    """This process's values, in the snapshot file format"""
+    with _lock:
+        return [
+            [name, list(labels), [list(value[0]), value[1], value[2]] if isinstance(value, list) else value]
+            for (name, labels), value in _values.items()
+        ]
+
+
+def flush():
+    """Write this process's values to its snapshot file"""
+    global _last_flush
+    data = _snapshot()
+    _last_flush = time.monotonic()
+    if not data:
+        return
+    directory = metrics_dir()
+    os.makedirs(directory, exist_ok=True)
+    _write_json(os.path.join(directory, f'{os.getpid()}.json'), data)
+
+
+def _maybe_flush():
+    if time.monotonic() - _last_flush >= FLUSH_SECONDS:
+        try:
+            flush()
+        except OSError:
+            pass
+
+
+@atexit.register
+def _flush_at_exit():
+    try:
+        flush()
+    except OSError:
+        pass
+
+
+def _merge(total, data):
+    for name, labels, value in data:
+        key = (name, tuple(labels))
+        current = total.get(key)
+        if current is None:
+            total[key] = [list(value[0]), value[1], value[2]] if isinstance(value, list) else value
+        elif isinstance(value, list):
+            for i, n in enumerate(value[0]):
+                current[0][i] += n
+            current[1] += value[1]
+            current[2] += value[2]
+        else:
+            total[key] = current + value
+
+
+def _read(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return []
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _compact(directory):
+    """Fold the snapshots of exited processes into archive.json (one compactor at a time)"""
+    if fcntl is None:
+        return
+    with open(os.path.join(directory, '.lock'), 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        archive_path = os.path.join(directory, ARCHIVE_FILE)
+        dead = []
+        for filename in os.listdir(directory):
+            pid = filename[:-5] if filename.endswith('.json') else ''
+            if pid.isdigit() and not _pid_alive(int(pid)):
+                dead.append(os.path.join(directory, filename))
+        if not dead:
+            return
+        total = {}
+        _merge(total, _read(archive_path))
+        for path in dead:
+            _merge(total, _read(path))
+        _write_json(archive_path, [[name, list(labels), value] for (name, labels), value in total.items()])
+        for path in dead:
+            os.remove(path)
+
+
+def collect():
+    """
+    Values summed over every process sharing METRICS_DIR
+    When METRICS_DIR is not writable this process's values are taken from
+    memory and the snapshots already there are still read.
+    """
+    directory = metrics_dir()
+    total = {}
+    own_file = None
+    try:
+        flush()
+    except OSError:
+        _merge(total, _snapshot())
+        own_file = f'{os.getpid()}.json'  # stale if present
+    try:
+        if not os.path.isdir(directory):
+            return total
+        _compact(directory)
+    except OSError:
+        pass
+    try:
+        filenames = os.listdir(directory)
+    except OSError:
+        return total
+    for filename in filenames:
+        if filename.endswith('.json') and filename != own_file:
+            _merge(total, _read(os.path.join(directory, filename)))
+    return total
+
+
+# ======================================================
+# Text exposition format
+# ======================================================
+
+def _escape(value):
+    return value.replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+
+
+def _labels(names, values, extra=None):
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _number(value):
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+def render_metrics(values):
+    lines = []
+    for name, metric in sorted(_metrics.items()):
+        samples = sorted((labels, value) for (n, labels), value in values.items() if n == name)
+        lines.append(f'# HELP {name} {metric.documentation}')
+        lines.append(f'# TYPE {name} {metric.type}')
+        for labels, value in samples:
+            if metric.type == 'counter':
+                lines.append(f'{name}{_labels(metric.labelnames, labels)} {_number(value)}')
+                continue
+            buckets, total, count = value
+            cumulative = 0
+            for bound, n in zip(metric.buckets, buckets):
+                cumulative += n
+                le = 'le="%s"' % bound
+                lines.append(f'{name}_bucket{_labels(metric.labelnames, labels, le)} {cumulative}')
+            le = 'le="+Inf"'
+            lines.append(f'{name}_bucket{_labels(metric.labelnames, labels, le)} {count}')
+            lines.append(f'{name}_sum{_labels(metric.labelnames, labels)} {_number(total)}')
+            lines.append(f'{name}_count{_labels(metric.labelnames, labels)} {count}')
+    return '\n'.join(lines) + '\n'
+
+
+def metrics_view(request):
+    """GET /metrics: `Authorization: Bearer <METRICS_TOKEN>` or a superuser session"""
+    token = getattr(settings, 'METRICS_TOKEN', '')
+    authorized = (
+        (token and constant_time_compare(request.headers.get('Authorization', ''), f'Bearer {token}'))
+        or (request.user.is_authenticated and request.user.is_superuser)
+    )
+    if not authorized:
+        return HttpResponseForbidden()
+    return HttpResponse(
+        render_metrics(collect()),
+        content_type='text/plain; version=0.0.4; charset=utf-8',
+    )
+
+
+# ======================================================
+# Collection points
+# ======================================================
+
+class _QueryCounter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+def _count_queries(queries):
+    stack = ExitStack()
+    for alias in connections:
+        stack.enter_context(connections[alias].execute_wrapper(queries))
+    return stack
+
+
+class MetricsMiddleware:
+    """Latency, status and query count per URL name (settings.METRICS_ENABLED)"""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'METRICS_ENABLED', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        queries = _QueryCounter()
+        started = time.perf_counter()
+        with _count_queries(queries):
+            response = self.get_response(request)
+        return self.record(request, response, queries, started)
+
+    async def __acall__(self, request):
+        queries = _QueryCounter()
+        started = time.perf_counter()
+        # Connections are per thread: count on the request's sync thread
+        stack = await sync_to_async(_count_queries)(queries)
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(stack.close)()
+        return self.record(request, response, queries, started)
+
+    def record(self, request, response, queries, started):
+        seconds = time.perf_counter() - started
+
+        # URL names only: unmatched paths must not create new label values
+        match = getattr(request, 'resolver_match', None)
+        view = (match.view_name or 'unnamed') if match else 'unmatched'
+        REQUESTS.inc(view=view, method=request.method, status=response.status_code)
+        VIEW_LATENCY.observe(seconds, view=view, method=request.method)
+        VIEW_QUERIES.observe(queries.count, view=view)
+        return response
+
+
+_NAMESPACE = re.compile(r'(.+?)(?::|_\d|$)')
+_MISSING = object()
+
+
+def cache_namespace(key):
+    """'kpis_12_month_2025-01-01' → 'kpis', 'trainers_select2:12:...' → 'trainers_select2'"""
+    return _NAMESPACE.match(str(key)).group(1)
+
+
+class MeteredCacheMixin:
+    """Counts hits and misses per key namespace (mix in before a cache backend)"""
+
+    def get(self, key, default=None, version=None):
+        value = super().get(key, _MISSING, version)
+        CACHE_REQUESTS.inc(namespace=cache_namespace(key), result='miss' if value is _MISSING else 'hit')
+        return default if value is _MISSING else value
+
+    def get_many(self, keys, version=None):
+        keys = list(keys)
+        found = super().get_many(keys, version)
+        for key in keys:
+            CACHE_REQUESTS.inc(namespace=cache_namespace(key), result='hit' if key in found else 'miss')
+        return found
+
+
+class MeteredLocMemCache(MeteredCacheMixin, LocMemCache):
+    pass
+
+
+class MeteredRedisCache(MeteredCacheMixin, RedisCache):
+    pass
@@ -2,18 +2,26 @@ from django.shortcuts import redirect, render
 from django.urls import reverse
 from .models import Staff
 from functools import wraps
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+import time
 from django.contrib import messages
 from django.utils import timezone
+from django.utils.deprecation import MiddlewareMixin
+from django.conf import settings
+from whitenoise.middleware import WhiteNoiseMiddleware
+from .db_router import request_routing, enable_replica_reads
 
-class OrganizationMiddleware:
+# Every middleware of the stack is sync and async capable: under ASGI a
+# sync-only one would hold a thread for the rest of the request.
+# MiddlewareMixin runs process_request/process_response in a thread only
+# for the duration of the hook.
+
+class OrganizationMiddleware(MiddlewareMixin):
     """
     Middleware to attach organization and staff to request based on logged-in user
     NOW WITH SUBSCRIPTION EXPIRATION CHECKING
     """
-    def __init__(self, get_response):
-        self.get_response = get_response
-
-    def __call__(self, request):
+    def process_request(self, request):
         request.organization = None
         request.staff = None
         request.subscription_status = None  # NEW
@@ -55,19 +63,25 @@ class OrganizationMiddleware:
                         'subscription_status': request.subscription_status
                     })
                 
-                # If subscription expiring soon, show warning (but allow access)
-                if days_left is not None and 0 < days_left <= 7 and staff.is_admin:
-                    messages.warning(
-                        request,
-                        f'⚠️ تحذير: اشتراك الجمعية سينتهي خلال {days_left} يوم!'
-                    )
-                
-                # If in grace period, show error (but allow access)
-                if organization.is_in_grace_period() and staff.is_admin:
-                    messages.error(
-                        request,
-                        f'🚨 تنبيه: اشتراك الجمعية منتهي منذ {abs(days_left)} يوم. يرجى التجديد قريباً!'
-                    )
+                # Subscription warnings are flashed once per session per day:
+                # AJAX calls never display messages, they would pile up in the session
+                today = timezone.now().date().isoformat()
+                if staff.is_admin and request.session.get('subscription_warned_on') != today:
+                    # If subscription expiring soon, show warning (but allow access)
+                    if days_left is not None and 0 < days_left <= 7:
+                        messages.warning(
+                            request,
+                            f'⚠️ تحذير: اشتراك الجمعية سينتهي خلال {days_left} يوم!'
+                        )
+                        request.session['subscription_warned_on'] = today
+
+                    # If in grace period, show error (but allow access)
+                    elif organization.is_in_grace_period():
+                        messages.error(
+                            request,
+                            f'🚨 تنبيه: اشتراك الجمعية منتهي منذ {abs(days_left)} يوم. يرجى التجديد قريباً!'
+                        )
+                        request.session['subscription_warned_on'] = today
                         
             except Staff.DoesNotExist:
                 # User has no organization
@@ -89,32 +103,126 @@ class OrganizationMiddleware:
                          pass
                     elif not any(request.path.startswith(url) for url in allowed_urls):
                         return redirect('setup_organization')
+        return None
 
-        response = self.get_response(request)
+
+class SlidingSessionMiddleware(MiddlewareMixin):
+    """
+    Sliding session expiry without a write per request (SESSION_SAVE_EVERY_REQUEST
+    is off): the session is saved again, pushing its expiry date and cookie
+    forward, only once less than SESSION_RENEW_THRESHOLD of its lifetime is left.
+    """
+    async def __acall__(self, request):
+        # An accessed session is already loaded: no query, no thread hop needed
+        return self.process_response(request, await self.get_response(request))
+
+    def process_response(self, request, response):
+        threshold = getattr(settings, 'SESSION_RENEW_THRESHOLD', None)
+        session = getattr(request, 'session', None)
+        if threshold is None or session is None or not session.accessed or session.is_empty():
+            return response
+
+        now = int(time.time())
+        renewed_at = session.get('_renewed_at')
+        lifetime = session.get_expiry_age()  # honours set_expiry() (remember me)
+        if renewed_at is None or renewed_at + lifetime - now < lifetime * threshold:
+            session['_renewed_at'] = now
         return response
 
 
+class ReplicaRoutingMiddleware:
+    """
+    Route the reads of reporting views (settings.REPLICA_READ_VIEWS, by URL name)
+    to the read replica; writes anywhere in the request pin it to the primary.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.replica_views = set(getattr(settings, 'REPLICA_READ_VIEWS', []))
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        with request_routing():
+            return self.get_response(request)
+
+    async def __acall__(self, request):
+        # The views run in threads with a copy of this context: same routing state
+        with request_routing():
+            return await self.get_response(request)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if request.method in ('GET', 'HEAD') and request.resolver_match.url_name in self.replica_views:
+            enable_replica_reads()
+        return None
+
+
+class StaticFilesMiddleware(WhiteNoiseMiddleware):
+    """WhiteNoiseMiddleware (sync only in whitenoise 6) with an async __call__ for ASGI"""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response=None, settings=settings):
+        super().__init__(get_response, settings)
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        return super().__call__(request)
+
+    async def __acall__(self, request):
+        # Same lookup as WhiteNoiseMiddleware.__call__ (find_file reads the disk: DEBUG only)
+        static_file = self.find_file(request.path_info) if self.autorefresh else self.files.get(request.path_info)
+        if static_file is not None:
+            return self.serve(static_file, request)
+        return await self.get_response(request)
+
+
 def get_organization(request):
     """Get organization from request"""
     return getattr(request, 'organization', None)
 
 
+def _missing_organization(request):
+    """Redirect for requests without an organization (None when it is set)"""
+    if not hasattr(request, 'organization') or request.organization is None:
+        print(f"DEBUG: require_organization failed for user: {request.user.username}")
+        
+        if request.user.is_authenticated and not request.user.is_superuser:
+            messages.error(request, 'يجب أن تكون مرتبطاً بجمعية للوصول إلى هذه الصفحة')
+            return redirect('setup_organization')
+        elif request.user.is_superuser:
+            messages.warning(request, 'يرجى إنشاء جمعية أو ربط حسابك بجمعية')
+            return redirect('setup_organization')
+        else:
+            return redirect('login')
+    return None
+
+
 def require_organization(view_func):
-    """Decorator to ensure user has organization"""
+    """Decorator to ensure user has organization (sync and async views)"""
+    if iscoroutinefunction(view_func):
+        @wraps(view_func)
+        async def async_wrapper(request, *args, **kwargs):
+            response = _missing_organization(request)
+            if response is not None:
+                return response
+            return await view_func(request, *args, **kwargs)
+        return async_wrapper
+
     @wraps(view_func)
     def wrapper(request, *args, **kwargs):
         # Check if organization was set by middleware
-        if not hasattr(request, 'organization') or request.organization is None:
-            print(f"DEBUG: require_organization failed for user: {request.user.username}")
-            
-            if request.user.is_authenticated and not request.user.is_superuser:
-                messages.error(request, 'يجب أن تكون مرتبطاً بجمعية للوصول إلى هذه الصفحة')
-                return redirect('setup_organization')
-            elif request.user.is_superuser:
-                messages.warning(request, 'يرجى إنشاء جمعية أو ربط حسابك بجمعية')
-                return redirect('setup_organization')
-            else:
-                return redirect('login')
-        
+        response = _missing_organization(request)
+        if response is not None:
+            return response
         return view_func(request, *args, **kwargs)
     return wrapper
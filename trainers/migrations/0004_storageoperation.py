@@ -0,0 +1,68 @@
+# Generated by Django 5.1.4 on 2026-10-19 06:25
+
+import django.core.validators
+import django.utils.timezone
+import trainers.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trainers', '0003_add_missing'),
+    ]
+
+    operations = [
+        # Model state no earlier migration created (the suite and
+        # makemigrations --check need the history to match the models)
+        migrations.AddField(
+            model_name='organizationinfo',
+            name='subscription_status',
+            field=models.CharField(choices=[('trial', 'تجريبي'), ('active', 'نشط'), ('expired', 'منتهي'), ('suspended', 'معلق')], default='trial', max_length=20, verbose_name='حالة الاشتراك'),
+        ),
+        migrations.AlterField(
+            model_name='trainer',
+            name='image',
+            field=models.ImageField(blank=True, upload_to=trainers.models.image_upload_to, validators=[django.core.validators.FileExtensionValidator(['jpg', 'jpeg', 'png', 'webp'])], verbose_name='الصورة'),
+        ),
+        migrations.AlterField(
+            model_name='trainerdocument',
+            name='file',
+            field=models.FileField(upload_to=trainers.models.document_upload_to, validators=[trainers.models.validate_file_size], verbose_name='الملف'),
+        ),
+        migrations.AddIndex(
+            model_name='trainer',
+            index=models.Index(fields=['first_name', 'last_name'], name='trainers_tr_first_n_847d7e_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='trainer',
+            index=models.Index(fields=['organization', 'is_active', 'first_name'], name='trainers_tr_organiz_5bc93b_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='trainer',
+            index=models.Index(fields=['organization', 'is_active', 'last_name'], name='trainers_tr_organiz_04f31b_idx'),
+        ),
+        migrations.CreateModel(
+            name='StorageOperation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('operation', models.CharField(choices=[('delete', 'حذف ملف'), ('thumbnail', 'إنشاء صورة مصغرة')], max_length=20, verbose_name='العملية')),
+                ('name', models.CharField(max_length=500, verbose_name='مسار الملف')),
+                ('status', models.CharField(choices=[('pending', 'قيد الانتظار'), ('done', 'منجز'), ('failed', 'فشل')], default='pending', max_length=10, verbose_name='الحالة')),
+                ('attempts', models.PositiveSmallIntegerField(default=0, verbose_name='عدد المحاولات')),
+                ('last_error', models.TextField(blank=True, verbose_name='آخر خطأ')),
+                ('run_after', models.DateTimeField(default=django.utils.timezone.now, verbose_name='موعد التنفيذ')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='تاريخ الإنشاء')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'عملية تخزين',
+                'verbose_name_plural': 'عمليات التخزين',
+                'ordering': ['run_after'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='storageoperation',
+            index=models.Index(fields=['status', 'run_after'], name='trainers_st_status_7c33e0_idx'),
+        ),
+    ]
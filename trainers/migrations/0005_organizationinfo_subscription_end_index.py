@@ -0,0 +1,23 @@
+# Generated by Django 5.1.4 on 2026-10-19 09:40
+
+import django.db.models.functions.comparison
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trainers', '0004_storageoperation'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='organizationinfo',
+            index=models.Index(
+                django.db.models.functions.comparison.Coalesce(
+                    'subscription_end_date', 'subscription_end'
+                ),
+                name='org_subscription_end_idx',
+            ),
+        ),
+    ]
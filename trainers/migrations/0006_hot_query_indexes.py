@@ -0,0 +1,50 @@
+# Generated by Django 5.1.4 on 2026-10-19 10:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trainers', '0005_organizationinfo_subscription_end_index'),
+    ]
+
+    operations = [
+        # (trainer, paymentCategry) is a prefix of the new (trainer, paymentCategry, -paymentdate)
+        migrations.RemoveIndex(
+            model_name='payments',
+            name='trainers_pa_trainer_1cf380_idx',
+        ),
+        migrations.AddIndex(
+            model_name='payments',
+            index=models.Index(fields=['trainer', 'paymentCategry', '-paymentdate'], name='trainers_pa_trainer_881e6b_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='payments',
+            index=models.Index(fields=['organization', 'paymentCategry', 'paymentdate'], name='trainers_pa_organiz_2778a6_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='addedpay',
+            index=models.Index(fields=['organization', 'date'], name='trainers_ad_organiz_1cc983_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='article',
+            index=models.Index(fields=['organization', 'date'], name='trainers_ar_organiz_1df96f_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='costs',
+            index=models.Index(fields=['organization', 'date'], name='trainers_co_organiz_f3041f_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='emailed',
+            index=models.Index(fields=['user', 'category', 'datetime'], name='trainers_em_user_id_1350cb_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='organizationinfo',
+            index=models.Index(fields=['subscription_end_date'], name='trainers_or_subscri_1e78bd_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='trainer',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['organization', 'last_name', 'first_name'], name='trainer_active_name_idx'),
+        ),
+    ]
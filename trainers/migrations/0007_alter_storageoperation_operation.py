@@ -0,0 +1,18 @@
+# Generated by Django 5.1.4 on 2026-10-19 14:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trainers', '0006_hot_query_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='storageoperation',
+            name='operation',
+            field=models.CharField(choices=[('delete', 'حذف ملف'), ('thumbnail', 'إنشاء صورة مصغرة'), ('upload', 'رفع ملف')], max_length=20, verbose_name='العملية'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.1.4 on 2026-10-19 08:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trainers', '0007_alter_storageoperation_operation'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='storageoperation',
+            name='claimed_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='تاريخ الاستلام'),
+        ),
+        migrations.AlterField(
+            model_name='storageoperation',
+            name='status',
+            field=models.CharField(choices=[('pending', 'قيد الانتظار'), ('running', 'قيد التنفيذ'), ('done', 'منجز'), ('failed', 'فشل')], default='pending', max_length=10, verbose_name='الحالة'),
+        ),
+    ]
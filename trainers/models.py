@@ -9,10 +9,80 @@ import os
 from datetime import timedelta
 from dateutil.relativedelta import relativedelta
 from django.core.validators import FileExtensionValidator
+from django.db.models.functions import Coalesce
 
 
 
 
+class DaysUntil(models.Func):
+    """Whole days from `today` until a date expression (negative once it has passed)"""
+    template = '(%(expressions)s)'
+    arg_joiner = ' - '
+    output_field = models.IntegerField()
+
+    def __init__(self, expression, today, **extra):
+        super().__init__(expression, models.Value(today, output_field=models.DateField()), **extra)
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        return self.as_sql(
+            compiler, connection,
+            template='CAST(julianday(%(expressions)s) AS INTEGER)',
+            arg_joiner=') - julianday(',
+            **extra_context
+        )
+
+    def as_mysql(self, compiler, connection, **extra_context):
+        return self.as_sql(compiler, connection, function='DATEDIFF', template='%(function)s(%(expressions)s)', arg_joiner=', ', **extra_context)
+
+
+# Subscription states (OrganizationInfo.get_subscription_state / with_subscription_state)
+SUB_STATE_UNKNOWN = 'unknown'
+SUB_STATE_ACTIVE = 'active'
+SUB_STATE_EXPIRING = 'expiring_soon'
+SUB_STATE_GRACE = 'in_grace'
+SUB_STATE_EXPIRED = 'expired'
+EXPIRING_SOON_DAYS = 7
+
+
+def subscription_end():
+    """End date used by days_until_expiration (indexed, see OrganizationInfo.Meta)"""
+    return Coalesce('subscription_end_date', 'subscription_end')
+
+
+class OrganizationQuerySet(models.QuerySet):
+    def with_days_left(self, today=None):
+        """Annotate `days_left` like OrganizationInfo.days_until_expiration (NULL when no end date)"""
+        today = today or timezone.now().date()
+        return self.annotate(days_left=DaysUntil(subscription_end(), today))
+
+    def with_subscription_state(self, today=None):
+        """
+        Annotate `days_left` and `subscription_state` (SUB_STATE_*),
+        same rules as is_expired() / is_in_grace_period() in Python
+        """
+        return self.with_days_left(today).annotate(
+            subscription_state=models.Case(
+                models.When(days_left__isnull=True, then=models.Value(SUB_STATE_UNKNOWN)),
+                models.When(days_left__lt=-models.F('grace_period_days'), then=models.Value(SUB_STATE_EXPIRED)),
+                models.When(days_left__lt=0, then=models.Value(SUB_STATE_GRACE)),
+                models.When(days_left__lte=EXPIRING_SOON_DAYS, then=models.Value(SUB_STATE_EXPIRING)),
+                default=models.Value(SUB_STATE_ACTIVE),
+                output_field=models.CharField(),
+            )
+        )
+
+    def ending_between(self, start, end):
+        """Subscriptions whose end date falls in [start, end] (range scan on the end date index)"""
+        return self.alias(subscription_ends_on=subscription_end()).filter(
+            subscription_ends_on__range=(start, end)
+        )
+
+    def expiring_within(self, days=EXPIRING_SOON_DAYS, today=None):
+        """Still running but ending in the next `days` days"""
+        today = today or timezone.now().date()
+        return self.ending_between(today, today + timedelta(days=days))
+
+
 class OrganizationInfo(models.Model):
     """Main organization/tenant model"""
     name = models.CharField(max_length=255, verbose_name='اسم الجمعية')
@@ -80,10 +150,17 @@ class OrganizationInfo(models.Model):
     last_payment_date = models.DateField(blank=True, null=True, verbose_name='تاريخ آخر دفعة')
     location = models.CharField(max_length=255, blank=True, verbose_name='الموقع')
     datepay = models.DateField(default=timezone.now, verbose_name='تاريخ دفع الايجار')
+
+    objects = OrganizationQuerySet.as_manager()
+
     class Meta:
         verbose_name = 'جمعية'
         verbose_name_plural = 'الجمعيات'
         ordering = ['-created_at']
+        indexes = [
+            models.Index(subscription_end(), name='org_subscription_end_idx'),
+            models.Index(fields=['subscription_end_date']),
+        ]
 
     def __str__(self):
         return self.name
@@ -278,14 +355,29 @@ class OrganizationInfo(models.Model):
                 'days': days_left
             }
 
+    def get_subscription_state(self):
+        """SUB_STATE_* code, the Python side of with_subscription_state()"""
+        days_left = self.days_until_expiration
+        if days_left is None:
+            return SUB_STATE_UNKNOWN
+        if self.is_expired():
+            return SUB_STATE_EXPIRED
+        if self.is_in_grace_period():
+            return SUB_STATE_GRACE
+        if days_left <= EXPIRING_SOON_DAYS:
+            return SUB_STATE_EXPIRING
+        return SUB_STATE_ACTIVE
+
     def check_and_update_status(self):
         """
         Check subscription status and update is_active flag
         Call this periodically or in middleware
         """
         if self.is_expired():
-            self.is_active = False
-            self.save()
+            # Runs on every request: only write the transition
+            if self.is_active:
+                self.is_active = False
+                self.save()
             return False
         return True
 
@@ -489,7 +581,12 @@ class Trainer(models.Model):
             models.Index(fields=['first_name', 'last_name']),
              models.Index(fields=['organization', 'is_active', 'first_name']),
             models.Index(fields=['organization', 'is_active', 'last_name']),
-        
+            # Active trainees only (PostgreSQL / SQLite; ignored where unsupported)
+            models.Index(
+                fields=['organization', 'last_name', 'first_name'],
+                condition=models.Q(is_active=True),
+                name='trainer_active_name_idx',
+            ),
         ]
 
     @property
@@ -554,6 +651,47 @@ class TrainerDocument(models.Model):
         verbose_name_plural = 'وثائق المتدربين'
         unique_together = ['trainer', 'document_type']
 
+class StorageOperation(models.Model):
+    """
+    Queued storage work (remote deletes, derivatives) executed outside the request
+    Processed by: python manage.py process_storage_ops
+    """
+    OPERATIONS = (
+        ('delete', 'حذف ملف'),
+        ('thumbnail', 'إنشاء صورة مصغرة'),
+        ('upload', 'رفع ملف'),
+    )
+
+    STATUSES = (
+        ('pending', 'قيد الانتظار'),
+        ('running', 'قيد التنفيذ'),
+        ('done', 'منجز'),
+        ('failed', 'فشل'),
+    )
+
+    operation = models.CharField(max_length=20, choices=OPERATIONS, verbose_name='العملية')
+    name = models.CharField(max_length=500, verbose_name='مسار الملف')
+    status = models.CharField(max_length=10, choices=STATUSES, default='pending', verbose_name='الحالة')
+    attempts = models.PositiveSmallIntegerField(default=0, verbose_name='عدد المحاولات')
+    last_error = models.TextField(blank=True, verbose_name='آخر خطأ')
+    run_after = models.DateTimeField(default=timezone.now, verbose_name='موعد التنفيذ')
+    # Set while a worker runs it ('running'); older than CLAIM_TIMEOUT_SECONDS = worker died
+    claimed_at = models.DateTimeField(null=True, blank=True, verbose_name='تاريخ الاستلام')
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='تاريخ الإنشاء')
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = 'عملية تخزين'
+        verbose_name_plural = 'عمليات التخزين'
+        ordering = ['run_after']
+        indexes = [
+            models.Index(fields=['status', 'run_after']),
+        ]
+
+    def __str__(self):
+        return f"{self.get_operation_display()} - {self.name}"
+
+
 class Payments(models.Model):
     """Payment records scoped to organization"""
     organization = models.ForeignKey(
@@ -582,8 +720,8 @@ class Payments(models.Model):
         ordering = ['-paymentdate']
         indexes = [
             models.Index(fields=['organization', 'paymentdate']),
-            models.Index(fields=['trainer', 'paymentCategry']),
-            
+            models.Index(fields=['organization', 'paymentCategry', 'paymentdate']),
+            models.Index(fields=['trainer', 'paymentCategry', '-paymentdate']),
         ]
 
     def __str__(self):
@@ -632,6 +770,9 @@ class Article(models.Model):
         verbose_name = 'مقال'
         verbose_name_plural = 'المقالات'
         ordering = ['-date']
+        indexes = [
+            models.Index(fields=['organization', 'date']),
+        ]
 
     @property
     def profit(self):
@@ -671,6 +812,9 @@ class Costs(models.Model):
         verbose_name = 'مصروف'
         verbose_name_plural = 'المصاريف'
         ordering = ['-date']
+        indexes = [
+            models.Index(fields=['organization', 'date']),
+        ]
 
     def __str__(self):
         return self.cost
@@ -693,6 +837,9 @@ class Addedpay(models.Model):
         verbose_name = 'دفعة إضافية'
         verbose_name_plural = 'الدفعات الإضافية'
         ordering = ['-date']
+        indexes = [
+            models.Index(fields=['organization', 'date']),
+        ]
 
     def __str__(self):
         return self.title
@@ -716,13 +863,16 @@ class Emailed(models.Model):
         verbose_name = 'بريد إلكتروني'
         verbose_name_plural = 'البريد الإلكتروني'
         ordering = ['-datetime']
+        indexes = [
+            models.Index(fields=['user', 'category', 'datetime']),
+        ]
 
     def __str__(self):
         return f"{self.user.full_name} - {self.category}"
     
 
 
-from django.db.models.signals import post_save, post_delete
+from django.db.models.signals import post_init, post_save, post_delete, pre_delete
 from django.dispatch import receiver
 from django.core.cache import cache
 
@@ -763,4 +913,127 @@ def invalidate_costs_cache(sender, instance, **kwargs):
     cache_keys = [
         f'financial_summary_{org_id}_{today}',
     ]
-    cache.delete_many(cache_keys)
\ No newline at end of file
+    cache.delete_many(cache_keys)
+
+@receiver([post_save, post_delete], sender=Payments)
+def invalidate_payment_invoice(sender, instance, **kwargs):
+    """Drop the stored invoice PDF of an edited/deleted payment"""
+    from .payments.invoice_cache import invalidate_payment
+    invalidate_payment(instance.organization_id, instance.id)
+
+
+@receiver([post_save, post_delete], sender=OrganizationInfo)
+def invalidate_organization_invoices(sender, instance, **kwargs):
+    """Organization header data is printed on every invoice"""
+    from .payments.invoice_cache import invalidate_organization
+    invalidate_organization(instance.id)
+
+
+@receiver(post_save, sender=User)
+def mark_username_taken(sender, instance, update_fields=None, **kwargs):
+    """Keep the availability filter current between rebuilds"""
+    from .availability import mark_taken
+    if update_fields is not None and 'username' not in update_fields:
+        return  # e.g. the last_login update of every login
+    mark_taken('username', instance.username)
+
+
+@receiver(post_save, sender=OrganizationInfo)
+def mark_slug_taken(sender, instance, update_fields=None, **kwargs):
+    from .availability import mark_taken
+    if update_fields is not None and 'slug' not in update_fields:
+        return
+    mark_taken('slug', instance.slug)
+
+
+# ==================== STORAGE CLEANUP ====================
+# Remote files are never deleted inline: old/removed blobs are queued
+# and handled by `python manage.py process_storage_ops`.
+
+STORAGE_FILE_FIELDS = {
+    Trainer: 'image',
+    TrainerDocument: 'file',
+}
+
+
+@receiver(post_init, sender=Trainer)
+@receiver(post_init, sender=TrainerDocument)
+def remember_loaded_values(sender, instance, **kwargs):
+    """
+    Keep the values as loaded so changes can be detected on save: the file
+    name (replaced files) and, for Trainer, is_active (active-trainee count)
+    """
+    from .storage_ops import stored_name
+    # Read __dict__ directly: deferred fields must not trigger a query here
+    # (None then, and the change is unknown)
+    field_name = STORAGE_FILE_FIELDS[sender]
+    instance._stored_file_name = stored_name(instance.__dict__.get(field_name))
+    if sender is Trainer:
+        instance._was_active = instance.__dict__.get('is_active')
+
+
+@receiver(post_save, sender=Trainer)
+@receiver(post_save, sender=TrainerDocument)
+def queue_replaced_file(sender, instance, created, **kwargs):
+    """Queue deletion of a replaced file (and a thumbnail for new images)"""
+    from .storage_ops import stored_name, enqueue_delete, enqueue_thumbnail, is_staged, thumbnail_name
+    field_name = STORAGE_FILE_FIELDS[sender]
+    if field_name in instance.get_deferred_fields():
+        return
+
+    old_name = '' if created else getattr(instance, '_stored_file_name', '')
+    new_name = stored_name(getattr(instance, field_name))
+    if old_name == new_name:
+        return
+
+    if old_name:
+        enqueue_delete(old_name)
+        if sender is Trainer:
+            enqueue_delete(thumbnail_name(old_name))
+    if new_name and sender is Trainer and not is_staged(new_name):
+        enqueue_thumbnail(new_name)  # staged images: queued once uploaded
+    instance._stored_file_name = new_name
+
+
+@receiver(post_delete, sender=Trainer)
+@receiver(post_delete, sender=TrainerDocument)
+def queue_deleted_file(sender, instance, **kwargs):
+    """Queue deletion of files whose row is gone (including cascades)"""
+    from .storage_ops import stored_name, enqueue_delete, thumbnail_name
+    name = stored_name(instance.__dict__.get(STORAGE_FILE_FIELDS[sender]))
+    if not name:
+        return
+    enqueue_delete(name)
+    if sender is Trainer:
+        enqueue_delete(thumbnail_name(name))
+
+
+# ==================== PUBLIC REGISTRATION ====================
+# Cached organization snapshot and active-trainee counter (trainers/registration.py)
+
+@receiver([post_save, post_delete], sender=OrganizationInfo)
+def invalidate_organization_snapshot(sender, instance, **kwargs):
+    from .registration import invalidate_snapshot
+    invalidate_snapshot(instance.slug)
+
+
+@receiver(post_save, sender=Trainer)
+def count_active_change(sender, instance, created, update_fields=None, **kwargs):
+    """Keep the cached active-trainee count in step with single saves (_was_active: remember_loaded_values)"""
+    from .registration import adjust_active_count, invalidate_active_count
+    if update_fields is not None and 'is_active' not in update_fields:
+        return
+    was_active = False if created else instance._was_active
+    if was_active is None:
+        invalidate_active_count(instance.organization_id)
+    elif was_active != instance.is_active:
+        adjust_active_count(instance.organization_id, 1 if instance.is_active else -1)
+    instance._was_active = instance.is_active
+
+
+@receiver(pre_delete, sender=Trainer)
+def count_active_delete(sender, instance, **kwargs):
+    """pre_delete: the row still exists, so deferred fields (only()) can be loaded"""
+    from .registration import adjust_active_count
+    if instance.is_active:
+        adjust_active_count(instance.organization_id, -1)
@@ -0,0 +1,133 @@
+# payments/assurance_roster.py
+"""
+Assurance roster (Word)
+The template is parsed once per process: its first table is emptied and
+turned into a table skeleton + a prototype data row. A roster is then built
+by deep-copying the prototype row's XML for every trainee, no per-cell
+python-docx calls.
+"""
+
+import copy
+import os
+from functools import lru_cache
+from io import BytesIO
+
+from django.conf import settings
+
+from docx import Document
+from docx.enum.table import WD_ALIGN_VERTICAL
+from docx.enum.text import WD_ALIGN_PARAGRAPH
+from docx.oxml import parse_xml
+from docx.oxml.ns import qn
+
+
+ASSURANCE_TEMPLATE_PATH = os.path.join(
+    settings.BASE_DIR, "trainers", "NOJOUM ARGANA ASSURANCE  N°14.docx"
+)
+ROWS_PER_PAGE = 16
+
+TABLE_BORDERS = r'''
+<w:tblBorders xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main">
+    <w:top w:val="single" w:sz="4" w:space="0" w:color="000000"/>
+    <w:left w:val="single" w:sz="4" w:space="0" w:color="000000"/>
+    <w:bottom w:val="single" w:sz="4" w:space="0" w:color="000000"/>
+    <w:right w:val="single" w:sz="4" w:space="0" w:color="000000"/>
+    <w:insideH w:val="single" w:sz="4" w:space="0" w:color="000000"/>
+    <w:insideV w:val="single" w:sz="4" w:space="0" w:color="000000"/>
+</w:tblBorders>
+'''
+
+PAGE_BREAK = (
+    '<w:p xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main">'
+    '<w:r><w:br w:type="page"/></w:r></w:p>'
+)
+
+
+# ======================================================
+# Template (parsed once per file version)
+# ======================================================
+
+class RosterTemplate:
+    """Emptied template document + table skeleton + prototype row"""
+
+    def __init__(self, path):
+        doc = Document(path)
+        table = doc.tables[0]
+
+        # Keep the header row only
+        for row in table.rows[1:]:
+            table._element.remove(row._element)
+        table._element.tblPr.append(parse_xml(TABLE_BORDERS))
+
+        # Prototype data row: centered cells, one run each
+        row = table.add_row()
+        for cell in row.cells:
+            cell.text = "-"
+            cell.vertical_alignment = WD_ALIGN_VERTICAL.CENTER
+            for paragraph in cell.paragraphs:
+                paragraph.alignment = WD_ALIGN_PARAGRAPH.CENTER
+        self.prototype_row = row._element
+        table._element.remove(self.prototype_row)
+        for t in self.prototype_row.iter(qn("w:t")):
+            t.set("{http://www.w3.org/XML/1998/namespace}space", "preserve")
+
+        # Later pages reuse the first table without its rows
+        self.table_skeleton = copy.deepcopy(table._element)
+
+        buffer = BytesIO()
+        doc.save(buffer)
+        self.document_bytes = buffer.getvalue()
+
+    def new_document(self):
+        """Fresh Document from the prepared bytes (first table already emptied)"""
+        return Document(BytesIO(self.document_bytes))
+
+    def make_row(self, texts):
+        row = copy.deepcopy(self.prototype_row)
+        for t, text in zip(row.iter(qn("w:t")), texts):
+            t.text = text
+        return row
+
+
+@lru_cache(maxsize=4)
+def _load_template(path, mtime):
+    return RosterTemplate(path)
+
+
+def get_roster_template(path=ASSURANCE_TEMPLATE_PATH):
+    """Cached template, reloaded when the file changes on disk"""
+    return _load_template(path, os.path.getmtime(path))
+
+
+# ======================================================
+# Roster
+# ======================================================
+
+def build_assurance_roster(payments, path=ASSURANCE_TEMPLATE_PATH) -> bytes:
+    """
+    Word roster of insured trainees, ROWS_PER_PAGE per table/page.
+    `payments` is a Payments queryset (already scoped to the organization).
+    """
+    template = get_roster_template(path)
+    doc = template.new_document()
+    table = doc.tables[0]._element
+
+    rows = payments.values_list("trainer__last_name", "trainer__first_name", "trainer__birth_day")
+    for i, (last_name, first_name, birth_day) in enumerate(rows.iterator(chunk_size=2000), start=1):
+        if i > 1 and i % ROWS_PER_PAGE == 0:
+            page_break = parse_xml(PAGE_BREAK)
+            table.addnext(page_break)
+            table = copy.deepcopy(template.table_skeleton)
+            page_break.addnext(table)
+
+        table.append(template.make_row([
+            str(i),
+            f"{last_name}",
+            f"{first_name}",
+            " ",
+            f"{birth_day}",
+        ]))
+
+    buffer = BytesIO()
+    doc.save(buffer)
+    return buffer.getvalue()
@@ -0,0 +1,131 @@
+# payments/invoice_bulk.py
+"""
+Bulk invoice export
+ReportLab rendering is CPU-bound (and holds the GIL), so invoices are rendered
+in a ProcessPoolExecutor and streamed into a ZIP one by one.
+At most a small window of PDFs is ever held in memory.
+The pool is for the export_invoices command only: download_invoices_zip
+renders in the web worker itself (workers=1), where forking is unsafe.
+"""
+
+import logging
+import multiprocessing
+import os
+import time
+import zipfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from ..models import Payments
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_WORKERS = os.cpu_count() or 1
+WINDOW_PER_WORKER = 4  # in-flight renders per worker
+
+
+# ======================================================
+# Filters (same as download_documents)
+# ======================================================
+
+def filter_report_payments(organization, payment_category=None, start_date=None,
+                           end_date=None, trainer_category=None):
+    """Payments of an organization filtered like the reports page"""
+    payments = Payments.objects.select_related('trainer', 'organization').filter(
+        organization=organization
+    )
+    if payment_category:
+        payments = payments.filter(paymentCategry=payment_category)
+    if start_date:
+        payments = payments.filter(paymentdate__gte=start_date)
+    if end_date:
+        payments = payments.filter(paymentdate__lte=end_date)
+    if trainer_category:
+        payments = payments.filter(trainer__category=trainer_category)
+    return payments
+
+
+# ======================================================
+# Worker side
+# ======================================================
+
+def _render(payment):
+    from .invoice_views import build_invoice_pdf, generate_invoice_number
+    invoice_number = generate_invoice_number(payment.id, payment.paymentdate)
+    # Short invoice digests can collide inside one archive: add the payment id
+    return f"{invoice_number}-{payment.id}.pdf", build_invoice_pdf(payment, invoice_number)
+
+
+def render_invoices(payments, workers=DEFAULT_WORKERS):
+    """
+    Yield (filename, pdf_bytes) in payment order.
+    Payments are pickled to the workers with trainer/organization preloaded,
+    so children never touch the database.
+    """
+    if workers <= 1:
+        for payment in payments:
+            yield _render(payment)
+        return
+
+    window = workers * WINDOW_PER_WORKER
+    # Forked workers inherit the configured Django app; they only render
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('fork')) as pool:
+        pending = deque()
+        for payment in payments:
+            pending.append(pool.submit(_render, payment))
+            if len(pending) >= window:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+# ======================================================
+# Streaming ZIP
+# ======================================================
+
+class _ChunkSink:
+    """Write-only file object; zipfile writes here, we hand the chunks out"""
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def iter_invoices_zip(payments, workers=DEFAULT_WORKERS, stats=None):
+    """
+    Yield the bytes of a ZIP archive holding one PDF per payment.
+    `stats` (optional dict) receives count / seconds / per_second at the end.
+    """
+    sink = _ChunkSink()
+    started = time.perf_counter()
+    count = 0
+
+    # PDFs are already compressed: store them as-is
+    with zipfile.ZipFile(sink, mode="w", compression=zipfile.ZIP_STORED) as archive:
+        for filename, pdf_bytes in render_invoices(payments, workers):
+            archive.writestr(filename, pdf_bytes)
+            count += 1
+            chunk = sink.drain()
+            if chunk:
+                yield chunk
+
+    chunk = sink.drain()
+    if chunk:
+        yield chunk
+
+    seconds = time.perf_counter() - started
+    per_second = count / seconds if seconds else 0.0
+    logger.info(f'Bulk invoices: {count} PDFs in {seconds:.2f}s ({per_second:.1f}/s, {workers} workers)')
+    if stats is not None:
+        stats.update({'count': count, 'seconds': seconds, 'per_second': per_second})
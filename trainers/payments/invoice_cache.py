@@ -0,0 +1,130 @@
+# payments/invoice_cache.py
+"""
+Bounded on-disk LRU for generated invoice PDFs
+Key = hash of every payment / trainee / organization field printed on the invoice
+(the invoice prints no render date, only the payment date)
+Layout: <INVOICE_CACHE_DIR>/<org_id>/<payment_id>-<key>.pdf
+"""
+
+import hashlib
+import os
+import shutil
+import tempfile
+from glob import glob
+
+from django.conf import settings
+
+
+# Bump when the invoice layout changes so old PDFs are never served
+INVOICE_LAYOUT_VERSION = 4
+
+CACHE_DIR = getattr(
+    settings, "INVOICE_CACHE_DIR",
+    os.path.join(tempfile.gettempdir(), "crm_invoices")
+)
+MAX_BYTES = getattr(settings, "INVOICE_CACHE_MAX_BYTES", 200 * 1024 * 1024)
+
+
+# ======================================================
+# Keys & paths
+# ======================================================
+
+def invoice_cache_key(payment):
+    """Content key for a payment's invoice (also used as ETag)"""
+    org = payment.organization
+    trainer = payment.trainer
+    parts = [
+        INVOICE_LAYOUT_VERSION,
+        payment.id, payment.paymentdate, payment.paymentCategry, payment.paymentAmount,
+        trainer.first_name, trainer.last_name, trainer.CIN,
+        trainer.phone, trainer.phone_parent, trainer.email,
+        org.name, org.location, org.phone_number, org.email,
+    ]
+    base = "|".join("" if p is None else str(p) for p in parts)
+    return hashlib.sha256(base.encode("utf-8")).hexdigest()[:32]
+
+
+def _org_dir(org_id):
+    return os.path.join(CACHE_DIR, str(org_id))
+
+
+def _path(org_id, payment_id, key):
+    return os.path.join(_org_dir(org_id), f"{payment_id}-{key}.pdf")
+
+
+# ======================================================
+# Get / put
+# ======================================================
+
+def get_cached_invoice(payment, key):
+    """Path of the stored PDF, or None. Touches mtime (LRU recency)."""
+    path = _path(payment.organization_id, payment.id, key)
+    try:
+        os.utime(path)
+    except OSError:
+        return None
+    return path
+
+
+def store_invoice(payment, key, pdf_bytes):
+    """Atomically write a PDF into the cache, then enforce the size bound"""
+    directory = _org_dir(payment.organization_id)
+    os.makedirs(directory, exist_ok=True)
+
+    # Older versions of this payment's invoice are dead weight now
+    invalidate_payment(payment.organization_id, payment.id)
+
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    with os.fdopen(fd, "wb") as f:
+        f.write(pdf_bytes)
+    path = _path(payment.organization_id, payment.id, key)
+    os.replace(tmp_path, path)
+
+    evict()
+    return path
+
+
+def evict(max_bytes=None):
+    """Drop least recently used PDFs until the cache fits in max_bytes"""
+    max_bytes = MAX_BYTES if max_bytes is None else max_bytes
+
+    entries = []
+    total = 0
+    for path in glob(os.path.join(CACHE_DIR, "*", "*.pdf")):
+        try:
+            st = os.stat(path)
+        except OSError:
+            continue
+        entries.append((st.st_mtime, st.st_size, path))
+        total += st.st_size
+
+    if total <= max_bytes:
+        return 0
+
+    removed = 0
+    for _mtime, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+        except OSError:
+            continue
+        total -= size
+        removed += 1
+    return removed
+
+
+# ======================================================
+# Invalidation
+# ======================================================
+
+def invalidate_payment(org_id, payment_id):
+    for path in glob(os.path.join(_org_dir(org_id), f"{payment_id}-*.pdf")):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def invalidate_organization(org_id):
+    shutil.rmtree(_org_dir(org_id), ignore_errors=True)
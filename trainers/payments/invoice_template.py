@@ -0,0 +1,416 @@
+# payments/invoice_template.py
+"""
+Reusable invoice template
+Everything that does not depend on the payment is built once per process:
+styles, table styles, pre-shaped Arabic labels and the decoded/resized logo.
+Rendering an invoice only fills in the per-payment data.
+"""
+
+from functools import lru_cache
+from io import BytesIO
+import os
+
+from django.conf import settings
+
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.units import cm
+from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+from reportlab.lib.enums import TA_CENTER
+from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, Image
+from reportlab.lib.colors import HexColor
+from reportlab.lib import colors
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+
+import arabic_reshaper
+from bidi.algorithm import get_display
+
+
+# ======================================================
+# Fonts (Unicode Arabic)
+# ======================================================
+
+FONT_DIR = os.path.join(settings.BASE_DIR, "fonts")
+FONT_REGULAR = os.path.join(FONT_DIR, "DejaVuSans.ttf")
+FONT_BOLD = os.path.join(FONT_DIR, "DejaVuSans-Bold.ttf")
+
+
+@lru_cache(maxsize=None)
+def register_fonts():
+    """Load the TTF fonts on first use (a missing font fails the invoice, not the import)"""
+    if not os.path.exists(FONT_REGULAR):
+        raise RuntimeError(f"Font not found: {FONT_REGULAR}")
+    if not os.path.exists(FONT_BOLD):
+        raise RuntimeError(f"Font not found: {FONT_BOLD}")
+
+    pdfmetrics.registerFont(TTFont("DejaVu", FONT_REGULAR))
+    pdfmetrics.registerFont(TTFont("DejaVu-Bold", FONT_BOLD))
+
+
+# ======================================================
+# Arabic helper
+# ======================================================
+
+@lru_cache(maxsize=4096)
+def _shape(text: str) -> str:
+    reshaped = arabic_reshaper.reshape(text)
+    return get_display(reshaped)
+
+
+def ar(text: str) -> str:
+    """Reshape + apply bidi to Arabic text (memoized: names repeat a lot)"""
+    if text is None:
+        return ""
+    text = str(text).strip()
+    if not text:
+        return ""
+    return _shape(text)
+
+
+# ======================================================
+# Static logo helper
+# ======================================================
+
+def get_saas_logo_path() -> str | None:
+    """
+    Returns an absolute file path for static/logo/logo.png
+    Works with dev and collectstatic (STATICFILES_STORAGE).
+    """
+    p = settings.BASE_DIR / "staticfiles/images/logo/logo.png"
+    return p if p and os.path.exists(p) else None
+
+
+# ======================================================
+# Template
+# ======================================================
+
+# Colors
+C_PRIMARY = HexColor("#2c3e50")
+C_ACCENT = HexColor("#3c78e7")
+C_GRID = HexColor("#d7dce3")
+C_NOTE_BG = HexColor("#fff7cc")
+C_NOTE_BORDER = HexColor("#f39c12")
+
+# Layout widths
+PAGE_W = 16.2 * cm  # approx after margins
+LABEL_W = 5.2 * cm
+VALUE_W = PAGE_W - LABEL_W
+
+LOGO_W = 3.2 * cm
+LOGO_H = 1.6 * cm
+LOGO_DPI = 300
+
+
+class InvoiceTemplate:
+    """Per-process invoice layout; call render() for each payment"""
+
+    CATEGORY_LABELS = {
+        "month": "اشتراك شهري",
+        "subscription": "رسوم الانخراط",
+        "assurance": "التأمين",
+        "jawaz": "جواز",
+    }
+
+    LABELS = (
+        "إيصال دفع", "التاريخ", "رقم الفاتورة", "تاريخ الدفع",
+        "معلومات الجمعية", "معلومات العميل", "تفاصيل الدفع",
+        "الاسم", "العنوان", "الهاتف", "البريد الإلكتروني", "البطاقة الوطنية",
+        "الوصف", "المبلغ", "المجموع الفرعي", "المجموع الإجمالي",
+    )
+
+    NOTES = (
+        "ملاحظات\n"
+        "• هذه الوثيقة عبارة عن إيصال دفع تم إنشاؤه إلكترونياً\n"
+        "• يُرجى الاحتفاظ بهذا الإيصال كإثبات للدفع\n"
+        "• لأي استفسارات، يُرجى التواصل مع الجمعية"
+    )
+
+    def __init__(self):
+        register_fonts()
+
+        # Pre-shaped constant strings
+        self.labels = {label: ar(label) for label in self.LABELS}
+        self.categories = {key: ar(label) for key, label in self.CATEGORY_LABELS.items()}
+        self.notes = ar(self.NOTES)
+
+        # Paragraph styles
+        styles = getSampleStyleSheet()
+        self.style_small_center = ParagraphStyle(
+            "SmallCenter",
+            parent=styles["Normal"],
+            fontName="DejaVu",
+            fontSize=8,
+            leading=12,
+            alignment=TA_CENTER,
+            textColor=HexColor("#6b7280"),
+        )
+
+        # Table styles
+        self.section_style = TableStyle([
+            ("BACKGROUND", (0, 0), (-1, -1), C_PRIMARY),
+            ("TEXTCOLOR", (0, 0), (-1, -1), colors.white),
+            ("FONTNAME", (0, 0), (-1, -1), "DejaVu-Bold"),
+            ("FONTSIZE", (0, 0), (-1, -1), 11),
+            ("ALIGN", (0, 0), (-1, -1), "RIGHT"),
+            ("LEFTPADDING", (0, 0), (-1, -1), 10),
+            ("RIGHTPADDING", (0, 0), (-1, -1), 10),
+            ("TOPPADDING", (0, 0), (-1, -1), 7),
+            ("BOTTOMPADDING", (0, 0), (-1, -1), 7),
+        ])
+        self.kv_style = TableStyle([
+            ("FONTNAME", (0, 0), (0, -1), "DejaVu-Bold"),
+            ("FONTNAME", (1, 0), (1, -1), "DejaVu"),
+            ("FONTSIZE", (0, 0), (-1, -1), 10),
+            ("ALIGN", (0, 0), (-1, -1), "RIGHT"),
+            ("VALIGN", (0, 0), (-1, -1), "MIDDLE"),
+            ("LINEBELOW", (0, 0), (-1, -1), 0.6, C_GRID),
+            ("TOPPADDING", (0, 0), (-1, -1), 7),
+            ("BOTTOMPADDING", (0, 0), (-1, -1), 7),
+            ("LEFTPADDING", (0, 0), (-1, -1), 8),
+            ("RIGHTPADDING", (0, 0), (-1, -1), 8),
+        ])
+        self.title_style = TableStyle([
+            ("BACKGROUND", (0, 0), (-1, -1), C_ACCENT),
+            ("TEXTCOLOR", (0, 0), (-1, -1), colors.white),
+            ("ALIGN", (0, 0), (0, 0), "LEFT"),
+            ("ALIGN", (1, 0), (1, 0), "RIGHT"),
+            ("VALIGN", (0, 0), (-1, -1), "MIDDLE"),
+            ("FONTNAME", (1, 0), (1, 0), "DejaVu-Bold"),
+            ("FONTSIZE", (1, 0), (1, 0), 18),
+            ("LEFTPADDING", (0, 0), (-1, -1), 10),
+            ("RIGHTPADDING", (0, 0), (-1, -1), 10),
+            ("TOPPADDING", (0, 0), (-1, -1), 10),
+            ("BOTTOMPADDING", (0, 0), (-1, -1), 10),
+        ])
+        self.meta_wrap_style = TableStyle([
+            ("BOX", (0, 0), (-1, -1), 1, C_PRIMARY),
+            ("INNERPADDING", (0, 0), (-1, -1), 0),
+        ])
+        self.pay_style = TableStyle([
+            ("BACKGROUND", (0, 0), (-1, 0), C_PRIMARY),
+            ("TEXTCOLOR", (0, 0), (-1, 0), colors.white),
+            ("FONTNAME", (0, 0), (-1, 0), "DejaVu-Bold"),
+            ("FONTSIZE", (0, 0), (-1, 0), 10),
+            ("ALIGN", (0, 0), (-1, 0), "CENTER"),
+            ("VALIGN", (0, 0), (-1, 0), "MIDDLE"),
+            ("TOPPADDING", (0, 0), (-1, 0), 8),
+            ("BOTTOMPADDING", (0, 0), (-1, 0), 8),
+
+            ("FONTNAME", (0, 1), (-1, -1), "DejaVu"),
+            ("FONTSIZE", (0, 1), (-1, -1), 10),
+            ("ALIGN", (0, 1), (0, 1), "RIGHT"),
+            ("ALIGN", (1, 1), (1, 1), "CENTER"),
+            ("ALIGN", (2, 1), (2, 1), "CENTER"),
+            ("VALIGN", (0, 1), (-1, -1), "MIDDLE"),
+
+            ("BOX", (0, 0), (-1, -1), 1, C_PRIMARY),
+            ("INNERGRID", (0, 0), (-1, -1), 0.6, C_GRID),
+            ("TOPPADDING", (0, 1), (-1, -1), 7),
+            ("BOTTOMPADDING", (0, 1), (-1, -1), 7),
+        ])
+        self.totals_style = TableStyle([
+            ("FONTNAME", (0, 0), (0, -2), "DejaVu"),
+            ("FONTNAME", (1, 0), (1, -2), "DejaVu"),
+            ("FONTSIZE", (0, 0), (-1, -2), 10),
+
+            ("ALIGN", (0, 0), (-1, -1), "RIGHT"),
+            ("LINEBELOW", (0, 0), (-1, -2), 0.6, C_GRID),
+
+            # Total row highlight
+            ("BACKGROUND", (0, 2), (1, 2), C_PRIMARY),
+            ("TEXTCOLOR", (0, 2), (1, 2), colors.white),
+            ("FONTNAME", (0, 2), (1, 2), "DejaVu-Bold"),
+            ("FONTSIZE", (0, 2), (1, 2), 11),
+
+            ("TOPPADDING", (0, 0), (-1, -1), 8),
+            ("BOTTOMPADDING", (0, 0), (-1, -1), 8),
+            ("LEFTPADDING", (0, 0), (-1, -1), 8),
+            ("RIGHTPADDING", (0, 0), (-1, -1), 8),
+            ("BOX", (0, 0), (-1, -1), 1, C_PRIMARY),
+        ])
+        self.notes_style = TableStyle([
+            ("BACKGROUND", (0, 0), (-1, -1), C_NOTE_BG),
+            ("BOX", (0, 0), (-1, -1), 1, C_NOTE_BORDER),
+            ("FONTNAME", (0, 0), (-1, -1), "DejaVu"),
+            ("FONTSIZE", (0, 0), (-1, -1), 9.5),
+            ("ALIGN", (0, 0), (-1, -1), "RIGHT"),
+            ("TOPPADDING", (0, 0), (-1, -1), 10),
+            ("BOTTOMPADDING", (0, 0), (-1, -1), 10),
+            ("LEFTPADDING", (0, 0), (-1, -1), 12),
+            ("RIGHTPADDING", (0, 0), (-1, -1), 12),
+        ])
+
+        self.logo = self._load_logo()
+
+    @staticmethod
+    def _load_logo():
+        """
+        Decode the logo once and downscale it to its printed size.
+        The source PNG is 1563px square; embedding it re-encoded
+        ~2MB of pixels into every single invoice.
+        """
+        logo_path = get_saas_logo_path()
+        if not logo_path:
+            return None
+        try:
+            from PIL import Image as PILImage
+            size = (round(LOGO_W / cm / 2.54 * LOGO_DPI), round(LOGO_H / cm / 2.54 * LOGO_DPI))
+            with PILImage.open(logo_path) as source:
+                image = source.convert("RGBA").resize(size, PILImage.LANCZOS)
+            buffer = BytesIO()
+            image.save(buffer, format="PNG", optimize=True)
+            return buffer.getvalue()
+        except Exception:
+            return None
+
+    # ------------------------------------------------------
+    # Flowable helpers
+    # ------------------------------------------------------
+
+    def section_header(self, label):
+        t = Table([[self.labels[label]]], colWidths=[PAGE_W])
+        t.setStyle(self.section_style)
+        return t
+
+    def kv_table(self, rows):
+        """
+        rows: list[tuple[value, label]] (label must be a constant in LABELS)
+        """
+        data = [[ar(value), self.labels[label]] for (value, label) in rows]
+        t = Table(data, colWidths=[LABEL_W, VALUE_W])
+        t.setStyle(self.kv_style)
+        return t
+
+    def logo_cell(self):
+        if not self.logo:
+            return ""
+        return Image(BytesIO(self.logo), width=LOGO_W, height=LOGO_H)
+
+    # ------------------------------------------------------
+    # Render
+    # ------------------------------------------------------
+
+    def render(self, payment, invoice_number) -> bytes:
+        """Render the invoice of a payment (trainer & organization preloaded)"""
+        org = payment.organization
+        trainer = payment.trainer
+        # Only the payment date is printed (no render time): cached PDFs stay identical
+        category = self.categories.get(payment.paymentCategry) or ar(payment.paymentCategry)
+
+        # Money
+        amount = float(payment.paymentAmount or 0)
+        tax_rate = 0.0  # Morocco SaaS default (receipt); keep shown as 0%
+        tax_amount = round(amount * tax_rate, 2)
+        total = round(amount + tax_amount, 2)
+
+        buffer = BytesIO()
+        doc = SimpleDocTemplate(
+            buffer,
+            pagesize=A4,
+            rightMargin=1.7 * cm,
+            leftMargin=1.7 * cm,
+            topMargin=1.4 * cm,
+            bottomMargin=1.4 * cm,
+            title=str(invoice_number),
+        )
+        elements = []
+
+        # Top row: SaaS logo + Title bar
+        title_table = Table(
+            [[self.logo_cell(), self.labels["إيصال دفع"]]],
+            colWidths=[4.0 * cm, PAGE_W - 4.0 * cm]
+        )
+        title_table.setStyle(self.title_style)
+        elements.append(title_table)
+        elements.append(Spacer(1, 0.5 * cm))
+
+        # Invoice meta
+        meta = self.kv_table([
+            (invoice_number, "رقم الفاتورة"),
+            (payment.paymentdate.strftime("%Y/%m/%d"), "تاريخ الدفع"),
+        ])
+        meta_wrap = Table([[meta]], colWidths=[PAGE_W])
+        meta_wrap.setStyle(self.meta_wrap_style)
+        elements.append(meta_wrap)
+        elements.append(Spacer(1, 0.55 * cm))
+
+        # Organization
+        elements.append(self.section_header("معلومات الجمعية"))
+        elements.append(Spacer(1, 0.25 * cm))
+
+        org_rows = [(getattr(org, "name", ""), "الاسم")]
+        if getattr(org, "location", None):
+            org_rows.append((org.location, "العنوان"))
+        if getattr(org, "phone_number", None):
+            org_rows.append((org.phone_number, "الهاتف"))
+        if getattr(org, "email", None):
+            org_rows.append((org.email, "البريد الإلكتروني"))
+
+        elements.append(self.kv_table(org_rows))
+        elements.append(Spacer(1, 0.55 * cm))
+
+        # Client
+        elements.append(self.section_header("معلومات العميل"))
+        elements.append(Spacer(1, 0.25 * cm))
+
+        full_name = getattr(trainer, "full_name", "") or f"{getattr(trainer, 'first_name', '')} {getattr(trainer, 'last_name', '')}".strip()
+        client_rows = [(full_name, "الاسم")]
+
+        if getattr(trainer, "CIN", None):
+            client_rows.append((trainer.CIN, "البطاقة الوطنية"))
+
+        phone = getattr(trainer, "phone", None) or getattr(trainer, "phone_parent", None)
+        if phone:
+            client_rows.append((phone, "الهاتف"))
+        if getattr(trainer, "email", None):
+            client_rows.append((trainer.email, "البريد الإلكتروني"))
+
+        elements.append(self.kv_table(client_rows))
+        elements.append(Spacer(1, 0.55 * cm))
+
+        # Payment details table
+        elements.append(self.section_header("تفاصيل الدفع"))
+        elements.append(Spacer(1, 0.25 * cm))
+
+        pay_data = [
+            [self.labels["الوصف"], self.labels["التاريخ"], self.labels["المبلغ"]],
+            [category, ar(payment.paymentdate.strftime("%Y/%m/%d")), f"{amount:.2f} MAD"],
+        ]
+        pay_table = Table(pay_data, colWidths=[9.0 * cm, 4.0 * cm, PAGE_W - 13.0 * cm])
+        pay_table.setStyle(self.pay_style)
+        elements.append(pay_table)
+        elements.append(Spacer(1, 0.45 * cm))
+
+        # Totals (clean right block)
+        totals_data = [
+            [self.labels["المجموع الفرعي"], f"{amount:.2f} MAD"],
+            [ar(f"الضريبة ({int(tax_rate * 100)}%)"), f"{tax_amount:.2f} MAD"],
+            [self.labels["المجموع الإجمالي"], f"{total:.2f} MAD"],
+        ]
+        totals_table = Table(totals_data, colWidths=[LABEL_W, VALUE_W])
+        totals_table.setStyle(self.totals_style)
+        elements.append(totals_table)
+        elements.append(Spacer(1, 0.55 * cm))
+
+        # Notes
+        notes_table = Table([[self.notes]], colWidths=[PAGE_W])
+        notes_table.setStyle(self.notes_style)
+        elements.append(notes_table)
+        elements.append(Spacer(1, 0.6 * cm))
+
+        # Footer (per organization)
+        footer_text = ar(f"{getattr(org, 'name', '')} - جميع الحقوق محفوظة")
+        elements.append(Paragraph(footer_text, self.style_small_center))
+
+        # Build PDF
+        doc.build(elements)
+
+        pdf_bytes = buffer.getvalue()
+        buffer.close()
+        return pdf_bytes
+
+
+@lru_cache(maxsize=None)
+def get_invoice_template() -> InvoiceTemplate:
+    """The process-wide template, built by the first invoice"""
+    return InvoiceTemplate()
@@ -1,18 +1,23 @@
+import asyncio
 from datetime import datetime, timedelta
 from decimal import Decimal
 from django.shortcuts import render, redirect
 from django.http import JsonResponse
 from django.views.decorators.http import require_http_methods
 from django.contrib.auth.decorators import login_required
+from asgiref.sync import sync_to_async
 from django.db.models import Q, Value, Sum, Count
-from django.db.models.functions import Concat, TruncMonth
+from django.db.models.functions import Concat
 from django.core.paginator import Paginator
 from django.core.cache import cache
 from django.utils import timezone
 from django.utils.timezone import make_aware
 import json
+from ..json_api import FastJsonResponse, api_per_page, field_columns, project, requested_fields
 from ..middleware import require_organization
+from ..throttling import REPORT_MAX_RANGE_DAYS, throttle
 from ..models import Payments, Staff, Trainer, Costs, Article, Addedpay
+from .timeseries import MONTH_NAMES, POINT_FIELDS, build_timeseries, choose_bucket
 from calendar import monthrange
 
 
@@ -31,26 +36,54 @@ def payments_history(request):
     return render(request, "pages/payments_history.html", context)
 
 
+# Payment category choices
+PAYMENT_CATEGORY_CHOICES = {
+    "month": "شهرية",
+    "subscription": "انخراط",
+    "assurance": "التأمين",
+    "jawaz": "جواز",
+}
+
+# ?fields= of api_payments_list: {name: (columns, getter)}
+PAYMENT_LIST_FIELDS = {
+    'id': (('id',), lambda payment: payment.id),
+    'category': (('paymentCategry',), lambda payment: PAYMENT_CATEGORY_CHOICES.get(
+        payment.paymentCategry, payment.paymentCategry
+    )),
+    'trainer_name': (
+        ('trainer__first_name', 'trainer__last_name'),
+        lambda payment: f"{payment.trainer.first_name} {payment.trainer.last_name}",
+    ),
+    'amount': (('paymentAmount',), lambda payment: payment.paymentAmount),
+    'date': (('paymentdate',), lambda payment: payment.paymentdate),
+}
+
+
 @login_required
 @require_organization
+@throttle('list')
 @require_http_methods(["GET"])
 def api_payments_list(request):
     """
     JSON API: Get paginated payments list with search
-    Optimized with select_related
+    ?fields=id,amount,... limits the columns read (no trainer join without trainer_name)
     """
     organization = request.organization
     
     # Get search query
     search_query = request.GET.get('search', '').strip()
     
-    # Base queryset with optimization
-    payments = Payments.objects.select_related('trainer').filter(
+    try:
+        fields = requested_fields(request, PAYMENT_LIST_FIELDS)
+    except ValueError as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=400)
+    
+    # Base queryset: only the columns the requested fields read
+    payments = Payments.objects.filter(
         organization=organization
-    ).only(
-        'id', 'paymentCategry', 'paymentAmount', 'paymentdate',
-        'trainer__first_name', 'trainer__last_name'
-    )
+    ).only('id', *field_columns(PAYMENT_LIST_FIELDS, fields))
+    if 'trainer_name' in fields:
+        payments = payments.select_related('trainer')
     
     # Apply search filter
     if search_query:
@@ -72,35 +105,13 @@ def api_payments_list(request):
     
     # Pagination
     page = int(request.GET.get('page', 1))
-    per_page = int(request.GET.get('per_page', 25))
+    per_page = api_per_page(request, 25)
     
     paginator = Paginator(payments, per_page)
     page_obj = paginator.get_page(page)
     
-    # Payment category choices
-    PAYMENT_CATEGORY_CHOICES = {
-        "month": "شهرية",
-        "subscription": "انخراط",
-        "assurance": "التأمين",
-        "jawaz": "جواز",
-    }
-    
-    # Build response data
-    payments_data = []
-    for payment in page_obj:
-        payments_data.append({
-            'id': payment.id,
-            'category': PAYMENT_CATEGORY_CHOICES.get(
-                payment.paymentCategry, 
-                payment.paymentCategry
-            ),
-            'trainer_name': f"{payment.trainer.first_name} {payment.trainer.last_name}",
-            'amount': float(payment.paymentAmount),
-            'date': payment.paymentdate.isoformat(),
-        })
-    
-    return JsonResponse({
-        'payments': payments_data,
+    return FastJsonResponse({
+        'payments': [project(payment, PAYMENT_LIST_FIELDS, fields) for payment in page_obj],
         'total_count': paginator.count,
         'page': page_obj.number,
         'total_pages': paginator.num_pages,
@@ -407,40 +418,137 @@ def calculate_staff_salaries(organization, start_date, end_date, today):
     }
 
 
-def get_payments_summary(organization, start_date, end_date):
-    """Get payments summary within date range"""
-    payments = Payments.objects.filter(
+def payments_in_range(organization, start_date, end_date):
+    return Payments.objects.filter(
         organization=organization,
         paymentdate__range=[start_date, end_date]
-    ).aggregate(
-        total=Sum('paymentAmount'),
-        count=Count('id')
     )
-    
+
+
+def costs_in_range(organization, start_datetime, end_datetime):
+    return Costs.objects.filter(
+        organization=organization,
+        date__range=[start_datetime, end_datetime]
+    )
+
+
+def addedpay_in_range(organization, start_datetime, end_datetime):
+    return Addedpay.objects.filter(
+        organization=organization,
+        date__range=[start_datetime, end_datetime]
+    )
+
+
+def articles_in_range(organization, start_date, end_date):
+    return Article.objects.filter(
+        organization=organization,
+        date__range=[start_date, end_date]
+    )
+
+
+def total_and_count(row):
+    """{'total': Sum, 'count': Count} aggregate → JSON numbers"""
     return {
-        'total': float(payments['total'] or 0),
-        'count': payments['count'] or 0
+        'total': float(row['total'] or 0),
+        'count': row['count'] or 0
     }
 
 
+def get_payments_summary(organization, start_date, end_date):
+    """Get payments summary within date range"""
+    return total_and_count(
+        payments_in_range(organization, start_date, end_date).aggregate(
+            total=Sum('paymentAmount'),
+            count=Count('id')
+        )
+    )
+
+
 def get_costs_summary(organization, start_datetime, end_datetime):
     """Get costs summary within date range"""
-    costs = Costs.objects.filter(
-        organization=organization,
-        date__range=[start_datetime, end_datetime]
-    ).aggregate(
-        total=Sum('amount'),
-        count=Count('id')
+    return total_and_count(
+        costs_in_range(organization, start_datetime, end_datetime).aggregate(
+            total=Sum('amount'),
+            count=Count('id')
+        )
+    )
+
+
+def _report_range(start, end):
+    """'YYYY-MM-DD' strings → dates + aware datetimes covering whole days"""
+    start_date = datetime.strptime(start, "%Y-%m-%d").date()
+    end_date = datetime.strptime(end, "%Y-%m-%d").date()
+    
+    # Create timezone-aware datetime objects for DateTimeField comparisons
+    start_datetime = make_aware(datetime.combine(start_date, datetime.min.time()))
+    end_datetime = make_aware(datetime.combine(end_date, datetime.max.time()))
+    return start_date, end_date, start_datetime, end_datetime
+
+
+def financial_report_cache_key(organization_id, start, end):
+    """Cache key of api_financial_report for the 'YYYY-MM-DD' range start..end"""
+    return f'financial_report_{organization_id}_{start}_{end}'
+
+
+def timeseries_cache_key(organization_id, start, end, bucket, fields):
+    """Cache key of api_timeseries (`fields` in any order, keyed in POINT_FIELDS order)"""
+    fields = ','.join(name for name in POINT_FIELDS if name in fields)
+    return f'timeseries_{organization_id}_{start}_{end}_{bucket}_{fields}'
+
+
+def financial_report_data(start, end, rent_data, staff_data, payments_data,
+                          costs_data, addedpay_data, articles_data):
+    """Assemble the api_financial_report payload from its parts"""
+    # Calculate totals
+    total_income = (
+        payments_data['total'] +
+        float(addedpay_data['total'] or 0) +
+        float(articles_data['income'] or 0)
     )
     
+    total_expenses = (
+        costs_data['total'] +
+        float(articles_data['costs'] or 0) +
+        rent_data['expected'] +
+        staff_data['expected']
+    )
+    
+    net_profit = total_income - total_expenses
+    
     return {
-        'total': float(costs['total'] or 0),
-        'count': costs['count'] or 0
+        'success': True,
+        'summary': {
+            'total_income': round(total_income, 2),
+            'total_expenses': round(total_expenses, 2),
+            'net_profit': round(net_profit, 2),
+        },
+        'income': {
+            'payments': payments_data,
+            'added_payments': total_and_count(addedpay_data),
+            'articles': {
+                'total': float(articles_data['income'] or 0),
+                'count': articles_data['count'] or 0
+            }
+        },
+        'expenses': {
+            'costs': costs_data,
+            'articles_costs': {
+                'total': float(articles_data['costs'] or 0),
+                'count': articles_data['count'] or 0
+            },
+            'rent': rent_data,
+            'salaries': staff_data
+        },
+        'date_range': {
+            'start': start,
+            'end': end
+        }
     }
 
 
 @login_required
 @require_organization
+@throttle('report', max_range_days=REPORT_MAX_RANGE_DAYS)
 @require_http_methods(["GET"])
 def api_financial_report(request):
     """
@@ -454,20 +562,13 @@ def api_financial_report(request):
     end = request.GET.get('end', '2025-12-31')
     
     # Check cache first
-    cache_key = f'financial_report_{organization.id}_{start}_{end}'
+    cache_key = financial_report_cache_key(organization.id, start, end)
     cached_data = cache.get(cache_key)
     if cached_data:
         return JsonResponse(cached_data)
     
     try:
-        # Convert to date objects
-        start_date = datetime.strptime(start, "%Y-%m-%d").date()
-        end_date = datetime.strptime(end, "%Y-%m-%d").date()
-        
-        # Create timezone-aware datetime objects for DateTimeField comparisons
-        start_datetime = make_aware(datetime.combine(start_date, datetime.min.time()))
-        end_datetime = make_aware(datetime.combine(end_date, datetime.max.time()))
-        
+        start_date, end_date, start_datetime, end_datetime = _report_range(start, end)
         today = datetime.today().date()
         
         # Calculate rent
@@ -489,73 +590,20 @@ def api_financial_report(request):
         )
         
         # Get additional payments
-        addedpay_data = Addedpay.objects.filter(
-            organization=organization,
-            date__range=[start_datetime, end_datetime]
-        ).aggregate(
-            total=Sum('amount'),
-            count=Count('id')
-        )
+        addedpay_data = addedpay_in_range(
+            organization, start_datetime, end_datetime
+        ).aggregate(total=Sum('amount'), count=Count('id'))
         
         # Get articles data
-        articles_data = Article.objects.filter(
-            organization=organization,
-            date__range=[start_date, end_date]
-        ).aggregate(
-            income=Sum('participetion_price'),
-            costs=Sum('costs'),
-            count=Count('id')
-        )
-        
-        # Calculate totals
-        total_income = (
-            payments_data['total'] +
-            float(addedpay_data['total'] or 0) +
-            float(articles_data['income'] or 0)
-        )
+        articles_data = articles_in_range(
+            organization, start_date, end_date
+        ).aggregate(income=Sum('participetion_price'), costs=Sum('costs'), count=Count('id'))
         
-        total_expenses = (
-            costs_data['total'] +
-            float(articles_data['costs'] or 0) +
-            rent_data['expected'] +
-            staff_data['expected']
+        response_data = financial_report_data(
+            start, end, rent_data, staff_data, payments_data,
+            costs_data, addedpay_data, articles_data
         )
         
-        net_profit = total_income - total_expenses
-        
-        response_data = {
-            'success': True,
-            'summary': {
-                'total_income': round(total_income, 2),
-                'total_expenses': round(total_expenses, 2),
-                'net_profit': round(net_profit, 2),
-            },
-            'income': {
-                'payments': payments_data,
-                'added_payments': {
-                    'total': float(addedpay_data['total'] or 0),
-                    'count': addedpay_data['count'] or 0
-                },
-                'articles': {
-                    'total': float(articles_data['income'] or 0),
-                    'count': articles_data['count'] or 0
-                }
-            },
-            'expenses': {
-                'costs': costs_data,
-                'articles_costs': {
-                    'total': float(articles_data['costs'] or 0),
-                    'count': articles_data['count'] or 0
-                },
-                'rent': rent_data,
-                'salaries': staff_data
-            },
-            'date_range': {
-                'start': start,
-                'end': end
-            }
-        }
-        
         # Cache for 5 minutes
         cache.set(cache_key, response_data, 300)
         
@@ -572,157 +620,51 @@ def api_financial_report(request):
 
 @login_required
 @require_organization
+@throttle('report', max_range_days=REPORT_MAX_RANGE_DAYS)
 @require_http_methods(["GET"])
-def api_monthly_breakdown(request):
+async def api_financial_report_async(request):
     """
-    JSON API: Get monthly breakdown of income and expenses
-    Uses Django ORM aggregation for better performance
+    JSON API: api_financial_report for ASGI (settings.ASYNC_VIEWS)
+    The independent aggregates are awaited together
     """
     organization = request.organization
     
-    # Get date range from request
     start = request.GET.get('start', '2025-01-01')
     end = request.GET.get('end', '2025-12-31')
     
+    cache_key = financial_report_cache_key(organization.id, start, end)
+    cached_data = await cache.aget(cache_key)
+    if cached_data:
+        return JsonResponse(cached_data)
+    
     try:
-        start_date = datetime.strptime(start, "%Y-%m-%d").date()
-        end_date = datetime.strptime(end, "%Y-%m-%d").date()
-        
-        # Create timezone-aware datetime objects for DateTimeField comparisons
-        start_datetime = make_aware(datetime.combine(start_date, datetime.min.time()))
-        end_datetime = make_aware(datetime.combine(end_date, datetime.max.time()))
-        
-        # Income by month
-        payments_by_month = Payments.objects.filter(
-            organization=organization,
-            paymentdate__range=[start_date, end_date]
-        ).annotate(
-            month=TruncMonth('paymentdate')
-        ).values('month').annotate(
-            total=Sum('paymentAmount')
-        ).order_by('month')
-        
-        added_payments_by_month = Addedpay.objects.filter(
-            organization=organization,
-            date__range=[start_datetime, end_datetime]
-        ).annotate(
-            month=TruncMonth('date')
-        ).values('month').annotate(
-            total=Sum('amount')
-        ).order_by('month')
-        
-        articles_income_by_month = Article.objects.filter(
-            organization=organization,
-            date__range=[start_date, end_date]
-        ).annotate(
-            month=TruncMonth('date')
-        ).values('month').annotate(
-            total=Sum('participetion_price')
-        ).order_by('month')
-        
-        # Expenses by month
-        costs_by_month = Costs.objects.filter(
-            organization=organization,
-            date__range=[start_datetime, end_datetime]
-        ).annotate(
-            month=TruncMonth('date')
-        ).values('month').annotate(
-            total=Sum('amount')
-        ).order_by('month')
-        
-        articles_costs_by_month = Article.objects.filter(
-            organization=organization,
-            date__range=[start_date, end_date]
-        ).annotate(
-            month=TruncMonth('date')
-        ).values('month').annotate(
-            total=Sum('costs')
-        ).order_by('month')
-        
-        # Convert to dictionaries for easy lookup
-        def _month_key(m):
-            # TruncMonth may return a date or datetime; normalize to a date with day=1
-            if hasattr(m, "date"):
-                m_date = m.date()
-            else:
-                m_date = m
-            return m_date.replace(day=1)
-
-        payments_dict = {_month_key(item['month']): float(item['total'] or 0) for item in payments_by_month}
-        added_payments_dict = {_month_key(item['month']): float(item['total'] or 0) for item in added_payments_by_month}
-        articles_income_dict = {_month_key(item['month']): float(item['total'] or 0) for item in articles_income_by_month}
-        costs_dict = {_month_key(item['month']): float(item['total'] or 0) for item in costs_by_month}
-        articles_costs_dict = {_month_key(item['month']): float(item['total'] or 0) for item in articles_costs_by_month}
+        start_date, end_date, start_datetime, end_datetime = _report_range(start, end)
+        today = datetime.today().date()
         
-        # Generate all months in range
-        monthly_data = []
-        current_date = start_date.replace(day=1)
-        month_names = ['يناير', 'فبراير', 'مارس', 'أبريل', 'مايو', 'يونيو',
-                      'يوليو', 'أغسطس', 'سبتمبر', 'أكتوبر', 'نوفمبر', 'ديسمبر']
+        rent_data = calculate_rent(organization, start_date, end_date, today)
+        staff_data, payments, costs, addedpay_data, articles_data = await asyncio.gather(
+            sync_to_async(calculate_staff_salaries)(organization, start_date, end_date, today),
+            payments_in_range(organization, start_date, end_date).aaggregate(
+                total=Sum('paymentAmount'), count=Count('id')
+            ),
+            costs_in_range(organization, start_datetime, end_datetime).aaggregate(
+                total=Sum('amount'), count=Count('id')
+            ),
+            addedpay_in_range(organization, start_datetime, end_datetime).aaggregate(
+                total=Sum('amount'), count=Count('id')
+            ),
+            articles_in_range(organization, start_date, end_date).aaggregate(
+                income=Sum('participetion_price'), costs=Sum('costs'), count=Count('id')
+            ),
+        )
         
-        while current_date <= end_date:
-            # Get income for this month
-            income = (
-                payments_dict.get(current_date, 0.0) +
-                added_payments_dict.get(current_date, 0.0) +
-                articles_income_dict.get(current_date, 0.0)
-            )
-            
-            # Get expenses for this month
-            expenses = (
-                costs_dict.get(current_date, 0.0) +
-                articles_costs_dict.get(current_date, 0.0)
-            )
-            
-            # Add rent if applicable
-            if organization.datepay and organization.rent_amount:
-                # Check if rent is due this month
-                rent_date = organization.datepay
-                while rent_date.replace(day=1) <= current_date:
-                    if rent_date.replace(day=1) == current_date:
-                        expenses += float(organization.rent_amount)
-                        break
-                    # Move to next month
-                    days_in_month = monthrange(rent_date.year, rent_date.month)[1]
-                    rent_date += timedelta(days=days_in_month)
-                    if rent_date.replace(day=1) > current_date:
-                        break
-            
-            # Add staff salaries if applicable
-            staff_members = Staff.objects.filter(organization=organization)
-            for staff in staff_members:
-                # Check if salary is due this month
-                salary_date = staff.started.replace(day=1) if hasattr(staff.started, 'replace') else staff.started
-                while salary_date <= current_date:
-                    if salary_date == current_date:
-                        expenses += float(staff.salary)
-                        break
-                    # Move to next month
-                    if salary_date.month == 12:
-                        salary_date = salary_date.replace(year=salary_date.year + 1, month=1)
-                    else:
-                        salary_date = salary_date.replace(month=salary_date.month + 1)
-                    if salary_date > current_date:
-                        break
-            
-            monthly_data.append({
-                'month': month_names[current_date.month - 1],
-                'year': current_date.year,
-                'income': income,
-                'expenses': expenses,
-                'net': round(income - expenses, 2),
-            })
-            
-            # Move to next month
-            if current_date.month == 12:
-                current_date = current_date.replace(year=current_date.year + 1, month=1)
-            else:
-                current_date = current_date.replace(month=current_date.month + 1)
+        response_data = financial_report_data(
+            start, end, rent_data, staff_data, total_and_count(payments),
+            total_and_count(costs), addedpay_data, articles_data
+        )
+        await cache.aset(cache_key, response_data, 300)
         
-        return JsonResponse({
-            'success': True,
-            'monthly_data': monthly_data
-        })
+        return JsonResponse(response_data)
         
     except Exception as e:
         import traceback
@@ -731,101 +673,119 @@ def api_monthly_breakdown(request):
             'error': str(e),
             'traceback': traceback.format_exc()
         }, status=500)
-    
+
+
+def _breakdown_range(request, bucket, default_start=None, default_end=None):
+    """(start date, end date) of a breakdown; ValueError when the range needs more than MAX_POINTS buckets"""
+    start_date = datetime.strptime(request.GET.get('start') or default_start, "%Y-%m-%d").date()
+    end_date = datetime.strptime(request.GET.get('end') or default_end, "%Y-%m-%d").date()
+    if choose_bucket(start_date, end_date, bucket) != bucket:
+        raise ValueError(f'Range too long for {bucket} buckets: use /api/timeseries/')
+    return start_date, end_date
+
 
 @login_required
 @require_organization
+@throttle('report', max_range_days=REPORT_MAX_RANGE_DAYS)
 @require_http_methods(["GET"])
-def api_daily_breakdown(request):
+def api_timeseries(request):
     """
-    JSON API: Daily breakdown of income and expenses within a date range
-    Intended mainly for single-month selection (day-by-day chart)
+    JSON API: income / expenses series for the charts
+    ?start=&end=&bucket=auto|day|week|month|quarter|year&fields=
+    The bucket is coarsened when the range would exceed TIMESERIES_MAX_POINTS
     """
     organization = request.organization
-
-    start = request.GET.get('start')
-    end = request.GET.get('end')
-
-    if not start or not end:
-        return JsonResponse({'success': False, 'error': 'Missing start/end'}, status=400)
-
+    today = timezone.now().date()
+    
+    start = request.GET.get('start', f'{today.year}-01-01')
+    end = request.GET.get('end', f'{today.year}-12-31')
+    requested_bucket = request.GET.get('bucket', 'auto')
+    
     try:
         start_date = datetime.strptime(start, "%Y-%m-%d").date()
         end_date = datetime.strptime(end, "%Y-%m-%d").date()
+        bucket = choose_bucket(start_date, end_date, requested_bucket)
+        fields = requested_fields(request, POINT_FIELDS)
+    except ValueError as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=400)
+    
+    cache_key = timeseries_cache_key(organization.id, start, end, bucket, fields)
+    points = cache.get(cache_key)
+    if points is None:
+        points = build_timeseries(organization, start_date, end_date, bucket, fields)
+        cache.set(cache_key, points, 300)
+    
+    return FastJsonResponse({
+        'success': True,
+        'bucket': bucket,
+        'downsampled': requested_bucket not in ('auto', bucket),
+        'points': points,
+    })
 
-        # timezone-aware for DateTimeField
-        start_dt = make_aware(datetime.combine(start_date, datetime.min.time()))
-        end_dt = make_aware(datetime.combine(end_date, datetime.max.time()))
-
-        # --- INCOME ---
-        # Payments: paymentdate is DateField
-        payments = Payments.objects.filter(
-            organization=organization,
-            paymentdate__range=[start_date, end_date]
-        ).values('paymentdate').annotate(total=Sum('paymentAmount'))
-
-        payments_dict = {p['paymentdate']: float(p['total'] or 0) for p in payments}
-
-        # Addedpay: date is DateTimeField
-        added = Addedpay.objects.filter(
-            organization=organization,
-            date__range=[start_dt, end_dt]
-        ).values('date__date').annotate(total=Sum('amount'))
-
-        added_dict = {a['date__date']: float(a['total'] or 0) for a in added}
-
-        # Articles income: date is DateField
-        articles_income = Article.objects.filter(
-            organization=organization,
-            date__range=[start_date, end_date]
-        ).values('date').annotate(total=Sum('participetion_price'))
-
-        articles_income_dict = {x['date']: float(x['total'] or 0) for x in articles_income}
-
-        # --- EXPENSES ---
-        costs = Costs.objects.filter(
-            organization=organization,
-            date__range=[start_dt, end_dt]
-        ).values('date__date').annotate(total=Sum('amount'))
-
-        costs_dict = {c['date__date']: float(c['total'] or 0) for c in costs}
-
-        articles_costs = Article.objects.filter(
-            organization=organization,
-            date__range=[start_date, end_date]
-        ).values('date').annotate(total=Sum('costs'))
-
-        articles_costs_dict = {x['date']: float(x['total'] or 0) for x in articles_costs}
-
-        # Generate all days in range
-        daily_data = []
-        d = start_date
-        while d <= end_date:
-            income = (
-                payments_dict.get(d, 0.0) +
-                added_dict.get(d, 0.0) +
-                articles_income_dict.get(d, 0.0)
-            )
-            expenses = (
-                costs_dict.get(d, 0.0) +
-                articles_costs_dict.get(d, 0.0)
-            )
-
-            daily_data.append({
-                'date': d.strftime('%Y-%m-%d'),
-                'day': d.day,
-                'income': round(income, 2),
-                'expenses': round(expenses, 2),
-                'net': round(income - expenses, 2),
-            })
-            d += timedelta(days=1)
 
-        return JsonResponse({'success': True, 'daily_data': daily_data})
+@login_required
+@require_organization
+@throttle('report', max_range_days=REPORT_MAX_RANGE_DAYS)
+@require_http_methods(["GET"])
+def api_monthly_breakdown(request):
+    """
+    JSON API: Get monthly breakdown of income and expenses
+    Expenses include rent and staff salaries (build_timeseries, month buckets)
+    """
+    try:
+        start_date, end_date = _breakdown_range(request, 'month', '2025-01-01', '2025-12-31')
+    except ValueError as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=400)
+    
+    points = build_timeseries(
+        request.organization, start_date, end_date, 'month',
+        fields=('start', 'income', 'expenses', 'fixed_costs', 'net')
+    )
+    monthly_data = [
+        {
+            'month': MONTH_NAMES[point['start'].month - 1],
+            'year': point['start'].year,
+            'income': point['income'],
+            'expenses': point['expenses'] + point['fixed_costs'],
+            'net': point['net'],
+        }
+        for point in points
+    ]
+    
+    return FastJsonResponse({
+        'success': True,
+        'monthly_data': monthly_data
+    })
+    
 
-    except Exception as e:
-        import traceback
-        return JsonResponse({
-            'success': False,
-            'error': str(e),
-            'traceback': traceback.format_exc()
-        }, status=500)
\ No newline at end of file
+@login_required
+@require_organization
+@throttle('report', max_range_days=REPORT_MAX_RANGE_DAYS)
+@require_http_methods(["GET"])
+def api_daily_breakdown(request):
+    """
+    JSON API: Daily breakdown of income and expenses within a date range
+    Intended mainly for single-month selection (day-by-day chart)
+    """
+    if not request.GET.get('start') or not request.GET.get('end'):
+        return JsonResponse({'success': False, 'error': 'Missing start/end'}, status=400)
+    try:
+        start_date, end_date = _breakdown_range(request, 'day')
+    except ValueError as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=400)
+    
+    points = build_timeseries(
+        request.organization, start_date, end_date, 'day', fields=('start', 'income', 'expenses')
+    )
+    daily_data = [
+        {
+            'date': point['start'],
+            'day': point['start'].day,
+            'income': point['income'],
+            'expenses': point['expenses'],
+            'net': point['income'] - point['expenses'],
+        }
+        for point in points
+    ]
+    
+    return FastJsonResponse({'success': True, 'daily_data': daily_data})
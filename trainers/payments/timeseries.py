@@ -0,0 +1,219 @@
+"""
+Financial time series
+One implementation behind /api/timeseries/, the daily and monthly breakdowns
+and the dashboard chart. Sums are truncated to buckets in SQL (Trunc), then
+gap-filled over the bucket starts of the range. 'auto' picks the finest
+bucket that keeps a series within TIMESERIES_MAX_POINTS; an explicit bucket
+that would exceed it is coarsened (downsampled).
+"""
+from calendar import monthrange
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from dateutil.relativedelta import relativedelta
+from django.conf import settings
+from django.db.models import DateField, Sum
+from django.db.models.functions import Trunc
+from django.utils.timezone import make_aware
+
+from ..models import Addedpay, Article, Costs, Payments, Staff
+
+BUCKETS = ('day', 'week', 'month', 'quarter', 'year')
+MAX_POINTS = getattr(settings, 'TIMESERIES_MAX_POINTS', 120)
+STEPS = {
+    'day': relativedelta(days=1),
+    'week': relativedelta(weeks=1),
+    'month': relativedelta(months=1),
+    'quarter': relativedelta(months=3),
+    'year': relativedelta(years=1),
+}
+MONTH_NAMES = ['يناير', 'فبراير', 'مارس', 'أبريل', 'مايو', 'يونيو',
+               'يوليو', 'أغسطس', 'سبتمبر', 'أكتوبر', 'نوفمبر', 'ديسمبر']
+PAYMENT_CATEGORIES = ('month', 'subscription', 'assurance', 'jawaz')
+
+# Point fields (?fields=) and the query each sum needs: unrequested sums are not queried
+POINT_FIELDS = ('start', 'end', 'label', 'income', 'expenses', 'fixed_costs', 'net', 'by_category')
+QUERIES = {
+    'payments': {'income', 'net', 'by_category'},
+    'addedpay': {'income', 'net'},
+    'articles': {'income', 'expenses', 'net'},
+    'costs': {'expenses', 'net'},
+    'fixed_costs': {'fixed_costs', 'net'},
+}
+ZERO = Decimal('0')
+
+
+# ======================================================
+# Buckets
+# ======================================================
+
+def truncate_date(d, bucket):
+    """Start of the bucket containing `d` (same as the SQL Trunc; weeks start on Monday)"""
+    if bucket == 'day':
+        return d
+    if bucket == 'week':
+        return d - timedelta(days=d.weekday())
+    if bucket == 'month':
+        return d.replace(day=1)
+    if bucket == 'quarter':
+        return d.replace(month=(d.month - 1) // 3 * 3 + 1, day=1)
+    return d.replace(month=1, day=1)
+
+
+def point_count(start, end, bucket):
+    """Number of buckets between start and end, both included"""
+    if bucket == 'day':
+        return (end - start).days + 1
+    if bucket == 'week':
+        return (truncate_date(end, 'week') - truncate_date(start, 'week')).days // 7 + 1
+    if bucket == 'month':
+        return (end.year - start.year) * 12 + end.month - start.month + 1
+    if bucket == 'quarter':
+        return (end.year * 4 + (end.month - 1) // 3) - (start.year * 4 + (start.month - 1) // 3) + 1
+    return end.year - start.year + 1
+
+
+def choose_bucket(start, end, bucket='auto', max_points=MAX_POINTS):
+    """
+    The requested bucket, or the next coarser one that fits max_points
+    ('auto': the finest that fits). ValueError for unknown buckets, reversed
+    ranges and ranges that even yearly buckets cannot fit.
+    """
+    if end < start:
+        raise ValueError('end is before start')
+    if bucket == 'auto':
+        candidates = BUCKETS
+    elif bucket in BUCKETS:
+        candidates = BUCKETS[BUCKETS.index(bucket):]
+    else:
+        raise ValueError(f"Unknown bucket: {bucket} (available: auto, {', '.join(BUCKETS)})")
+    for candidate in candidates:
+        if point_count(start, end, candidate) <= max_points:
+            return candidate
+    raise ValueError(f'Range too long: more than {max_points} yearly points')
+
+
+def bucket_starts(start, end, bucket):
+    """Every bucket start from the one containing `start` to `end`"""
+    current = truncate_date(start, bucket)
+    starts = []
+    while current <= end:
+        starts.append(current)
+        current += STEPS[bucket]
+    return starts
+
+
+def bucket_label(d, bucket, multi_year):
+    """Chart label of the point starting on `d`"""
+    if bucket == 'day':
+        return str(d.day)
+    if bucket == 'week':
+        return f'{d.day}/{d.month}'
+    if bucket == 'month':
+        name = MONTH_NAMES[d.month - 1]
+        return f'{name} {d.year}' if multi_year else name
+    if bucket == 'quarter':
+        return f'الربع {(d.month - 1) // 3 + 1} {d.year}'
+    return str(d.year)
+
+
+# ======================================================
+# Sums
+# ======================================================
+
+def _bucket_sums(queryset, date_field, bucket, **sums):
+    """{bucket start: {name: Decimal}} with the truncation done in SQL"""
+    rows = queryset.annotate(
+        bucket=Trunc(date_field, bucket, output_field=DateField())
+    ).values('bucket').annotate(
+        **{name: Sum(field) for name, field in sums.items()}
+    ).order_by()
+    return {row['bucket']: {name: row[name] or ZERO for name in sums} for row in rows}
+
+
+def fixed_cost_dates(organization, start, end):
+    """
+    (due date, amount) of rent and staff salaries within [start, end]
+    Same schedule as calculate_rent / calculate_staff_salaries.
+    """
+    if organization.datepay and organization.rent_amount:
+        rent_date = organization.datepay
+        while rent_date <= end:
+            if rent_date >= start:
+                yield rent_date, organization.rent_amount
+            rent_date += timedelta(days=monthrange(rent_date.year, rent_date.month)[1])
+
+    for staff in Staff.objects.filter(organization=organization).only('started', 'salary'):
+        if not staff.salary:
+            continue
+        # Salaries fall on the 1st of every month from the start month
+        salary_date = max(staff.started.replace(day=1), start.replace(day=1))
+        if salary_date < start:
+            salary_date += relativedelta(months=1)
+        while salary_date <= end:
+            yield salary_date, staff.salary
+            salary_date += relativedelta(months=1)
+
+
+def build_timeseries(organization, start, end, bucket, fields=POINT_FIELDS):
+    """Gap-filled points of [start, end] in `bucket`s, each with the requested fields"""
+    fields = set(fields)
+    queries = {name for name, needs in QUERIES.items() if needs & fields}
+    start_datetime = make_aware(datetime.combine(start, datetime.min.time()))
+    end_datetime = make_aware(datetime.combine(end, datetime.max.time()))
+
+    by_category = {}
+    if 'payments' in queries:
+        rows = Payments.objects.filter(
+            organization=organization,
+            paymentdate__range=[start, end]
+        ).annotate(
+            bucket=Trunc('paymentdate', bucket, output_field=DateField())
+        ).values('bucket', 'paymentCategry').annotate(total=Sum('paymentAmount')).order_by()
+        for row in rows:
+            by_category.setdefault(row['bucket'], {})[row['paymentCategry']] = row['total'] or ZERO
+    added = costs = articles = {}
+    if 'addedpay' in queries:
+        added = _bucket_sums(Addedpay.objects.filter(
+            organization=organization, date__range=[start_datetime, end_datetime]
+        ), 'date', bucket, total='amount')
+    if 'costs' in queries:
+        costs = _bucket_sums(Costs.objects.filter(
+            organization=organization, date__range=[start_datetime, end_datetime]
+        ), 'date', bucket, total='amount')
+    if 'articles' in queries:
+        articles = _bucket_sums(Article.objects.filter(
+            organization=organization, date__range=[start, end]
+        ), 'date', bucket, income='participetion_price', costs='costs')
+    fixed_costs = {}
+    if 'fixed_costs' in queries:
+        for due, amount in fixed_cost_dates(organization, start, end):
+            key = truncate_date(due, bucket)
+            fixed_costs[key] = fixed_costs.get(key, ZERO) + amount
+
+    multi_year = start.year != end.year
+    empty = {}
+    points = []
+    for bucket_start in bucket_starts(start, end, bucket):
+        categories = by_category.get(bucket_start, empty)
+        article = articles.get(bucket_start, empty)
+        income = (
+            sum(categories.values(), ZERO)
+            + added.get(bucket_start, empty).get('total', ZERO)
+            + article.get('income', ZERO)
+        )
+        expenses = costs.get(bucket_start, empty).get('total', ZERO) + article.get('costs', ZERO)
+        fixed = fixed_costs.get(bucket_start, ZERO)
+        point_start = max(bucket_start, start)  # first and last buckets are clipped to the range
+        point = {
+            'start': point_start,
+            'end': min(bucket_start + STEPS[bucket] - timedelta(days=1), end),
+            'label': bucket_label(point_start, bucket, multi_year),
+            'income': round(income, 2),
+            'expenses': round(expenses, 2),
+            'fixed_costs': round(fixed, 2),
+            'net': round(income - expenses - fixed, 2),
+            'by_category': {category: categories.get(category, ZERO) for category in PAYMENT_CATEGORIES},
+        }
+        points.append({name: point[name] for name in POINT_FIELDS if name in fields})
+    return points
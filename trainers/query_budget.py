@@ -0,0 +1,187 @@
+"""
+Query budget
+Counts the queries and DB time of every request (connection.execute_wrapper),
+reports SQL shapes repeated in one request (N+1) with the line that issued
+them, and adds a Server-Timing header.
+
+Views declare their budget with @query_budget(max_queries=..., max_db_ms=...).
+The whole request is counted (session, user, staff lookups included). Going
+over budget logs a warning, or raises QueryBudgetExceeded when
+settings.QUERY_BUDGET_RAISE is on (test runs).
+"""
+import logging
+import os
+import re
+import sys
+import time
+from contextlib import ExitStack
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+logger = logging.getLogger('trainers.query_budget')
+
+# Same shape this many times in one request = N+1
+REPEAT_THRESHOLD = 5
+
+_IN_LIST = re.compile(r'\(\s*%s(?:\s*,\s*%s)+\s*\)')
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r'\b\d+(?:\.\d+)?\b')
+_LIBRARY_DIRS = ('site-packages', 'dist-packages', f'{os.sep}lib{os.sep}python')
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+def query_budget(max_queries=None, max_db_ms=None):
+    """Declare the query budget of a view (works above or below other decorators)"""
+    def decorator(view_func):
+        view_func.query_budget = (max_queries, max_db_ms)
+        return view_func
+    return decorator
+
+
+def sql_shape(sql):
+    """SQL without its literals: `IN (%s, %s, %s)` and `IN (%s)` are the same shape"""
+    sql = _IN_LIST.sub('(...)', sql)
+    sql = _STRING.sub('?', sql)
+    return _NUMBER.sub('?', sql)
+
+
+def _call_site():
+    """First frame of project code (not Django, not a library, not this module)"""
+    base_dir = str(settings.BASE_DIR)
+    frame = sys._getframe(2)
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if (filename.startswith(base_dir) and filename != __file__
+                and not any(part in filename for part in _LIBRARY_DIRS)):
+            return f'{os.path.relpath(filename, base_dir)}:{frame.f_lineno} in {frame.f_code.co_name}'
+        frame = frame.f_back
+    return 'unknown'
+
+
+class QueryTracker:
+    """execute_wrapper: query count, DB time and count per SQL shape"""
+
+    def __init__(self, repeat_threshold=REPEAT_THRESHOLD):
+        self.repeat_threshold = repeat_threshold
+        self.count = 0
+        self.duration = 0.0
+        self.shapes = {}  # shape -> [count, call site]
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - started
+            self.count += 1
+            shape = sql_shape(sql)
+            seen = self.shapes.get(shape)
+            if seen is None:
+                self.shapes[shape] = [1, None]
+            else:
+                seen[0] += 1
+                # Walking the stack is expensive: only for shapes that repeat
+                if seen[0] == self.repeat_threshold:
+                    seen[1] = _call_site()
+
+    @property
+    def duration_ms(self):
+        return self.duration * 1000
+
+    def repeated(self):
+        """[(count, call site, shape)] of the N+1 suspects, worst first"""
+        return sorted(
+            ((count, site, shape) for shape, (count, site) in self.shapes.items()
+             if count >= self.repeat_threshold),
+            reverse=True,
+        )
+
+
+def _track_queries(tracker):
+    """Install `tracker` on every connection of this thread (close the returned stack to remove it)"""
+    stack = ExitStack()
+    for alias in connections:
+        stack.enter_context(connections[alias].execute_wrapper(tracker))
+    return stack
+
+
+class QueryBudgetMiddleware:
+    """Optional: removed from the stack unless settings.QUERY_BUDGET_ENABLED"""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'QUERY_BUDGET_ENABLED', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.raise_errors = getattr(settings, 'QUERY_BUDGET_RAISE', False)
+        self.repeat_threshold = getattr(settings, 'QUERY_BUDGET_REPEAT_THRESHOLD', REPEAT_THRESHOLD)
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        request._query_budget = None
+        tracker = QueryTracker(self.repeat_threshold)
+        started = time.perf_counter()
+        with _track_queries(tracker):
+            response = self.get_response(request)
+        return self.finish(request, response, tracker, started)
+
+    async def __acall__(self, request):
+        request._query_budget = None
+        tracker = QueryTracker(self.repeat_threshold)
+        started = time.perf_counter()
+        # Connections are per thread: wrap the ones of the thread the request's
+        # sync code (views, async ORM calls) runs in
+        stack = await sync_to_async(_track_queries)(tracker)
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(stack.close)()
+        return self.finish(request, response, tracker, started)
+
+    def finish(self, request, response, tracker, started):
+        total_ms = (time.perf_counter() - started) * 1000
+        response['Server-Timing'] = (
+            f'db;dur={tracker.duration_ms:.1f};desc="{tracker.count} queries", '
+            f'app;dur={total_ms:.1f}'
+        )
+        self.check(request, tracker)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request._query_budget = getattr(view_func, 'query_budget', None)
+
+    def check(self, request, tracker):
+        repeated = tracker.repeated()
+        for count, site, shape in repeated:
+            logger.warning('N+1 on %s: %d x %s\n    %s', request.path, count, site, shape[:300])
+
+        if request._query_budget is None:
+            return
+        max_queries, max_db_ms = request._query_budget
+        problems = []
+        if max_queries is not None and tracker.count > max_queries:
+            problems.append(f'{tracker.count} queries (budget {max_queries})')
+        if max_db_ms is not None and tracker.duration_ms > max_db_ms:
+            problems.append(f'{tracker.duration_ms:.0f} ms in the database (budget {max_db_ms} ms)')
+        if not problems:
+            return
+
+        message = f'Query budget exceeded on {request.path}: ' + ', '.join(problems)
+        if repeated:
+            message += '\nRepeated queries:\n' + '\n'.join(
+                f'  {count} x {site}: {shape[:200]}' for count, site, shape in repeated
+            )
+        if self.raise_errors:
+            raise QueryBudgetExceeded(message)
+        logger.warning(message)
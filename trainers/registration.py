@@ -0,0 +1,76 @@
+"""
+Public registration (addme)
+A club's shared registration link must hold up to its whole membership
+signing up on the same day, so the page avoids the database where it can:
+
+- organization_snapshot(slug): the OrganizationInfo fields the page needs,
+  cached (unknown slugs too) and dropped when the organization is saved
+- active_trainer_count(id): cached count of active trainees checked against
+  max_trainers, kept current by the Trainer signals in models.py (+1 / -1)
+  and recounted after bulk .update(is_active=...) calls, which must call
+  invalidate_active_count()
+
+Uploads are staged by storage_ops.stage_upload; addme throttles per client
+address and per organization (THROTTLE_RATES 'register' / 'register_org').
+"""
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, transaction
+
+from .models import OrganizationInfo, Trainer
+
+SNAPSHOT_FIELDS = ('id', 'name', 'slug', 'max_trainers')
+SNAPSHOT_SECONDS = 300
+# Bounds the drift of a count a bulk update forgot to invalidate
+COUNT_SECONDS = 600
+MISSING = 'missing'
+
+
+def _snapshot_key(slug):
+    return f'public_org_{slug}'
+
+
+def _count_key(organization_id):
+    return f'active_trainers_{organization_id}'
+
+
+def organization_snapshot(slug):
+    """
+    OrganizationInfo of `slug` loaded with SNAPSHOT_FIELDS only (others are
+    deferred), or None when no organization has this slug
+    """
+    key = _snapshot_key(slug)
+    values = cache.get(key)
+    if values is None:
+        values = OrganizationInfo.objects.filter(slug=slug).values(*SNAPSHOT_FIELDS).first() or MISSING
+        cache.set(key, values, SNAPSHOT_SECONDS)
+    if values == MISSING:
+        return None
+    return OrganizationInfo.from_db(DEFAULT_DB_ALIAS, SNAPSHOT_FIELDS, [values[name] for name in SNAPSHOT_FIELDS])
+
+
+def invalidate_snapshot(slug):
+    cache.delete(_snapshot_key(slug))
+
+
+def active_trainer_count(organization_id):
+    key = _count_key(organization_id)
+    count = cache.get(key)
+    if count is None:
+        count = Trainer.objects.filter(organization_id=organization_id, is_active=True).count()
+        cache.add(key, count, COUNT_SECONDS)
+    return count
+
+
+def adjust_active_count(organization_id, delta):
+    """Apply `delta` once the transaction commits (an uncached count is left to the next read)"""
+    def _adjust():
+        try:
+            cache.incr(_count_key(organization_id), delta)
+        except ValueError:
+            pass
+
+    transaction.on_commit(_adjust)
+
+
+def invalidate_active_count(organization_id):
+    cache.delete(_count_key(organization_id))
@@ -0,0 +1,44 @@
+"""
+Spreadsheet engine (xls / xlsx export, Excel import)
+pandas, openpyxl and xlwt take most of a worker's boot time and memory, so
+views import this module inside the export/import functions only.
+"""
+import xlwt
+import openpyxl
+import pandas as pd
+
+
+PAYMENT_COLUMNS = ['المدرب', 'فئة المتدرب', 'تاريخ الدفع', 'نوع الدفع', 'المبلغ']
+
+
+def write_payments_xls(payments, out):
+    """Payments report (.xls) written to a file-like object (e.g. an HttpResponse)"""
+    header_style = xlwt.XFStyle()
+    header_font = xlwt.Font()
+    header_font.bold = True
+    header_style.font = header_font
+
+    wb = xlwt.Workbook(encoding='utf-8')
+    ws = wb.add_sheet('Payments')
+    for col_num, column_title in enumerate(PAYMENT_COLUMNS):
+        ws.write(0, col_num, column_title, header_style)
+
+    for row_num, p in enumerate(payments, start=1):
+        ws.write(row_num, 0, f"{p.trainer.first_name} {p.trainer.last_name}")
+        ws.write(row_num, 1, p.trainer.get_category_display())
+        ws.write(row_num, 2, p.paymentdate.strftime("%Y-%m-%d"))
+        ws.write(row_num, 3, p.get_paymentCategry_display())
+        ws.write(row_num, 4, p.paymentAmount)
+    wb.save(out)
+
+
+def write_rows_xlsx(rows, out):
+    """List of dicts (queryset.values()) → one-sheet .xlsx"""
+    pd.DataFrame(list(rows)).to_excel(out, index=False, engine='openpyxl')
+
+
+def iter_sheet_rows(excel_file, min_row=2):
+    """(row number, cell values) of the active sheet, header skipped"""
+    sheet = openpyxl.load_workbook(excel_file).active
+    for i, row in enumerate(sheet.iter_rows(min_row=min_row), start=min_row):
+        yield i, [cell.value for cell in row]
@@ -0,0 +1,31 @@
+"""
+SQLite tuning for single-server installs (DEVELOPMENT_MODE / sqlite DATABASE_URL)
+Enabled with settings.SQLITE_TUNING: crm_back/settings.py merges sqlite_options()
+into the OPTIONS of every SQLite database. Each new connection switches the file
+to WAL (readers no longer wait for a writer) through init_command, and write
+transactions start with BEGIN IMMEDIATE (transaction_mode), so two writers queue
+on the busy timeout at BEGIN instead of one of them failing with
+"database is locked" at COMMIT.
+WAL needs the database on a local disk (not NFS/SMB).
+"""
+
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',        # durable in WAL mode, fsync only at checkpoints
+    'mmap_size': 256 * 1024 * 1024,
+    'cache_size': -64000,           # negative = KiB (64 MB page cache)
+    'temp_store': 'MEMORY',
+}
+
+# Seconds to wait for a lock before raising (sqlite3.connect(timeout=...))
+SQLITE_TIMEOUT = 5
+
+
+def sqlite_options(pragmas=None, timeout=SQLITE_TIMEOUT):
+    """DATABASES[...]['OPTIONS'] for a tuned SQLite database"""
+    pragmas = SQLITE_PRAGMAS if pragmas is None else pragmas
+    return {
+        'transaction_mode': 'IMMEDIATE',
+        'timeout': timeout,
+        'init_command': '; '.join(f'PRAGMA {name} = {value}' for name, value in pragmas.items()),
+    }
@@ -280,59 +280,21 @@ class FinancialReportManager {
         }
 
         try {
-            const monthlyData = await this.fetchMonthlyData();
-
-                if (!monthlyData || monthlyData.length === 0) {
-                    console.error('No monthly data received');
-                    ctx.clearRect(0, 0, canvas.width, canvas.height);
-                    ctx.fillStyle = '#666';
-                    ctx.font = '14px Cairo';
-                    ctx.textAlign = 'center';
-                    ctx.fillText('لا توجد بيانات لعرضها', canvas.width / 2, canvas.height / 2);
-                    return;
-                }
-
-                // Decide granularity
-    const useDaily = this.isSingleCalendarMonth();
-
-    let labels, income, expenses;
-
-    // If single month => daily breakdown
-    if (useDaily) {
-        const dailyData = await this.fetchDailyData();
-
-        if (!dailyData || dailyData.length === 0) {
-            ctx.clearRect(0, 0, canvas.width, canvas.height);
-            ctx.fillStyle = '#666';
-            ctx.font = '14px Cairo';
-            ctx.textAlign = 'center';
-            ctx.fillText('لا توجد بيانات يومية لعرضها', canvas.width / 2, canvas.height / 2);
-            return;
-        }
-
-        const prepared = this.prepareDailyData(dailyData);
-        labels = prepared.labels;
-        income = prepared.income;
-        expenses = prepared.expenses;
-
-    } else {
-        const monthlyData = await this.fetchMonthlyData();
-
-        if (!monthlyData || monthlyData.length === 0) {
-            ctx.clearRect(0, 0, canvas.width, canvas.height);
-            ctx.fillStyle = '#666';
-            ctx.font = '14px Cairo';
-            ctx.textAlign = 'center';
-            ctx.fillText('لا توجد بيانات لعرضها', canvas.width / 2, canvas.height / 2);
-            return;
-        }
-
-        const prepared = this.prepareMonthlyData(monthlyData);
-        labels = prepared.labels;
-        income = prepared.income;
-        expenses = prepared.expenses;
-    }
+            // Single month => day buckets, otherwise months (the server
+            // coarsens very long ranges to quarters/years)
+            const series = await this.fetchTimeseries(this.isSingleCalendarMonth() ? 'day' : 'month');
+
+            if (!series || series.points.length === 0) {
+                ctx.clearRect(0, 0, canvas.width, canvas.height);
+                ctx.fillStyle = '#666';
+                ctx.font = '14px Cairo';
+                ctx.textAlign = 'center';
+                ctx.fillText('لا توجد بيانات لعرضها', canvas.width / 2, canvas.height / 2);
+                return;
+            }
 
+            const useDaily = series.bucket === 'day';
+            const { labels, income, expenses } = this.prepareTimeseries(series);
 
             if (!labels.length) {
                 console.error('No labels generated');
@@ -480,41 +442,34 @@ class FinancialReportManager {
         }
     }
 
-    async fetchMonthlyData() {
+    async fetchTimeseries(bucket) {
         try {
             const params = new URLSearchParams({
                 start: this.formatDateForInput(this.startDate),
-                end: this.formatDateForInput(this.endDate)
+                end: this.formatDateForInput(this.endDate),
+                bucket,
+                fields: 'label,income,expenses,fixed_costs'
             });
 
-            const response = await fetch(`/api/monthly-breakdown/?${params}`);
+            const response = await fetch(`/api/timeseries/?${params}`);
             if (!response.ok) throw new Error(`HTTP ${response.status}`);
 
             const data = await response.json();
-            if (data?.success === false) throw new Error(data.error || 'فشل تحميل البيانات الشهرية');
+            if (data?.success === false) throw new Error(data.error || 'فشل تحميل البيانات');
 
-            return data.monthly_data;
+            return data;
         } catch (error) {
-            console.error('Error fetching monthly data:', error);
+            console.error('Error fetching timeseries:', error);
             return null;
         }
     }
 
-    // IMPORTANT: Always month-by-month, never group into years
-    prepareMonthlyData(monthlyData) {
+    // Expenses include rent and salaries (fixed_costs) on their due dates
+    prepareTimeseries(series) {
         const labels = [];
         const income = [];
         const expenses = [];
 
-        if (!monthlyData || !Array.isArray(monthlyData)) {
-            console.error('Invalid monthly data format');
-            return { labels: [], income: [], expenses: [] };
-        }
-
-        const multiYear =
-            monthlyData.length > 1 &&
-            monthlyData[0].year !== monthlyData[monthlyData.length - 1].year;
-
         // Check if mobile
         const isMobile = window.innerWidth < 640;
         
@@ -534,20 +489,16 @@ class FinancialReportManager {
             'ديسمبر': 'ديس'
         };
 
-        monthlyData.forEach(m => {
-            let label;
-            if (multiYear) {
-                // Multi-year: show month + year
-                const monthName = isMobile && shortMonths[m.month] ? shortMonths[m.month] : m.month;
-                label = `${monthName} ${m.year}`;
-            } else {
-                // Single year: just month (short on mobile)
-                label = isMobile && shortMonths[m.month] ? shortMonths[m.month] : m.month;
+        series.points.forEach(p => {
+            let label = p.label;
+            if (isMobile && series.bucket === 'month') {
+                const [monthName, ...rest] = label.split(' ');
+                label = [shortMonths[monthName] || monthName, ...rest].join(' ');
             }
-            
+
             labels.push(label);
-            income.push(Number(m.income) || 0);
-            expenses.push(Number(m.expenses) || 0);
+            income.push(Number(p.income) || 0);
+            expenses.push((Number(p.expenses) || 0) + (Number(p.fixed_costs) || 0));
         });
 
         return { labels, income, expenses };
@@ -568,37 +519,6 @@ class FinancialReportManager {
         return s.getDate() === 1 && e.getDate() === lastDay.getDate();
     }
 
-    async fetchDailyData() {
-        const params = new URLSearchParams({
-            start: this.formatDateForInput(this.startDate),
-            end: this.formatDateForInput(this.endDate)
-        });
-
-        const response = await fetch(`/api/daily-breakdown/?${params}`);
-        if (!response.ok) throw new Error(`HTTP ${response.status}`);
-        const data = await response.json();
-        if (data?.success === false) throw new Error(data.error || 'فشل تحميل البيانات اليومية');
-
-        return data.daily_data;
-    }
-
-    prepareDailyData(dailyData) {
-        const labels = [];
-        const income = [];
-        const expenses = [];
-        const net = [];
-
-        dailyData.forEach(d => {
-            labels.push(String(d.day)); // "1", "2", ...
-            income.push(Number(d.income) || 0);
-            expenses.push(Number(d.expenses) || 0);
-            net.push(Number(d.net) || 0);
-        });
-
-        return { labels, income, expenses, net };
-    }
-
-    
     renderIncomeTable(income) {
         const tbody = document.getElementById('income-tbody');
         if (!tbody) return;
@@ -0,0 +1,308 @@
+"""
+Storage Operations Queue
+Remote deletes, derivative generation and uploads staged by public forms are
+queued in the database and executed by `python manage.py process_storage_ops`,
+never in the request.
+"""
+import logging
+import os
+from datetime import timedelta
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.crypto import get_random_string
+
+from .models import StorageOperation
+
+logger = logging.getLogger(__name__)
+
+MAX_ATTEMPTS = 5
+RETRY_BASE_SECONDS = 60  # 1m, 2m, 4m, 8m ...
+# A 'running' operation claimed longer ago than this is taken over (its worker died).
+# Must stay above the slowest single operation (large uploads).
+CLAIM_TIMEOUT_SECONDS = getattr(settings, 'STORAGE_OPS_CLAIM_TIMEOUT', 900)
+THUMBNAIL_SIZE = (256, 256)
+# Must be readable by the process_storage_ops worker (same host or shared volume)
+STAGING_ROOT = getattr(settings, 'UPLOAD_STAGING_ROOT', os.path.join(settings.BASE_DIR, 'upload_staging'))
+# A staged file is only known to be abandoned once its transaction is surely over
+STAGED_GRACE_SECONDS = 3600
+
+
+# ==================== NAMING ====================
+
+def stored_name(value):
+    """Return the storage path of a FieldFile / raw string (or '')"""
+    if not value:
+        return ''
+    return getattr(value, 'name', value) or ''
+
+
+def thumbnail_name(name):
+    """Derivative path for a trainee image: <root>_thumb.jpg"""
+    root, _ext = os.path.splitext(name)
+    return f"{root}_thumb.jpg"
+
+
+# ==================== ENQUEUE ====================
+
+def enqueue(operation, name):
+    """
+    Queue a storage operation once the surrounding transaction commits.
+    Duplicate pending operations for the same file are collapsed.
+    """
+    if not name:
+        return
+
+    def _create():
+        StorageOperation.objects.get_or_create(
+            operation=operation,
+            name=name,
+            status='pending',
+        )
+
+    transaction.on_commit(_create)
+
+
+def enqueue_delete(name):
+    enqueue('delete', name)
+
+
+def enqueue_thumbnail(name):
+    enqueue('thumbnail', name)
+
+
+# ==================== STAGED UPLOADS ====================
+# The row gets its final storage name right away; the file waits on local disk
+# until the 'upload' operation pushes it (links to it 404 until then).
+
+def staged_path(name):
+    return os.path.join(STAGING_ROOT, name)
+
+
+def is_staged(name):
+    return bool(name) and os.path.exists(staged_path(name))
+
+
+def stage_upload(instance, field_name, uploaded):
+    """
+    Write an uploaded file to the staging directory, point the (unsaved)
+    instance's file field at its storage name and queue the upload
+
+    upload_to names repeat (same client filename, same-name trainees), so
+    every staged name gets a random suffix and is created exclusively.
+    """
+    root, ext = os.path.splitext(
+        instance._meta.get_field(field_name).generate_filename(instance, uploaded.name)
+    )
+    os.makedirs(os.path.dirname(staged_path(root)), exist_ok=True)
+    while True:
+        name = f'{root}_{get_random_string(7)}{ext}'
+        try:
+            staged = open(staged_path(name), 'xb')
+        except FileExistsError:
+            continue
+        break
+    with staged:
+        for chunk in uploaded.chunks():
+            staged.write(chunk)
+    setattr(instance, field_name, name)  # a name, not a file: save() uploads nothing
+    enqueue('upload', name)
+    return name
+
+
+def discard_staged(names):
+    """Remove staged files whose transaction rolled back (their upload was never queued)"""
+    for name in names:
+        try:
+            os.remove(staged_path(name))
+        except FileNotFoundError:
+            pass
+
+
+# ==================== WORKERS ====================
+
+def _run_delete(name):
+    default_storage.delete(name)
+
+
+def _run_thumbnail(name):
+    from PIL import Image
+
+    with default_storage.open(name, 'rb') as source:
+        image = Image.open(source)
+        image = image.convert('RGB')
+        image.thumbnail(THUMBNAIL_SIZE)
+        buffer = BytesIO()
+        image.save(buffer, format='JPEG', quality=85)
+
+    target = thumbnail_name(name)
+    if default_storage.exists(target):
+        default_storage.delete(target)
+    default_storage.save(target, ContentFile(buffer.getvalue()))
+
+
+def _run_upload(name):
+    from .models import Trainer, TrainerDocument
+
+    path = staged_path(name)
+    if not os.path.exists(path):
+        return  # pushed by an earlier attempt
+    images = Trainer.objects.filter(image=name)
+    documents = TrainerDocument.objects.filter(file=name)
+    if not images.exists() and not documents.exists():
+        os.remove(path)  # row deleted before the push
+        return
+
+    with open(path, 'rb') as staged:
+        saved = default_storage.save(name, File(staged))
+    if saved != name:  # name taken in storage: follow the one it was given
+        images.update(image=saved)
+        documents.update(file=saved)
+    os.remove(path)
+    if Trainer.objects.filter(image=saved).exists():
+        enqueue_thumbnail(saved)
+
+
+HANDLERS = {
+    'delete': _run_delete,
+    'thumbnail': _run_thumbnail,
+    'upload': _run_upload,
+}
+
+
+def claim_batch(limit=50):
+    """
+    Lock and return due operations (SKIP LOCKED where the backend supports it),
+    marked 'running' until run_operation() records the outcome. Operations left
+    'running' for CLAIM_TIMEOUT_SECONDS by a dead worker are claimed again.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        ops = list(
+            StorageOperation.objects.select_for_update(skip_locked=True).filter(
+                Q(status='pending', run_after__lte=now)
+                | Q(status='running', claimed_at__lt=now - timedelta(seconds=CLAIM_TIMEOUT_SECONDS))
+            ).order_by('run_after')[:limit]
+        )
+        if ops:
+            StorageOperation.objects.filter(id__in=[op.id for op in ops]).update(
+                status='running', claimed_at=now
+            )
+    for op in ops:
+        op.status, op.claimed_at = 'running', now
+    return ops
+
+
+def run_operation(op):
+    """Execute one operation, scheduling a retry with backoff on failure"""
+    try:
+        HANDLERS[op.operation](op.name)
+    except Exception as e:
+        op.attempts += 1
+        op.last_error = str(e)
+        op.claimed_at = None
+        if op.attempts >= MAX_ATTEMPTS:
+            op.status = 'failed'
+        else:
+            op.status = 'pending'
+            op.run_after = timezone.now() + timedelta(
+                seconds=RETRY_BASE_SECONDS * 2 ** (op.attempts - 1)
+            )
+        op.save(update_fields=['attempts', 'last_error', 'status', 'run_after', 'claimed_at', 'updated_at'])
+        logger.warning(f'Storage op {op.id} ({op.operation} {op.name}) failed: {e}')
+        return False
+
+    op.status = 'done'
+    op.attempts += 1
+    op.last_error = ''
+    op.claimed_at = None
+    op.save(update_fields=['attempts', 'last_error', 'status', 'claimed_at', 'updated_at'])
+    return True
+
+
+def process_pending(limit=50):
+    """
+    Run one batch of due operations
+    Returns (succeeded, failed)
+    """
+    succeeded = failed = 0
+    for op in claim_batch(limit):
+        if run_operation(op):
+            succeeded += 1
+        else:
+            failed += 1
+    return succeeded, failed
+
+
+# ==================== RECONCILIATION ====================
+
+def list_storage_files(prefix='organizations'):
+    """Recursively list every file stored under prefix"""
+    files = []
+    pending = [prefix]
+    while pending:
+        path = pending.pop()
+        try:
+            directories, names = default_storage.listdir(path)
+        except (FileNotFoundError, NotImplementedError):
+            continue
+        for directory in directories:
+            pending.append(f"{path}/{directory}" if path else directory)
+        for name in names:
+            files.append(f"{path}/{name}" if path else name)
+    return files
+
+
+def referenced_files():
+    """Every storage path the database still points to (plus derivatives)"""
+    from .models import Trainer, TrainerDocument
+
+    referenced = set()
+    for name in Trainer.objects.exclude(image='').values_list('image', flat=True).iterator():
+        referenced.add(name)
+        referenced.add(thumbnail_name(name))
+    referenced.update(
+        TrainerDocument.objects.exclude(file='').values_list('file', flat=True).iterator()
+    )
+    return referenced
+
+
+def find_abandoned_staged(grace_seconds=STAGED_GRACE_SECONDS):
+    """
+    Staged files older than grace_seconds with no upload left to run
+    (rolled back or crashed registrations): they would stay on disk forever
+    """
+    if not os.path.isdir(STAGING_ROOT):
+        return []
+    waiting = set(
+        StorageOperation.objects.filter(operation='upload').exclude(status='done').values_list('name', flat=True)
+    )
+    cutoff = timezone.now().timestamp() - grace_seconds
+    abandoned = []
+    for directory, _dirs, filenames in os.walk(STAGING_ROOT):
+        for filename in filenames:
+            path = os.path.join(directory, filename)
+            name = os.path.relpath(path, STAGING_ROOT).replace(os.sep, '/')
+            if name not in waiting and os.path.getmtime(path) < cutoff:
+                abandoned.append(name)
+    return sorted(abandoned)
+
+
+def find_orphans(prefix='organizations'):
+    """Blobs present in storage but not referenced by any row"""
+    referenced = referenced_files()
+    queued = set(
+        StorageOperation.objects.filter(
+            operation='delete', status='pending'
+        ).values_list('name', flat=True)
+    )
+    return sorted(
+        name for name in list_storage_files(prefix)
+        if name not in referenced and name not in queued
+    )
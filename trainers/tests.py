@@ -1,10 +1,1159 @@
-from .models import School
-
-School.objects.create(name="روض النجاح",
-                       address="hay argana",
-                       phone="1234567890",
-                       email="info@rawd.com",
-                       established_year=2024,
-                       rent_amount=1000
-                       ).save()
-# Create your tests here.
+import re
+from datetime import timedelta
+
+from django.conf import settings
+from django.test import TestCase, TransactionTestCase
+from django.utils import timezone
+
+from .models import OrganizationInfo
+
+
+# ==================== FIXTURES ====================
+
+def create_organization(**fields):
+    """Organization with a subscription running for another 30 days"""
+    today = timezone.now().date()
+    defaults = {'name': 'org', 'slug': 'org', 'trial_start': today,
+                'subscription_end_date': today + timedelta(days=30)}
+    return OrganizationInfo.objects.create(**{**defaults, **fields})
+
+
+def trainee(organization, **fields):
+    """Unsaved Trainer of `organization` (save() it or bulk_create a list)"""
+    from .models import Trainer
+
+    defaults = {'first_name': 'trainee', 'last_name': 'test', 'male_female': 'male', 'category': 'كبار',
+                'birth_day': timezone.now().date() - timedelta(days=6000)}
+    return Trainer(organization=organization, **{**defaults, **fields})
+
+
+def create_owner(organization, username='owner'):
+    """User who is the admin staff member of `organization`"""
+    from django.contrib.auth.models import User
+    from .models import Staff
+
+    user = User.objects.create_user(username, password='pw')
+    Staff.objects.create(organization=organization, user=user, role='owner', is_admin=True)
+    return user
+
+
+class OrganizationFixture:
+    """setUpTestData: an organization, its owner and one trainee paid 150 (month) today"""
+
+    @classmethod
+    def setUpTestData(cls):
+        from .models import Payments
+
+        cls.organization = create_organization()
+        cls.trainer = trainee(cls.organization)
+        cls.trainer.save()
+        cls.payment = Payments.objects.create(organization=cls.organization, trainer=cls.trainer,
+                                              paymentCategry='month', paymentAmount=150,
+                                              paymentdate=timezone.now().date())
+        cls.user = create_owner(cls.organization)
+
+
+# ==================== SUBSCRIPTION STATE ====================
+
+class SubscriptionStateParityTests(TestCase):
+    """with_subscription_state() must agree with the Python properties"""
+
+    OFFSETS = [None] + list(range(-20, 21))
+    GRACE_DAYS = [0, 3, 7]
+
+    @classmethod
+    def setUpTestData(cls):
+        today = timezone.now().date()
+        organizations = []
+        for grace in cls.GRACE_DAYS:
+            for offset in cls.OFFSETS:
+                end = today + timedelta(days=offset) if offset is not None else None
+                # Both end date fields, each alone, and a stale subscription_end
+                variants = [
+                    {'subscription_end_date': end},
+                    {'subscription_end': end},
+                    {'subscription_end_date': end, 'subscription_end': today - timedelta(days=100)},
+                ]
+                for fields in variants:
+                    n = len(organizations)
+                    organizations.append(OrganizationInfo(
+                        name=f'org {n}', slug=f'org-{n}', grace_period_days=grace,
+                        trial_start=today, **fields
+                    ))
+        # bulk_create: save() would start a trial and overwrite the end dates
+        OrganizationInfo.objects.bulk_create(organizations)
+
+    def test_matches_python_properties(self):
+        annotated = {
+            org.pk: org for org in OrganizationInfo.objects.with_subscription_state()
+        }
+        self.assertEqual(len(annotated), len(self.GRACE_DAYS) * len(self.OFFSETS) * 3)
+
+        for org in OrganizationInfo.objects.all():
+            row = annotated[org.pk]
+            with self.subTest(end=org.subscription_end_date, end2=org.subscription_end, grace=org.grace_period_days):
+                self.assertEqual(row.days_left, org.days_until_expiration)
+                self.assertEqual(row.subscription_state, org.get_subscription_state())
+                self.assertEqual(row.subscription_state == 'expired', org.is_expired())
+                self.assertEqual(row.subscription_state == 'in_grace', org.is_in_grace_period())
+
+    def test_expiring_within(self):
+        today = timezone.now().date()
+        expected = {
+            org.pk for org in OrganizationInfo.objects.all()
+            if org.days_until_expiration is not None and 0 <= org.days_until_expiration <= 7
+        }
+        found = set(OrganizationInfo.objects.expiring_within(7).values_list('pk', flat=True))
+        self.assertEqual(found, expected)
+        self.assertTrue(found)
+        self.assertTrue(all(
+            org.days_left <= 7
+            for org in OrganizationInfo.objects.expiring_within(7, today).with_days_left(today)
+        ))
+
+
+# ==================== ADMIN ====================
+
+class AdminChangelistQueryCountTests(TestCase):
+    """Changelists must not scale their query count with the number of rows"""
+
+    ROWS = 10_000
+
+    @classmethod
+    def setUpTestData(cls):
+        from django.contrib.auth.models import User
+        from .models import Emailed, Payments, Trainer
+
+        today = timezone.now().date()
+        organizations = OrganizationInfo.objects.bulk_create([
+            OrganizationInfo(name=f'org {n}', slug=f'org-{n}', trial_start=today,
+                             subscription_end_date=today + timedelta(days=n - 5))
+            for n in range(10)
+        ])
+        organization = organizations[0]
+
+        trainers = Trainer.objects.bulk_create([
+            Trainer(organization=organization, first_name=f'trainee {n}', last_name='test',
+                    birth_day=today - timedelta(days=6000 + n), male_female='male', category='كبار')
+            for n in range(cls.ROWS)
+        ], batch_size=1000)
+        Payments.objects.bulk_create([
+            Payments(organization=organization, trainer=trainer, paymentCategry='month',
+                     paymentAmount=100, paymentdate=today - timedelta(days=n % 700))
+            for n, trainer in enumerate(trainers)
+        ], batch_size=1000)
+        Emailed.objects.bulk_create([
+            Emailed(organization=organization, user=trainer, email=f'{n}@example.com')
+            for n, trainer in enumerate(trainers)
+        ], batch_size=1000)
+
+        cls.superuser = User.objects.create_superuser('root', 'root@example.com', 'pw')
+
+    def setUp(self):
+        self.client.force_login(self.superuser)
+
+    def assertChangelistQueries(self, model_name, expected):
+        from django.urls import reverse
+
+        url = reverse(f'admin:trainers_{model_name}_changelist')
+        with self.assertNumQueries(expected):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_trainer_changelist(self):
+        self.assertChangelistQueries('trainer', 9)
+
+    def test_payments_changelist(self):
+        self.assertChangelistQueries('payments', 11)
+
+    def test_emailed_changelist(self):
+        self.assertChangelistQueries('emailed', 12)
+
+    def test_organizationinfo_changelist(self):
+        response = self.assertChangelistQueries('organizationinfo', 8)
+        self.assertContains(response, f'{self.ROWS} / 50')
+
+    def test_subscription_dashboard_single_query(self):
+        from django.test import RequestFactory
+        from .admin import SubscriptionAdminSite
+
+        request = RequestFactory().get('/')
+        request.user = self.superuser
+        with self.assertNumQueries(1):
+            response = SubscriptionAdminSite(name='subscriptions').index(request)
+        self.assertEqual(response.context_data['total_orgs'], 10)
+        self.assertEqual(response.context_data['expired'], 5)
+
+
+# ==================== SESSIONS ====================
+
+class SessionWriteTests(TestCase):
+    """Sliding expiry and subscription warnings write the session only when needed"""
+
+    def session_request(self, **data):
+        from importlib import import_module
+        from django.test import RequestFactory
+
+        store = import_module(settings.SESSION_ENGINE).SessionStore()
+        store.update(data)
+        store.create()
+        request = RequestFactory().get('/')
+        request.COOKIES[settings.SESSION_COOKIE_NAME] = store.session_key
+        return request
+
+    def renew(self, seconds_ago):
+        """Set-Cookie sent (= session saved) for a session renewed `seconds_ago`"""
+        import time
+        from django.contrib.sessions.middleware import SessionMiddleware
+        from django.http import HttpResponse
+        from django.test import override_settings
+        from .middleware import SlidingSessionMiddleware
+
+        def view(request):
+            request.session.get('anything')  # the view reads the session
+            return HttpResponse()
+
+        request = self.session_request(_renewed_at=int(time.time()) - seconds_ago, user='x')
+        with override_settings(SESSION_RENEW_THRESHOLD=0.5):
+            response = SessionMiddleware(SlidingSessionMiddleware(view))(request)
+        return settings.SESSION_COOKIE_NAME in response.cookies
+
+    def test_sliding_session_saved_only_past_threshold(self):
+        lifetime = settings.SESSION_COOKIE_AGE
+        self.assertFalse(self.renew(0))
+        self.assertFalse(self.renew(int(lifetime * 0.4)))
+        self.assertTrue(self.renew(int(lifetime * 0.6)))
+
+    def test_subscription_warning_once_per_day(self):
+        from django.contrib.messages import get_messages
+        from django.contrib.messages.storage.fallback import FallbackStorage
+        from django.contrib.sessions.middleware import SessionMiddleware
+        from django.http import HttpResponse
+        from .middleware import OrganizationMiddleware
+
+        organization = create_organization(subscription_end_date=timezone.now().date() + timedelta(days=3))
+        user = create_owner(organization)
+        middleware = OrganizationMiddleware(lambda request: HttpResponse())
+
+        def warnings(request):
+            SessionMiddleware(lambda request: None).process_request(request)
+            request.user = user
+            request._messages = FallbackStorage(request)
+            middleware(request)
+            return [str(message) for message in get_messages(request)]
+
+        request = self.session_request()
+        self.assertEqual(len(warnings(request)), 1)
+        request.session.save()
+        self.assertEqual(warnings(request), [])  # same session, same day
+
+        request.session['subscription_warned_on'] = '2000-01-01'
+        request.session.save()
+        self.assertEqual(len(warnings(request)), 1)
+
+
+# ==================== QUERY PLANS ====================
+
+class HotQueryPlanTests(TestCase):
+    """
+    EXPLAIN every hot query and fail if it falls back to a full table scan
+    (or, for ordered queries, to an explicit sort instead of index order).
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        from .models import Trainer
+
+        today = timezone.now().date()
+        cls.organization = OrganizationInfo.objects.bulk_create([
+            OrganizationInfo(name='org', slug='org', trial_start=today)
+        ])[0]
+        cls.trainer = Trainer.objects.bulk_create([
+            Trainer(organization=cls.organization, first_name='trainee', last_name='test',
+                    birth_day=today, male_female='male', category='كبار')
+        ])[0]
+
+    def hot_queries(self):
+        """name -> (queryset, must_be_ordered_by_index)"""
+        from .models import Addedpay, Article, Costs, Emailed, Payments, Trainer
+
+        org, trainer = self.organization, self.trainer
+        today = timezone.now().date()
+        month_ago = today - timedelta(days=30)
+        return {
+            'payments_by_category': (
+                Payments.objects.filter(organization=org, paymentCategry='month', paymentdate__gte=month_ago)
+                .order_by('paymentdate'), True),
+            'trainee_payments': (
+                Payments.objects.filter(trainer=trainer, paymentCategry='month').order_by('-paymentdate'), True),
+            'costs_in_range': (
+                Costs.objects.filter(organization=org, date__gte=month_ago), True),
+            'addedpay_in_range': (
+                Addedpay.objects.filter(organization=org, date__gte=month_ago), True),
+            'articles_in_range': (
+                Article.objects.filter(organization=org, date__gte=month_ago), True),
+            'trainee_emails': (
+                Emailed.objects.filter(user=trainer, category='monthly').order_by('-datetime'), True),
+            'subscriptions_ending': (
+                OrganizationInfo.objects.filter(subscription_end_date__lte=today + timedelta(days=7))
+                .order_by('subscription_end_date'), True),
+            'subscriptions_expiring_within': (
+                OrganizationInfo.objects.expiring_within(7), False),
+            'active_trainees': (
+                Trainer.objects.filter(organization=org, is_active=True).order_by('last_name', 'first_name'), True),
+        }
+
+    def explain(self, queryset):
+        from django.db import connection
+
+        if connection.vendor == 'postgresql':
+            # Tiny test tables always favour a seq scan: only ask whether an index *can* serve the query
+            with connection.cursor() as cursor:
+                cursor.execute('SET LOCAL enable_seqscan = off')
+        return queryset.explain()
+
+    def assertUsesIndex(self, name, queryset, ordered):
+        from django.db import connection
+
+        table = queryset.model._meta.db_table
+        plan = self.explain(queryset)
+        if connection.vendor == 'sqlite':
+            full_scan = re.search(rf'\bSCAN {table}\b', plan)
+            sorted_in_memory = 'USE TEMP B-TREE FOR ORDER BY' in plan
+        else:
+            full_scan = re.search(rf'Seq Scan on {table}\b', plan)
+            sorted_in_memory = re.search(r'^\s*(->\s*)?Sort\b', plan, re.MULTILINE)
+
+        self.assertFalse(full_scan, f'{name}: full table scan\n{plan}')
+        if ordered:
+            self.assertFalse(sorted_in_memory, f'{name}: sorted without an index\n{plan}')
+
+    def test_hot_queries_use_indexes(self):
+        from django.db import connection
+
+        if connection.vendor not in ('sqlite', 'postgresql'):
+            self.skipTest(f'No plan parser for {connection.vendor}')
+        for name, (queryset, ordered) in self.hot_queries().items():
+            with self.subTest(name):
+                self.assertUsesIndex(name, queryset, ordered)
+
+
+# ==================== READ REPLICA ====================
+
+class ReplicaRoutingTests(TransactionTestCase):
+    """
+    Two separate databases with different payments: the reporting API must
+    answer from the replica, and writes must pin reads to the primary.
+    """
+    # 'replica' is added in setUpClass: the runner only prepares 'default'
+    databases = {'default'}
+
+    @classmethod
+    def setUpClass(cls):
+        # A replica of its own whatever DATABASE_REPLICA_URL says: in-memory
+        # SQLite with the primary's tables (created here, never migrated)
+        from django.apps import apps
+        from django.db import connections
+
+        cls.configured_replica = connections.settings.get('replica')
+        cls.drop_replica_connection()
+        connections.settings['replica'] = connections.configure_settings({
+            'default': connections.settings['default'],
+            'replica': {'ENGINE': 'django.db.backends.sqlite3', 'NAME': ':memory:'},
+        })['replica']
+        with connections['replica'].schema_editor() as editor:
+            for model in apps.get_models():
+                if model._meta.managed and not model._meta.proxy:
+                    editor.create_model(model)
+        cls.databases = {'default', 'replica'}
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        from django.db import connections
+
+        super().tearDownClass()
+        cls.drop_replica_connection()
+        if cls.configured_replica is None:
+            del connections.settings['replica']
+        else:
+            connections.settings['replica'] = cls.configured_replica
+
+    def tearDown(self):
+        # flush skips the replica (allow_migrate): empty it here
+        from .models import Payments, Trainer
+
+        for model in (Payments, Trainer, OrganizationInfo):
+            model.objects.using('replica').all().delete()
+
+    @staticmethod
+    def drop_replica_connection():
+        from django.db import connections
+
+        if 'replica' in connections.settings:
+            connections['replica'].close()
+            del connections['replica']
+
+    def setUp(self):
+        from django.contrib.auth.models import User
+        from django.core.cache import cache
+        from .models import Payments, Staff, Trainer
+
+        cache.clear()
+        self.today = timezone.now().date()
+        for alias, amount in (('default', 100), ('replica', 777)):
+            organization = OrganizationInfo(id=1, name='org', slug='org', trial_start=self.today,
+                                            subscription_end_date=self.today + timedelta(days=30))
+            OrganizationInfo.objects.using(alias).bulk_create([organization])
+            trainer = Trainer(id=1, organization_id=1, first_name='a', last_name='b',
+                              birth_day=self.today, male_female='male', category='كبار')
+            Trainer.objects.using(alias).bulk_create([trainer])
+            Payments.objects.using(alias).bulk_create([
+                Payments(organization_id=1, trainer_id=1, paymentCategry='month',
+                         paymentAmount=amount, paymentdate=self.today)
+            ])
+
+        user = User.objects.create_user('owner', password='pw')
+        Staff.objects.create(organization_id=1, user=user, role='owner', is_admin=True)
+        self.client.force_login(user)
+
+    def test_reporting_view_reads_from_replica(self):
+        from django.urls import reverse
+
+        response = self.client.get(reverse('api_financial_report'), {
+            'start': self.today.replace(day=1).isoformat(),
+            'end': self.today.isoformat(),
+        })
+        self.assertEqual(response.json()['income']['payments']['total'], 777)
+
+    def test_other_reads_stay_on_primary(self):
+        from .models import Payments
+
+        self.assertEqual(Payments.objects.get().paymentAmount, 100)
+
+    def test_read_your_writes(self):
+        from .db_router import replica_reads
+        from .models import Payments
+
+        with replica_reads():
+            self.assertEqual(Payments.objects.get().paymentAmount, 777)
+            Payments.objects.filter(id=Payments.objects.using('default').get().id).update(paymentAmount=150)
+            # Sticky: the rest of the block reads the primary
+            self.assertEqual(Payments.objects.get().paymentAmount, 150)
+
+
+# ==================== QUERY BUDGET ====================
+
+class QueryBudgetTests(TestCase):
+    """The worst pages stay within their @query_budget whatever the number of trainees"""
+
+    TRAINEES = 50
+
+    @classmethod
+    def setUpTestData(cls):
+        from .models import Payments, Trainer
+
+        today = timezone.now().date()
+        cls.organization = create_organization()
+        trainers = Trainer.objects.bulk_create([
+            trainee(cls.organization, first_name=f'trainee {n}') for n in range(cls.TRAINEES)
+        ])
+        Payments.objects.bulk_create([
+            Payments(organization=cls.organization, trainer=trainer, paymentCategry=category,
+                     paymentAmount=100, paymentdate=today - timedelta(days=40 * n))
+            for n, trainer in enumerate(trainers)
+            for category in ('month', 'subscription', 'assurance')
+        ])
+        cls.trainer = trainers[0]
+        cls.user = create_owner(cls.organization)
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def test_worst_pages_within_budget(self):
+        from django.urls import reverse
+
+        today = timezone.now().date()
+        urls = [
+            reverse('dashboard'),
+            reverse('unpaid_trainees') + f'?year={today.year}&month={today.month}&category=all',
+            reverse('profile', args=[self.trainer.id]),
+        ]
+        for url in urls:
+            with self.subTest(url):
+                # Over budget raises QueryBudgetExceeded during test runs
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, 200)
+                self.assertRegex(response['Server-Timing'], r'^db;dur=[\d.]+;desc="\d+ queries"')
+
+    def test_over_budget_reports_repeated_queries(self):
+        from django.test import RequestFactory, override_settings
+        from .models import Trainer
+        from .query_budget import QueryBudgetExceeded, QueryBudgetMiddleware, query_budget
+
+        @query_budget(max_queries=3)
+        def view(request):
+            from django.http import HttpResponse
+            for trainer_id in range(6):
+                Trainer.objects.filter(pk=trainer_id).first()
+            return HttpResponse()
+
+        def get_response(request):
+            middleware.process_view(request, view, (), {})
+            return view(request)
+
+        with override_settings(QUERY_BUDGET_ENABLED=True, QUERY_BUDGET_RAISE=True):
+            middleware = QueryBudgetMiddleware(get_response)
+        with self.assertRaises(QueryBudgetExceeded) as raised, self.assertLogs('trainers.query_budget'):
+            middleware(RequestFactory().get('/'))
+        self.assertIn('6 queries (budget 3)', str(raised.exception))
+        self.assertIn('6 x trainers/tests.py', str(raised.exception))
+
+
+# ==================== ASYNC VIEWS ====================
+
+class AsyncFinancialReportTests(OrganizationFixture, TestCase):
+    """api_financial_report_async returns the same payload as the sync view"""
+
+    def request(self, factory):
+        today = timezone.now().date()
+        request = factory.get('/', {'start': f'{today.year}-01-01', 'end': f'{today.year}-12-31'})
+        request.user = self.user
+        request.organization = self.organization
+
+        async def auser():
+            return self.user
+
+        request.auser = auser
+        return request
+
+    async def test_same_payload_as_sync_view(self):
+        import json
+        from asgiref.sync import sync_to_async
+        from django.core.cache import cache
+        from django.test import AsyncRequestFactory, RequestFactory
+        from .payments.payments_views import api_financial_report, api_financial_report_async
+
+        await cache.aclear()
+        expected = await sync_to_async(api_financial_report)(self.request(RequestFactory()))
+        await cache.aclear()
+        response = await api_financial_report_async(self.request(AsyncRequestFactory()))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.content), json.loads(expected.content))
+
+    def test_middleware_stack_async_capable(self):
+        from django.utils.module_loading import import_string
+
+        # One sync-only middleware would hold a thread for the rest of every request
+        for path in settings.MIDDLEWARE:
+            with self.subTest(middleware=path):
+                self.assertTrue(getattr(import_string(path), 'async_capable', False))
+
+    async def test_queries_tracked_under_asgi(self):
+        from django.test import AsyncClient, override_settings
+        from django.urls import reverse
+
+        today = timezone.now().date()
+        with override_settings(QUERY_BUDGET_ENABLED=True):
+            client = AsyncClient()
+            await client.aforce_login(self.user)
+            response = await client.get(reverse('api_financial_report'),
+                                        {'start': f'{today.year}-01-01', 'end': f'{today.year}-12-31'})
+        self.assertEqual(response.status_code, 200)
+        self.assertRegex(response['Server-Timing'], r'desc="[1-9]\d* queries"')
+
+
+# ==================== JSON API ====================
+
+class JsonApiTests(TestCase):
+    """FastJsonResponse output does not depend on the encoder; large bodies are compressed"""
+
+    def test_stdlib_and_orjson_same_bytes(self):
+        from datetime import date, datetime, timezone as dt_timezone
+        from decimal import Decimal
+        from unittest import mock
+        from . import json_api
+
+        if json_api.orjson is None:
+            self.skipTest('orjson not installed')
+        data = {'amount': Decimal('12.50'), 'day': date(2025, 1, 2), 1: 'نادي',
+                'at': datetime(2025, 1, 2, 3, 4, 5, 123456, tzinfo=dt_timezone.utc)}
+        with mock.patch.object(json_api, 'orjson', None):
+            stdlib = json_api.dumps(data)
+        self.assertEqual(json_api.dumps(data), stdlib)
+        self.assertEqual(
+            stdlib.decode(),
+            '{"amount":12.5,"day":"2025-01-02","1":"نادي","at":"2025-01-02T03:04:05.123456+00:00"}'
+        )
+
+    def test_per_page_cap_and_gzip(self):
+        import gzip
+        import json
+        from django.test import RequestFactory
+        from .json_api import COMPRESS_MIN_BYTES, FastJsonResponse, JsonCompressionMiddleware, api_per_page
+
+        factory = RequestFactory()
+        self.assertEqual(api_per_page(factory.get('/', {'per_page': 10 ** 6}), 25, maximum=200), 200)
+        self.assertEqual(api_per_page(factory.get('/', {'per_page': 'x'}), 25), 25)
+
+        data = {'rows': ['x' * 10] * COMPRESS_MIN_BYTES}
+        middleware = JsonCompressionMiddleware(lambda request: FastJsonResponse(data))
+        response = middleware(factory.get('/', HTTP_ACCEPT_ENCODING='gzip;q=1.0, identity; q=0.5'))
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(response['Vary'], 'Accept-Encoding')
+        self.assertEqual(json.loads(gzip.decompress(response.content)), data)
+        self.assertFalse(middleware(factory.get('/')).has_header('Content-Encoding'))
+
+
+# ==================== SPARSE FIELDSETS ====================
+
+class SparseFieldsetTests(OrganizationFixture, TestCase):
+    """?fields= / ?include= read only what was asked for"""
+
+    def get(self, view, params, *args):
+        import json
+        from django.test import RequestFactory
+
+        request = RequestFactory().get('/', params)
+        request.user = self.user
+        request.organization = self.organization
+        response = view(request, *args)
+        return response.status_code, json.loads(response.content)
+
+    def test_profile_quick_view_is_one_query(self):
+        from .trainees_views import api_trainer_profile_data
+
+        with self.assertNumQueries(1):
+            status, data = self.get(api_trainer_profile_data,
+                                    {'fields': 'first_name,last_name', 'include': ''}, self.trainer.id)
+        self.assertEqual(status, 200)
+        self.assertEqual(data, {'trainer': {'first_name': 'trainee', 'last_name': 'test'}})
+
+        with self.assertNumQueries(2):
+            status, data = self.get(api_trainer_profile_data,
+                                    {'fields': 'id', 'include': 'monthly_status'}, self.trainer.id)
+        self.assertEqual(list(data['payments']), ['monthly_status'])
+
+    def test_lists_project_and_reject_unknown_fields(self):
+        from .payments.payments_views import api_payments_list
+        from .trainees_views import api_trainees_list
+
+        status, data = self.get(api_payments_list, {'fields': 'amount,id'})
+        self.assertEqual(data['payments'], [{'id': self.payment.id, 'amount': 150.0}])
+        status, data = self.get(api_trainees_list, {'fields': 'full_name'})
+        self.assertEqual(data['trainers'], [{'full_name': 'trainee test'}])
+        status, data = self.get(api_trainees_list, {'fields': 'full_name,salary'})
+        self.assertEqual(status, 400)
+
+
+# ==================== TIME SERIES ====================
+
+class TimeseriesTests(TestCase):
+    """Bucket choice, SQL truncation and gap filling of build_timeseries"""
+
+    def test_choose_bucket(self):
+        from datetime import date
+        from .payments.timeseries import choose_bucket
+
+        self.assertEqual(choose_bucket(date(2025, 1, 1), date(2025, 1, 31), max_points=120), 'day')
+        self.assertEqual(choose_bucket(date(2025, 1, 1), date(2025, 12, 31), max_points=120), 'week')
+        self.assertEqual(choose_bucket(date(2025, 1, 1), date(2025, 12, 31), 'day', max_points=120), 'week')
+        self.assertEqual(choose_bucket(date(2000, 1, 1), date(2025, 12, 31), 'month', max_points=120), 'quarter')
+        for start, end, bucket in [(date(2025, 2, 1), date(2025, 1, 1), 'auto'),
+                                   (date(1800, 1, 1), date(2025, 1, 1), 'auto'),
+                                   (date(2025, 1, 1), date(2025, 2, 1), 'hour')]:
+            with self.subTest(bucket=bucket), self.assertRaises(ValueError):
+                choose_bucket(start, end, bucket, max_points=120)
+
+    def test_weeks_truncated_in_sql_and_gap_filled(self):
+        from datetime import date
+        from decimal import Decimal
+        from .models import Costs, Payments
+        from .payments.timeseries import build_timeseries
+
+        organization = create_organization(trial_start=date(2025, 1, 1), subscription_end_date=date(2025, 12, 31),
+                                           rent_amount=0)
+        trainer = trainee(organization)
+        trainer.save()
+        # Wednesday 2025-01-08 and Sunday 2025-01-19: weeks of Jan 6 and Jan 13
+        for day, amount in [(8, 100), (19, 50)]:
+            Payments.objects.create(organization=organization, trainer=trainer, paymentCategry='month',
+                                    paymentAmount=amount, paymentdate=date(2025, 1, day))
+        Costs.objects.create(organization=organization, amount=30,
+                             date=timezone.make_aware(timezone.datetime(2025, 1, 19, 23, 30)))
+
+        points = build_timeseries(organization, date(2025, 1, 1), date(2025, 1, 31), 'week')
+        self.assertEqual([p['start'] for p in points],
+                         [date(2025, 1, 1), date(2025, 1, 6), date(2025, 1, 13), date(2025, 1, 20), date(2025, 1, 27)])
+        self.assertEqual([p['income'] for p in points], [0, 100, 50, 0, 0])
+        self.assertEqual(points[2]['expenses'], Decimal('30'))
+        self.assertEqual(points[2]['net'], Decimal('20'))
+        self.assertEqual(points[1]['by_category']['month'], Decimal('100'))
+        self.assertEqual(points[-1]['end'], date(2025, 1, 31))
+
+
+# ==================== STORAGE OPERATIONS ====================
+
+class StorageOperationTests(OrganizationFixture, TestCase):
+    """Replaced / deleted files are queued on commit and handled by process_pending"""
+
+    def setUp(self):
+        import tempfile
+        from django.test import override_settings
+
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        storage = override_settings(
+            STORAGES=dict(settings.STORAGES, default={'BACKEND': 'django.core.files.storage.FileSystemStorage'}),
+            MEDIA_ROOT=media.name,
+        )
+        storage.enable()
+        self.addCleanup(storage.disable)
+
+    def image(self, name):
+        import io
+        from django.core.files.base import ContentFile
+        from django.core.files.storage import default_storage
+        from PIL import Image
+
+        buffer = io.BytesIO()
+        Image.new('RGB', (512, 512)).save(buffer, format='PNG')
+        return default_storage.save(name, ContentFile(buffer.getvalue()))
+
+    def pending(self):
+        from .models import StorageOperation
+
+        return sorted(StorageOperation.objects.filter(status='pending').values_list('operation', 'name'))
+
+    def test_replace_then_delete(self):
+        from django.core.files.storage import default_storage
+        from .models import Trainer
+        from .storage_ops import process_pending, thumbnail_name
+
+        first, second = self.image('trainees/first.png'), self.image('trainees/second.png')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.trainer.image = first
+            self.trainer.save()
+        self.assertEqual(self.pending(), [('thumbnail', first)])
+        self.assertEqual(process_pending(), (1, 0))
+        self.assertTrue(default_storage.exists(thumbnail_name(first)))
+
+        # Loaded again: the stored name comes from post_init
+        trainer = Trainer.objects.get(pk=self.trainer.pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            trainer.image = second
+            trainer.save()
+            trainer.save()  # unchanged: nothing more queued
+        self.assertEqual(self.pending(), [('delete', first), ('delete', thumbnail_name(first)),
+                                          ('thumbnail', second)])
+        self.assertEqual(process_pending(), (3, 0))
+        self.assertFalse(default_storage.exists(first))
+        self.assertFalse(default_storage.exists(thumbnail_name(first)))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Trainer.objects.only('id', 'image').get(pk=trainer.pk).delete()
+        self.assertEqual(self.pending(), [('delete', second), ('delete', thumbnail_name(second))])
+        self.assertEqual(process_pending(), (2, 0))
+        self.assertEqual(default_storage.listdir('trainees')[1], [])
+
+    def test_running_operations_not_claimed_twice(self):
+        from .models import StorageOperation
+        from .storage_ops import CLAIM_TIMEOUT_SECONDS, claim_batch, run_operation
+
+        op = StorageOperation.objects.create(operation='delete', name='trainees/gone.png')
+        self.assertEqual([claimed.id for claimed in claim_batch()], [op.id])
+        self.assertEqual(StorageOperation.objects.get(pk=op.pk).status, 'running')
+        self.assertEqual(claim_batch(), [])  # still running elsewhere
+
+        # Its worker died: taken over once the claim is stale
+        StorageOperation.objects.filter(pk=op.pk).update(
+            claimed_at=timezone.now() - timedelta(seconds=CLAIM_TIMEOUT_SECONDS + 1)
+        )
+        [claimed] = claim_batch()
+        self.assertTrue(run_operation(claimed))
+        op.refresh_from_db()
+        self.assertEqual((op.status, op.claimed_at, op.attempts), ('done', None, 1))
+
+
+# ==================== INVOICES ====================
+
+class InvoiceTests(OrganizationFixture, TestCase):
+    """Bulk ZIP export, on-disk PDF cache and shared template of the invoices"""
+
+    def test_zip_export(self):
+        import io
+        import zipfile
+        from unittest import mock
+        from django.urls import reverse
+        from .payments import invoice_bulk
+        from .payments.invoice_views import generate_invoice_number
+
+        self.client.force_login(self.user)
+        # Rendered in the web worker itself: no process pool per request
+        with mock.patch.object(invoice_bulk, 'ProcessPoolExecutor', side_effect=AssertionError):
+            response = self.client.get(reverse('download_invoices_zip'), {'category': 'month', 'start_date': 'None'})
+            content = b''.join(response.streaming_content)
+
+        self.assertEqual(response['Content-Type'], 'application/zip')
+        with zipfile.ZipFile(io.BytesIO(content)) as archive:
+            number = generate_invoice_number(self.payment.id, self.payment.paymentdate)
+            self.assertEqual(archive.namelist(), [f'{number}-{self.payment.id}.pdf'])
+            self.assertTrue(archive.read(archive.namelist()[0]).startswith(b'%PDF'))
+
+    def test_workers_keep_payment_order(self):
+        from .models import Payments
+        from .payments.invoice_bulk import filter_report_payments, render_invoices
+
+        Payments.objects.bulk_create([
+            Payments(organization=self.organization, trainer=self.trainer, paymentCategry='month',
+                     paymentAmount=100 + i, paymentdate=self.payment.paymentdate) for i in range(3)
+        ])
+        payments = list(filter_report_payments(self.organization).order_by('id'))
+        expected = [name for name, _pdf in render_invoices(payments, workers=1)]
+        self.assertEqual([name for name, _pdf in render_invoices(payments, workers=2)], expected)
+        self.assertEqual(len(expected), 4)
+
+    def test_disk_cache(self):
+        import tempfile
+        from unittest import mock
+        from .payments import invoice_cache
+
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        mock.patch.object(invoice_cache, 'CACHE_DIR', directory.name).start()
+        self.addCleanup(mock.patch.stopall)
+
+        key = invoice_cache.invoice_cache_key(self.payment)
+        self.assertIsNone(invoice_cache.get_cached_invoice(self.payment, key))
+        path = invoice_cache.store_invoice(self.payment, key, b'%PDF v1')
+        self.assertEqual(invoice_cache.get_cached_invoice(self.payment, key), path)
+
+        # A printed field changes the key; storing the new version drops the old one
+        self.payment.trainer.phone = '0600000000'
+        new_key = invoice_cache.invoice_cache_key(self.payment)
+        self.assertNotEqual(new_key, key)
+        invoice_cache.store_invoice(self.payment, new_key, b'%PDF v2')
+        self.assertIsNone(invoice_cache.get_cached_invoice(self.payment, key))
+
+        invoice_cache.invalidate_payment(self.organization.id, self.payment.id)
+        self.assertIsNone(invoice_cache.get_cached_invoice(self.payment, new_key))
+
+    def test_template_built_once(self):
+        from .models import Payments
+        from .payments.invoice_template import get_invoice_template
+
+        template = get_invoice_template()
+        self.assertIs(get_invoice_template(), template)
+        # Unknown categories are shaped on the fly
+        other = Payments(pk=self.payment.pk + 1, organization=self.organization, trainer=self.trainer,
+                         paymentCategry='تدريب خاص', paymentAmount=80, paymentdate=self.payment.paymentdate)
+        pdfs = [template.render(payment, 'INV-1') for payment in (self.payment, other)]
+        self.assertTrue(all(pdf.startswith(b'%PDF') for pdf in pdfs))
+        self.assertNotEqual(pdfs[0], pdfs[1])
+
+
+# ==================== WARM START ====================
+
+class WarmOrganizationTests(OrganizationFixture, TestCase):
+    """warm_organization(refresh=True) replaces the report entries the views read"""
+
+    def test_refresh_replaces_stale_reports(self):
+        from django.core.cache import cache
+        from .payments.payments_views import financial_report_cache_key, timeseries_cache_key
+        from .warmup import warm_organization
+
+        year = timezone.now().year
+        start, end = f'{year}-01-01', f'{year}-12-31'
+        keys = [financial_report_cache_key(self.organization.id, start, end),
+                timeseries_cache_key(self.organization.id, start, end, 'month',
+                                     ['fixed_costs', 'label', 'income', 'expenses'])]
+        cache.set_many({key: 'stale' for key in keys})
+        self.addCleanup(cache.delete_many, keys)
+
+        _, _, errors = warm_organization(self.organization.id, refresh=True)
+        self.assertEqual(errors, 0)
+        for key in keys:
+            with self.subTest(key=key):
+                self.assertNotIn(cache.get(key), (None, 'stale'))
+
+
+# ==================== METRICS ====================
+
+class MetricsEndpointTests(TestCase):
+    """GET /metrics: token check and an unwritable METRICS_DIR"""
+
+    def test_unwritable_dir_still_served(self):
+        import tempfile
+        from django.test import override_settings
+        from django.urls import reverse
+        from .metrics import REQUESTS
+
+        REQUESTS.inc(view='metrics_test', method='GET', status=200)
+        with tempfile.NamedTemporaryFile() as not_a_directory, \
+                override_settings(METRICS_DIR=f'{not_a_directory.name}/metrics', METRICS_TOKEN='secret'):
+            url = reverse('metrics')
+            self.assertEqual(self.client.get(url, HTTP_AUTHORIZATION='Bearer wrong').status_code, 403)
+            response = self.client.get(url, HTTP_AUTHORIZATION='Bearer secret')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('view="metrics_test"', response.content.decode())
+
+
+# ==================== THROTTLING ====================
+
+class ThrottleTests(TestCase):
+    """Token bucket refill, cost limits and concurrency slots of @throttle"""
+
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+
+    def test_token_bucket(self):
+        from .throttling import take_token
+
+        results = [take_token('bucket', 3, 60, now=1000)[0] for _ in range(4)]
+        self.assertEqual(results, [True, True, True, False])
+        self.assertEqual(take_token('bucket', 3, 60, now=1000), (False, 20.0))
+        # One token every 20 s
+        self.assertTrue(take_token('bucket', 3, 60, now=1020)[0])
+        self.assertFalse(take_token('bucket', 3, 60, now=1020)[0])
+
+    def test_limits_answered_before_the_view(self):
+        from django.contrib.auth.models import AnonymousUser
+        from django.http import StreamingHttpResponse
+        from django.test import RequestFactory, override_settings
+        from .throttling import throttle
+
+        calls = []
+
+        @throttle('export', max_range_days=31, max_concurrent=1)
+        def view(request):
+            calls.append(request)
+            return StreamingHttpResponse(iter([b'zip']))
+
+        def get(params=None):
+            request = RequestFactory().get('/export/', params)
+            request.user = AnonymousUser()
+            request.organization = None
+            return view(request)
+
+        with override_settings(THROTTLE_ENABLED=True, THROTTLE_RATES={'export': (2, 60)}):
+            self.assertEqual(get({'start': '2025-01-01', 'end': '2025-03-01'}).status_code, 400)
+            streaming = get()
+            busy = get()
+            self.assertEqual(busy.status_code, 429)  # the first stream holds the only slot
+            self.assertEqual(busy['Retry-After'], '5')
+            streaming.close()
+            limited = get()
+            self.assertEqual(limited.status_code, 429)  # 2 tokens per minute
+            self.assertEqual(len(calls), 1)
+
+    def test_rates_fall_back_per_scope(self):
+        from django.test import RequestFactory, override_settings
+        from .throttling import rate_limited
+
+        request = RequestFactory().get('/api/trainers/')
+        with override_settings(THROTTLE_ENABLED=True, THROTTLE_RATES={'export': (2, 60)}):
+            self.assertIsNone(rate_limited(request, 'list', 'org1'))
+
+
+# ==================== AVAILABILITY CHECKS ====================
+
+class AvailabilityTests(TestCase):
+    """Bloom filter answers of /api/check-username/ and per-address throttling"""
+
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+
+    def test_query_only_on_a_possible_hit(self):
+        from unittest import mock
+        from django.contrib.auth.models import User
+        from . import availability
+        from .availability import build_filter, is_taken
+
+        # Per-process cache: the filter is never trusted
+        User.objects.create_user(username='taken-name', password='pw')
+        build_filter('username')
+        with self.assertNumQueries(1):
+            self.assertFalse(is_taken('username', 'free-name'))
+
+        shared = mock.patch.object(availability, 'cache_is_shared', return_value=True)
+        shared.start()
+        self.addCleanup(shared.stop)
+        with self.assertNumQueries(0):
+            self.assertFalse(is_taken('username', 'free-name'))
+        with self.assertNumQueries(1):
+            self.assertTrue(is_taken('username', 'taken-name'))
+
+        # Saved after the build: added by the post_save signal
+        User.objects.create_user(username='new-name', password='pw')
+        with self.assertNumQueries(1):
+            self.assertTrue(is_taken('username', 'new-name'))
+
+        # Logins only write last_login: the filter is left alone
+        with mock.patch.object(availability, 'mark_taken') as mark_taken:
+            User.objects.get(username='new-name').save(update_fields=['last_login'])
+        mark_taken.assert_not_called()
+
+    def test_check_username_throttled_per_address(self):
+        from django.test import override_settings
+        from django.urls import reverse
+
+        url = reverse('check_username')
+        with override_settings(THROTTLE_ENABLED=True, THROTTLE_RATES={'availability': (2, 60)}):
+            for _ in range(2):
+                response = self.client.get(url, {'username': 'free-name'}, REMOTE_ADDR='10.0.0.1')
+                self.assertTrue(response.json()['available'])
+            self.assertEqual(self.client.get(url, {'username': 'free-name'}, REMOTE_ADDR='10.0.0.1').status_code, 429)
+            self.assertEqual(self.client.get(url, {'username': 'free-name'}, REMOTE_ADDR='10.0.0.2').status_code, 200)
+
+
+# ==================== PUBLIC REGISTRATION ====================
+
+class PublicRegistrationTests(TestCase):
+    """addme: cached snapshot and active count, staged uploads"""
+
+    def setUp(self):
+        import tempfile
+        from django.core.cache import cache
+        from django.test import override_settings
+        from . import storage_ops
+
+        cache.clear()
+        staging = tempfile.TemporaryDirectory()
+        self.addCleanup(staging.cleanup)
+        self.staging = staging.name
+        original, storage_ops.STAGING_ROOT = storage_ops.STAGING_ROOT, staging.name
+        self.addCleanup(setattr, storage_ops, 'STAGING_ROOT', original)
+        # Pushed files land in a throwaway directory, never in Cloudinary
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        storage = override_settings(
+            STORAGES=dict(settings.STORAGES, default={'BACKEND': 'django.core.files.storage.FileSystemStorage'}),
+            MEDIA_ROOT=media.name,
+        )
+        storage.enable()
+        self.addCleanup(storage.disable)
+        self.organization = create_organization(name='Club', slug='club', max_trainers=2)
+
+    def form(self, first_name, **files):
+        return dict({
+            'first_name': first_name, 'last_name': 'Test', 'birthday': '2010-01-01', 'gender': 'ذكر',
+            'education': 'x', 'category': 'small', 'cin': 'AB1',
+        }, **files)
+
+    def test_get_served_from_cache(self):
+        from django.urls import reverse
+
+        url = reverse('addme', args=['club'])
+        self.assertEqual(self.client.get(url).status_code, 200)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(url).status_code, 200)
+        self.assertEqual(self.client.get(reverse('addme', args=['unknown'])).status_code, 404)
+
+    def test_upload_staged_then_pushed(self):
+        import io
+        import os
+        from django.core.files.storage import default_storage
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        from django.urls import reverse
+        from PIL import Image
+        from .models import StorageOperation, Trainer
+        from .registration import active_trainer_count
+        from .storage_ops import process_pending
+
+        buffer = io.BytesIO()
+        Image.new('RGB', (8, 8)).save(buffer, format='PNG')
+        url = reverse('addme', args=['club'])
+        self.assertEqual(active_trainer_count(self.organization.id), 0)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(url, self.form('Ali', upload=SimpleUploadedFile('a.png', buffer.getvalue())))
+        self.assertTemplateUsed(response, 'pages/sucss.html')
+
+        trainer = Trainer.objects.get(first_name='Ali')
+        self.assertTrue(os.path.exists(os.path.join(self.staging, trainer.image.name)))
+        self.assertEqual(list(StorageOperation.objects.values_list('operation', flat=True)), ['upload'])
+        self.assertEqual(active_trainer_count(self.organization.id), 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(process_pending(), (1, 0))
+        self.assertFalse(os.path.exists(os.path.join(self.staging, trainer.image.name)))
+        self.assertTrue(default_storage.exists(Trainer.objects.get(pk=trainer.pk).image.name))
+        self.assertTrue(StorageOperation.objects.filter(operation='thumbnail', status='pending').exists())
+
+        # Second registration fills the club (max_trainers=2)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(url, self.form('Omar'))
+        self.assertTemplateUsed(self.client.get(url), 'pages/registration_closed.html')
+
+    def test_same_filename_staged_separately(self):
+        import os
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        from django.urls import reverse
+        from .models import StorageOperation, TrainerDocument
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('addme', args=['club']), self.form(
+                'Ali',
+                national_id_doc=SimpleUploadedFile('image.jpg', b'id card'),
+                civil_status_doc=SimpleUploadedFile('image.jpg', b'civil status'),
+            ))
+
+        names = list(TrainerDocument.objects.order_by('id').values_list('file', flat=True))
+        self.assertEqual(len(set(names)), 2)
+        self.assertEqual(StorageOperation.objects.filter(operation='upload').count(), 2)
+        contents = []
+        for name in names:
+            with open(os.path.join(self.staging, name), 'rb') as staged:
+                contents.append(staged.read())
+        self.assertEqual(contents, [b'id card', b'civil status'])
+
+    def test_active_count_follows_deletes(self):
+        from .models import Trainer
+        from .registration import active_trainer_count
+
+        trainers = [trainee(self.organization) for _ in range(2)]
+        for trainer in trainers:
+            trainer.save()
+        self.assertEqual(active_trainer_count(self.organization.id), 2)
+        with self.captureOnCommitCallbacks(execute=True):
+            Trainer.objects.get(pk=trainers[0].pk).delete()
+            # Loaded with only(): is_active / organization_id are deferred
+            Trainer.objects.only('id').get(pk=trainers[1].pk).delete()
+        self.assertEqual(active_trainer_count(self.organization.id), 0)
+
+    def test_rolled_back_registration_leaves_no_staged_file(self):
+        import os
+        from unittest import mock
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        from django.urls import reverse
+        from .models import Trainer, TrainerDocument
+
+        with mock.patch.object(TrainerDocument, 'save', side_effect=RuntimeError), \
+                self.assertRaises(RuntimeError):
+            self.client.post(reverse('addme', args=['club']), self.form(
+                'Ali', upload=SimpleUploadedFile('a.png', b'image'),
+                national_id_doc=SimpleUploadedFile('id.jpg', b'id card'),
+            ))
+        self.assertFalse(Trainer.objects.filter(first_name='Ali').exists())
+        self.assertEqual([files for _, _, files in os.walk(self.staging) if files], [])
+
+    def test_abandoned_staged_files_found(self):
+        import os
+        import time
+        from .models import StorageOperation
+        from .storage_ops import STAGED_GRACE_SECONDS, find_abandoned_staged
+
+        old = time.time() - STAGED_GRACE_SECONDS - 1
+        for name in ('org/abandoned.jpg', 'org/queued.jpg', 'org/recent.jpg'):
+            path = os.path.join(self.staging, name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'wb') as staged:
+                staged.write(b'x')
+            if name != 'org/recent.jpg':
+                os.utime(path, (old, old))
+        StorageOperation.objects.create(operation='upload', name='org/queued.jpg', status='failed')
+
+        self.assertEqual(find_abandoned_staged(), ['org/abandoned.jpg'])
@@ -0,0 +1,218 @@
+"""
+Throttling and cost limits
+Views declare their endpoint class and limits with @throttle(scope, ...):
+
+- a token bucket per (organization, scope) in the cache (per user, or per
+  client address on public endpoints, without one): THROTTLE_RATES[scope]
+  = (requests, seconds) refills `requests` tokens every `seconds`, bursts up
+  to `requests`
+- max_range_days: ?start= / ?end= further apart are refused (400)
+- max_concurrent: requests of the scope running at once per organization
+  (streamed responses hold their slot until the stream is closed)
+
+Refusals are answered before the view runs: 429 with Retry-After, or 400 for
+an over-limit range. Buckets and counters live in settings.THROTTLE_CACHE,
+which must be shared (Redis...) for the limits to hold across workers. The
+bucket read/update is not atomic: under contention a few extra requests
+may pass, never fewer.
+"""
+import time
+from datetime import datetime
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.http import HttpResponse, JsonResponse
+
+from .metrics import Counter
+
+THROTTLED = Counter('crm_throttled_requests_total', 'Requests refused by @throttle', ('scope', 'reason'))
+
+# scope: (requests, per seconds); settings.THROTTLE_RATES overrides per scope
+DEFAULT_RATES = {
+    'list': (120, 60),
+    'report': (30, 60),
+    'export': (10, 60),
+    # signup form username/slug checks, per client address
+    'availability': (60, 60),
+    # public registration form (addme): every request per client address,
+    # submissions per organization
+    'register': (60, 60),
+    'register_org': (60, 60),
+}
+REPORT_MAX_RANGE_DAYS = getattr(settings, 'REPORT_MAX_RANGE_DAYS', 3660)
+# A leaked concurrency slot (killed worker) is freed after this many seconds
+CONCURRENCY_TIMEOUT = 600
+
+
+def _cache():
+    return caches[getattr(settings, 'THROTTLE_CACHE', 'default')]
+
+
+def take_token(key, requests, seconds, now=None):
+    """Token bucket: (allowed, seconds until the next token)"""
+    now = time.time() if now is None else now
+    cache = _cache()
+    refill = requests / seconds
+    tokens, stamp = cache.get(key, (requests, now))
+    tokens = min(requests, tokens + (now - stamp) * refill)
+    if tokens < 1:
+        return False, (1 - tokens) / refill
+    cache.set(key, (tokens - 1, now), seconds)
+    return True, 0
+
+
+def acquire_slot(key, max_concurrent):
+    """Concurrency slot; False when max_concurrent are already running"""
+    cache = _cache()
+    cache.add(key, 0, CONCURRENCY_TIMEOUT)
+    try:
+        running = cache.incr(key)
+    except ValueError:  # expired between add and incr
+        cache.add(key, 1, CONCURRENCY_TIMEOUT)
+        running = 1
+    if running > max_concurrent:
+        release_slot(key)
+        return False
+    return True
+
+
+def release_slot(key):
+    try:
+        _cache().decr(key)
+    except ValueError:
+        pass
+
+
+def range_days(request):
+    """Days between ?start= and ?end= (None when missing or invalid: the view answers those)"""
+    try:
+        start = datetime.strptime(request.GET['start'], '%Y-%m-%d').date()
+        end = datetime.strptime(request.GET['end'], '%Y-%m-%d').date()
+    except (KeyError, ValueError):
+        return None
+    return (end - start).days
+
+
+def client_ip(request):
+    """
+    Address of the client; behind a reverse proxy (THROTTLE_BEHIND_PROXY) the
+    last X-Forwarded-For entry, the one the proxy appended
+    """
+    if getattr(settings, 'THROTTLE_BEHIND_PROXY', False):
+        forwarded = request.META.get('HTTP_X_FORWARDED_FOR', '').rsplit(',', 1)[-1].strip()
+        if forwarded:
+            return forwarded
+    return request.META.get('REMOTE_ADDR', '')
+
+
+def throttle_owner(request):
+    """Bucket owner: the organization, else the user, else (public pages) the client address"""
+    organization = getattr(request, 'organization', None)
+    if organization:
+        return f'org{organization.id}'
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_authenticated:
+        return f'user{user.pk}'
+    return f'ip{client_ip(request)}'
+
+
+def _refused(request, status, message, retry_after=None):
+    if '/api/' in request.path:
+        response = JsonResponse({'success': False, 'error': message}, status=status)
+    else:
+        response = HttpResponse(message, status=status, content_type='text/plain; charset=utf-8')
+    if retry_after is not None:
+        response['Retry-After'] = str(max(1, round(retry_after)))
+    return response
+
+
+def _rate_check(request, scope, owner):
+    requests, seconds = getattr(settings, 'THROTTLE_RATES', {}).get(scope, DEFAULT_RATES[scope])
+    allowed, retry_after = take_token(f'throttle:{owner}:{scope}', requests, seconds)
+    if not allowed:
+        THROTTLED.inc(scope=scope, reason='rate')
+        return _refused(request, 429, 'طلبات كثيرة، حاول بعد قليل', retry_after)
+    return None
+
+
+def rate_limited(request, scope, owner):
+    """
+    429 response when `owner` has used up THROTTLE_RATES[scope], else None
+    For views that need buckets @throttle does not pick (e.g. per client
+    address and per organization on the same public page).
+    """
+    if not getattr(settings, 'THROTTLE_ENABLED', True):
+        return None
+    return _rate_check(request, scope, owner)
+
+
+def _check(request, scope, max_range_days, max_concurrent):
+    """(refusal response or None, concurrency key to release or None)"""
+    if max_range_days is not None:
+        days = range_days(request)
+        if days is not None and days > max_range_days:
+            THROTTLED.inc(scope=scope, reason='range')
+            return _refused(request, 400, f'الفترة طويلة جداً (الحد الأقصى {max_range_days} يوم)'), None
+
+    owner = throttle_owner(request)
+    refused = _rate_check(request, scope, owner)
+    if refused is not None:
+        return refused, None
+
+    if max_concurrent is not None:
+        key = f'throttle:{owner}:{scope}:running'
+        if not acquire_slot(key, max_concurrent):
+            THROTTLED.inc(scope=scope, reason='concurrency')
+            return _refused(request, 429, 'عملية تصدير أخرى قيد التنفيذ، حاول بعد قليل', 5), None
+        return None, key
+    return None, None
+
+
+def _release_with(response, key):
+    if key is None:
+        return response
+    if response.streaming:
+        response._resource_closers.append(lambda: release_slot(key))
+    else:
+        release_slot(key)
+    return response
+
+
+def throttle(scope, max_range_days=None, max_concurrent=None):
+    """Rate limit (THROTTLE_RATES[scope]) and cost limits of a view; place it below require_organization"""
+    def decorator(view_func):
+        if iscoroutinefunction(view_func):
+            @wraps(view_func)
+            async def async_wrapper(request, *args, **kwargs):
+                if not getattr(settings, 'THROTTLE_ENABLED', True):
+                    return await view_func(request, *args, **kwargs)
+                refused, key = await sync_to_async(_check)(request, scope, max_range_days, max_concurrent)
+                if refused is not None:
+                    return refused
+                try:
+                    response = await view_func(request, *args, **kwargs)
+                except BaseException:
+                    if key is not None:
+                        release_slot(key)
+                    raise
+                return _release_with(response, key)
+            return async_wrapper
+
+        @wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            if not getattr(settings, 'THROTTLE_ENABLED', True):
+                return view_func(request, *args, **kwargs)
+            refused, key = _check(request, scope, max_range_days, max_concurrent)
+            if refused is not None:
+                return refused
+            try:
+                response = view_func(request, *args, **kwargs)
+            except BaseException:
+                if key is not None:
+                    release_slot(key)
+                raise
+            return _release_with(response, key)
+        return wrapper
+    return decorator
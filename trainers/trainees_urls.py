@@ -1,3 +1,4 @@
+from django.conf import settings
 from django.urls import path
 from .trainees_views import *
 
@@ -14,6 +15,8 @@ urlpatterns = [
     # Profile APIs (if doing full refactor)
     path('api/trainer/<int:id>/data/', api_trainer_profile_data, name='api_trainer_profile_data'),
     path('api/trainer/<int:id>/add-payment/', api_add_payment_profile, name='api_add_payment_profile'),
-    path('api/trainer/<int:id>/upload-document/', api_upload_document, name='api_upload_document'),
+    path('api/trainer/<int:id>/upload-document/',
+         api_upload_document_async if settings.ASYNC_VIEWS else api_upload_document,
+         name='api_upload_document'),
     path('api/trainer/<int:id>/delete-document/', api_delete_document, name='api_delete_document'),
 ]   
\ No newline at end of file
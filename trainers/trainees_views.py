@@ -6,6 +6,7 @@ from django.shortcuts import render
 from django.http import JsonResponse
 from django.views.decorators.http import require_http_methods, require_POST
 from django.views.decorators.csrf import csrf_exempt
+from asgiref.sync import sync_to_async
 from django.contrib.auth.decorators import login_required
 from django.db.models import Q
 from django.core.paginator import Paginator
@@ -13,6 +14,10 @@ from django.core.cache import cache
 from django.utils import timezone
 import json
 from .middleware import require_organization
+from .json_api import FastJsonResponse, api_per_page, field_columns, project, requested_fields
+from .query_budget import query_budget
+from .throttling import throttle
+from .registration import invalidate_active_count
 from .models import *
 from datetime import datetime
 
@@ -36,24 +41,40 @@ def trainees(request, category):
     return render(request, 'pages/olders.html', context)
 
 
+# ?fields= of api_trainees_list: {name: (columns, getter)}
+TRAINEE_LIST_FIELDS = {
+    'id': (('id',), lambda trainer: trainer.id),
+    'first_name': (('first_name',), lambda trainer: trainer.first_name),
+    'last_name': (('last_name',), lambda trainer: trainer.last_name),
+    'full_name': (('first_name', 'last_name'), lambda trainer: trainer.full_name),
+    'category': (('category',), lambda trainer: trainer.get_category_display()),
+    'belt_degree': (('belt_degree',), lambda trainer: trainer.belt_degree),
+    'age': (('birth_day',), lambda trainer: trainer.age),
+    'image_url': (('image',), lambda trainer: trainer.image.url if trainer.image else None),
+}
+
+
 @login_required
+@throttle('list')
 @require_http_methods(["GET"])
 def api_trainees_list(request):
     """
     JSON API: Get filtered/sorted trainees list
-    Supports search, filtering, and sorting
+    Supports search, filtering, sorting and ?fields=id,full_name,...
     """
     organization = request.organization
     category = request.GET.get('category', 'all')
     
-    # Base queryset with optimization
+    try:
+        fields = requested_fields(request, TRAINEE_LIST_FIELDS)
+    except ValueError as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=400)
+    
+    # Base queryset: only the columns the requested fields read
     trainers = Trainer.objects.filter(
         organization=organization,
         is_active=True
-    ).only(
-        'id', 'first_name', 'last_name', 'category', 
-        'belt_degree', 'birth_day', 'image', 'male_female'
-    )
+    ).only('id', *field_columns(TRAINEE_LIST_FIELDS, fields))
     
     # Category filter
     if category != "all":
@@ -87,27 +108,13 @@ def api_trainees_list(request):
     
     # Pagination
     page = int(request.GET.get('page', 1))
-    per_page = int(request.GET.get('per_page', 50))
+    per_page = api_per_page(request, 50)
     
     paginator = Paginator(trainers, per_page)
     page_obj = paginator.get_page(page)
     
-    # Build response data
-    trainers_data = []
-    for trainer in page_obj:
-        trainers_data.append({
-            'id': trainer.id,
-            'first_name': trainer.first_name,
-            'last_name': trainer.last_name,
-            'full_name': f"{trainer.first_name} {trainer.last_name}",
-            'category': trainer.get_category_display(),
-            'belt_degree': trainer.belt_degree,
-            'age': trainer.age,
-            'image_url': trainer.image.url if trainer.image else None,
-        })
-    
-    return JsonResponse({
-        'trainers': trainers_data,
+    return FastJsonResponse({
+        'trainers': [project(trainer, TRAINEE_LIST_FIELDS, fields) for trainer in page_obj],
         'total_count': paginator.count,
         'page': page_obj.number,
         'total_pages': paginator.num_pages,
@@ -138,6 +145,7 @@ def api_bulk_delete_trainers(request):
             id__in=trainer_ids,
             organization=request.organization
         ).update(is_active=False)
+        invalidate_active_count(request.organization.id)
         
         # Clear cache
         today = timezone.now().date()
@@ -190,10 +198,11 @@ def bulk_activate_trainers(request):
             return JsonResponse({'success': False, 'error': 'No trainers selected'})
 
         # Update trainers to active
-        updated_count = Trainer.objects.filter(
-            id__in=trainer_ids,
-            is_active=False
-        ).update(is_active=True)
+        trainers = Trainer.objects.filter(id__in=trainer_ids, is_active=False)
+        organization_ids = set(trainers.values_list('organization_id', flat=True))
+        updated_count = trainers.update(is_active=True)
+        for organization_id in organization_ids:
+            invalidate_active_count(organization_id)
 
         return JsonResponse({
             'success': True,
@@ -215,6 +224,7 @@ High-performance with AJAX operations
 """
 from django.shortcuts import render, get_object_or_404
 
+@query_budget(max_queries=10)
 @login_required
 def trainee_profile(request, id):
     """
@@ -232,121 +242,98 @@ def trainee_profile(request, id):
     return render(request, "pages/profile.html", context)
 
 
+# ?fields= of api_trainer_profile_data (the trainer object): {name: (columns, getter)}
+TRAINER_PROFILE_FIELDS = {
+    'id': (('id',), lambda trainer: trainer.id),
+    'first_name': (('first_name',), lambda trainer: trainer.first_name),
+    'last_name': (('last_name',), lambda trainer: trainer.last_name),
+    'cin': (('CIN',), lambda trainer: trainer.CIN),
+    'birth_day': (('birth_day',), lambda trainer: trainer.birth_day),
+    'age': (('birth_day',), lambda trainer: trainer.age),
+    'email': (('email',), lambda trainer: trainer.email),
+    'phone': (('phone',), lambda trainer: trainer.phone),
+    'phone_parent': (('phone_parent',), lambda trainer: trainer.phone_parent),
+    'address': (('address',), lambda trainer: trainer.address),
+    'degree': (('Degree',), lambda trainer: trainer.Degree),
+    'tall': (('tall',), lambda trainer: trainer.tall or None),
+    'weight': (('weight',), lambda trainer: trainer.weight or None),
+    'started_day': (('started_day',), lambda trainer: trainer.started_day),
+    'category': (('category',), lambda trainer: trainer.get_category_display()),
+    'belt_degree': (('belt_degree',), lambda trainer: trainer.belt_degree),
+    'is_active': (('is_active',), lambda trainer: trainer.is_active),
+    'image_url': (('image',), lambda trainer: trainer.image.url if trainer.image else None),
+}
+# ?include= sections, each one query (payments and monthly_status share theirs)
+PROFILE_SECTIONS = ('payments', 'monthly_status', 'articles', 'documents')
+
+
 @login_required
 @require_http_methods(["GET"])
 def api_trainer_profile_data(request, id):
     """
     JSON API: Get all trainer profile data
-    Optimized with select_related and prefetch_related
+    ?fields= picks trainer fields, ?include= the sections (default: everything);
+    ?fields=first_name,last_name,image_url&include= is a single query
     """
     organization = request.organization
     
     try:
-        # Get trainer with optimized query
-        trainer = Trainer.objects.select_related('organization').get(
+        fields = requested_fields(request, TRAINER_PROFILE_FIELDS)
+        sections = requested_fields(request, PROFILE_SECTIONS, param='include')
+    except ValueError as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=400)
+    
+    try:
+        # Get trainer: only the requested columns
+        trainer = Trainer.objects.only('id', *field_columns(TRAINER_PROFILE_FIELDS, fields)).get(
             pk=id, 
             organization=organization
         )
+        response_data = {'trainer': project(trainer, TRAINER_PROFILE_FIELDS, fields)}
         
-        # Get payments (optimized)
-        payments = Payments.objects.filter(
-            organization=organization,
-            trainer_id=id
-        ).order_by('paymentdate').values(
-            'id', 'paymentdate', 'paymentCategry', 'paymentAmount'
-        )
+        if 'payments' in sections or 'monthly_status' in sections:
+            payments = list(Payments.objects.filter(
+                organization=organization,
+                trainer_id=id
+            ).order_by('paymentdate').values(
+                'id', 'paymentdate', 'paymentCategry', 'paymentAmount'
+            ))
+            response_data['payments'] = {}
+            
+            if 'payments' in sections:
+                # Separate payments by category (Decimal/date values: FastJsonResponse encodes them)
+                payments_by_category = {'jawaz': [], 'assurance': [], 'subscription': []}
+                for p in payments:
+                    category_payments = payments_by_category.get(p['paymentCategry'])
+                    if category_payments is not None:
+                        category_payments.append({'id': p['id'], 'date': p['paymentdate'], 'amount': p['paymentAmount']})
+                response_data['payments'].update(payments_by_category)
+            
+            if 'monthly_status' in sections:
+                response_data['payments']['monthly_status'] = calculate_payment_status(payments)
         
-        # Get articles
-        articles = Article.objects.filter(
-            organization=organization,
-            trainees=trainer
-        ).values('id', 'title', 'date', 'location')
-        
-        # Get documents
-        docs = TrainerDocument.objects.filter(
-            trainer_id=id
-        ).order_by('-uploaded_at').values(
-            'id', 'document_type', 'uploaded_at', 'file'
-        )
+        if 'articles' in sections:
+            response_data['articles'] = list(Article.objects.filter(
+                organization=organization,
+                trainees=id
+            ).values('id', 'title', 'date', 'location'))
         
-        # Calculate payment status
-        payment_status = calculate_payment_status(payments)
-        
-        # Separate payments by category
-        jawaz_payments = [p for p in payments if p['paymentCategry'] == 'jawaz']
-        assurance_payments = [p for p in payments if p['paymentCategry'] == 'assurance']
-        subscription_payments = [p for p in payments if p['paymentCategry'] == 'subscription']
-        
-        # Build response
-        response_data = {
-            'trainer': {
-                'id': trainer.id,
-                'first_name': trainer.first_name,
-                'last_name': trainer.last_name,
-                'cin': trainer.CIN,
-                'birth_day': trainer.birth_day.isoformat() if trainer.birth_day else None,
-                'age': trainer.age,
-                'email': trainer.email,
-                'phone': trainer.phone,
-                'phone_parent': trainer.phone_parent,
-                'address': trainer.address,
-                'degree': trainer.Degree,
-                'tall': float(trainer.tall) if trainer.tall else None,
-                'weight': float(trainer.weight) if trainer.weight else None,
-                'started_day': trainer.started_day.isoformat() if trainer.started_day else None,
-                'category': trainer.get_category_display(),
-                'belt_degree': trainer.belt_degree,
-                'is_active': trainer.is_active,
-                'image_url': trainer.image.url if trainer.image else None,
-            },
-            'payments': {
-                'jawaz': [
-                    {
-                        'id': p['id'],
-                        'date': p['paymentdate'].isoformat(),
-                        'amount': float(p['paymentAmount'])
-                    }
-                    for p in jawaz_payments
-                ],
-                'assurance': [
-                    {
-                        'id': p['id'],
-                        'date': p['paymentdate'].isoformat(),
-                        'amount': float(p['paymentAmount'])
-                    }
-                    for p in assurance_payments
-                ],
-                'subscription': [
-                    {
-                        'id': p['id'],
-                        'date': p['paymentdate'].isoformat(),
-                        'amount': float(p['paymentAmount'])
-                    }
-                    for p in subscription_payments
-                ],
-                'monthly_status': payment_status
-            },
-            'articles': [
-                {
-                    'id': article['id'],
-                    'title': article['title'],
-                    'date': article['date'].isoformat(),
-                    'location': article['location']
-                }
-                for article in articles
-            ],
-            'documents': [
+        if 'documents' in sections:
+            response_data['documents'] = [
                 {
                     'id': doc['id'],
                     'type': doc['document_type'],
-                    'uploaded_at': doc['uploaded_at'].isoformat(),
+                    'uploaded_at': doc['uploaded_at'],
                     'file_url': doc['file']
                 }
-                for doc in docs
+                for doc in TrainerDocument.objects.filter(
+                    trainer_id=id
+                ).order_by('-uploaded_at').values(
+                    'id', 'document_type', 'uploaded_at', 'file'
+                )
             ]
-        }
         
-        return JsonResponse(response_data)
+        return FastJsonResponse(response_data)
         
     except Trainer.DoesNotExist:
         return JsonResponse({
@@ -498,19 +485,9 @@ def api_upload_document(request, id):
         
         document_type = request.POST.get('document_type')
         document_file = request.FILES.get('document_file')
-        
-        if not document_type or not document_file:
-            return JsonResponse({
-                'success': False,
-                'error': 'الرجاء اختيار نوع الوثيقة والملف'
-            }, status=400)
-        
-        # Check file size (5MB max)
-        if document_file.size > 5 * 1024 * 1024:
-            return JsonResponse({
-                'success': False,
-                'error': 'حجم الملف يجب أن يكون أقل من 5MB'
-            }, status=400)
+        error = _document_upload_error(document_type, document_file)
+        if error:
+            return error
         
         # Check if document type already exists
         existing_doc = TrainerDocument.objects.filter(
@@ -519,33 +496,71 @@ def api_upload_document(request, id):
         ).first()
         
         if existing_doc:
-            # Update existing document
-            existing_doc.file.delete()  # Delete old file
+            # Update existing document (old file is queued for deletion on save)
             existing_doc.file = document_file
             existing_doc.save()
             message = f'تم تحديث {document_type} بنجاح'
-            doc_id = existing_doc.id
+            doc = existing_doc
         else:
             # Create new document
-            new_doc = TrainerDocument.objects.create(
+            doc = TrainerDocument.objects.create(
                 trainer=trainer,
                 document_type=document_type,
                 file=document_file
             )
             message = f'تم رفع {document_type} بنجاح'
-            doc_id = new_doc.id
         
+        return _document_uploaded(request, doc, message)
+        
+    except Trainer.DoesNotExist:
         return JsonResponse({
-            'success': True,
-            'message': message,
-            'document': {
-                'id': doc_id,
-                'type': document_type,
-                'file_url': request.build_absolute_uri(
-                    TrainerDocument.objects.get(id=doc_id).file.url
-                )
-            }
-        })
+            'success': False,
+            'error': 'المتدرب غير موجود'
+        }, status=404)
+    except Exception as e:
+        return JsonResponse({
+            'success': False,
+            'error': str(e)
+        }, status=500)
+
+
+@login_required
+@require_http_methods(["POST"])
+async def api_upload_document_async(request, id):
+    """
+    JSON API: api_upload_document for ASGI (settings.ASYNC_VIEWS)
+    The storage upload (Cloudinary) runs in a thread, not on the event loop
+    """
+    organization = request.organization
+    
+    try:
+        trainer = await Trainer.objects.aget(pk=id, organization=organization)
+        
+        document_type = request.POST.get('document_type')
+        document_file = request.FILES.get('document_file')
+        error = _document_upload_error(document_type, document_file)
+        if error:
+            return error
+        
+        existing_doc = await TrainerDocument.objects.filter(
+            trainer=trainer,
+            document_type=document_type
+        ).afirst()
+        
+        if existing_doc:
+            existing_doc.file = document_file
+            await sync_to_async(existing_doc.save)()
+            message = f'تم تحديث {document_type} بنجاح'
+            doc = existing_doc
+        else:
+            doc = await TrainerDocument.objects.acreate(
+                trainer=trainer,
+                document_type=document_type,
+                file=document_file
+            )
+            message = f'تم رفع {document_type} بنجاح'
+        
+        return await sync_to_async(_document_uploaded)(request, doc, message)
         
     except Trainer.DoesNotExist:
         return JsonResponse({
@@ -559,6 +574,36 @@ def api_upload_document(request, id):
         }, status=500)
 
 
+def _document_upload_error(document_type, document_file):
+    """400 response for a missing or too large file, None when valid"""
+    if not document_type or not document_file:
+        return JsonResponse({
+            'success': False,
+            'error': 'الرجاء اختيار نوع الوثيقة والملف'
+        }, status=400)
+    
+    # Check file size (5MB max)
+    if document_file.size > 5 * 1024 * 1024:
+        return JsonResponse({
+            'success': False,
+            'error': 'حجم الملف يجب أن يكون أقل من 5MB'
+        }, status=400)
+    return None
+
+
+def _document_uploaded(request, doc, message):
+    # file.url may call the storage backend
+    return JsonResponse({
+        'success': True,
+        'message': message,
+        'document': {
+            'id': doc.id,
+            'type': doc.document_type,
+            'file_url': request.build_absolute_uri(doc.file.url)
+        }
+    })
+
+
 @login_required
 @require_http_methods(["POST"])
 def api_delete_document(request, id):
@@ -584,9 +629,7 @@ def api_delete_document(request, id):
         doc = TrainerDocument.objects.get(id=doc_id, trainer=trainer)
         doc_type = doc.document_type
         
-        # Delete file from storage
-        doc.file.delete()
-        # Delete database record
+        # Delete database record (file removal is queued by post_delete)
         doc.delete()
         
         return JsonResponse({
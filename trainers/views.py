@@ -1,8 +1,10 @@
-from django.http import HttpResponse
+from django.http import HttpResponse, Http404
 from django.template import loader
 from django.shortcuts import render,redirect,get_object_or_404
 from django.utils.timezone import datetime
-from django.db.models import Sum, F, Count
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import Sum, F, Count, OuterRef, Subquery
 from .models import *
 import json
 from django.contrib import messages
@@ -13,6 +15,13 @@ from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.decorators import login_required
 from dateutil.relativedelta import relativedelta
 from .middleware import require_organization
+from .payments.invoice_bulk import filter_report_payments
+from .query_budget import query_budget
+from .metrics import count_emails, timed
+from .throttling import client_ip, rate_limited, throttle
+from .availability import is_taken
+from .registration import active_trainer_count, organization_snapshot
+from .storage_ops import discard_staged, stage_upload
 from decimal import Decimal
 
 
@@ -114,17 +123,29 @@ def addme(request, org_slug):
     """
     Public registration page - organization identified by URL slug
     URL: /register/nojoum-arkana/
+    GET needs no query (cached snapshot and active-trainee count); uploaded
+    files are staged locally and pushed to storage by process_storage_ops.
     """
-    organization = get_object_or_404(OrganizationInfo, slug=org_slug)
+    refused = rate_limited(request, 'register', f'ip{client_ip(request)}')
+    if refused is not None:
+        return refused
+
+    organization = organization_snapshot(org_slug)
+    if organization is None:
+        raise Http404('No OrganizationInfo matches the given query.')
     
     # Check if organization has reached trainer limit
-    if organization.trainers.filter(is_active=True).count() >= organization.max_trainers:
+    if active_trainer_count(organization.id) >= organization.max_trainers:
         return render(request, "pages/registration_closed.html", {
             'organization': organization,
             'message': 'عذراً، لقد وصلت الجمعية للحد الأقصى من المتدربين'
         })
     
     if request.method == 'POST':
+        refused = rate_limited(request, 'register_org', f'org{organization.id}')
+        if refused is not None:
+            return refused
+
         first_name = request.POST.get('first_name')
         last_name = request.POST.get('last_name')
         birthday = request.POST.get('birthday')
@@ -146,6 +167,15 @@ def addme(request, org_slug):
         civil_status_doc = request.FILES.get('civil_status_doc')
 
         if first_name and last_name and birthday and gender and education and category and cin:
+            # Staged files wait on local disk: refuse oversized ones up front
+            try:
+                for uploaded in (upload, national_id_doc, civil_status_doc):
+                    if uploaded:
+                        validate_file_size(uploaded)
+            except ValidationError as e:
+                messages.error(request, e.messages[0])
+                return render(request, "pages/addme.html", {'organization': organization})
+
             # Check if trainer already exists in THIS organization
             if Trainer.objects.filter(
                 organization=organization,
@@ -155,41 +185,45 @@ def addme(request, org_slug):
                 messages.error(request, "المتدرب موجود بالفعل في النظام.")
                 return render(request, "pages/addme.html", {'organization': organization})
             
-            # Create trainer for this specific organization
-            trainer = Trainer.objects.create(
-                organization=organization,
-                first_name=first_name,
-                last_name=last_name,
-                birth_day=birthday,
-                phone=phone,
-                phone_parent=phone_parent,
-                email=email,
-                address=address,
-                CIN=cin,
-                male_female=gender,
-                belt_degree=belt,
-                Degree=education,
-                category=category,
-                started_day=datetime.today(),
-                image=upload,
-                tall=height,
-                weight=weight
-            )
-            
-            # Handle document uploads (optional)
-            if national_id_doc:
-                TrainerDocument.objects.create(
-                    trainer=trainer,
-                    document_type='بطاقة الوطنية',
-                    file=national_id_doc
-                )
-            
-            if civil_status_doc:
-                TrainerDocument.objects.create(
-                    trainer=trainer,
-                    document_type='الحالة المدنية',
-                    file=civil_status_doc
-                )
+            staged = []
+            try:
+                with transaction.atomic():
+                    # Create trainer for this specific organization
+                    trainer = Trainer(
+                        organization=organization,
+                        first_name=first_name,
+                        last_name=last_name,
+                        birth_day=birthday,
+                        phone=phone,
+                        phone_parent=phone_parent,
+                        email=email,
+                        address=address,
+                        CIN=cin,
+                        male_female=gender,
+                        belt_degree=belt,
+                        Degree=education,
+                        category=category,
+                        started_day=datetime.today(),
+                        tall=height,
+                        weight=weight
+                    )
+                    if upload:
+                        staged.append(stage_upload(trainer, 'image', upload))
+                    trainer.save()
+
+                    # Handle document uploads (optional)
+                    for document_type, uploaded in (
+                        ('بطاقة الوطنية', national_id_doc),
+                        ('الحالة المدنية', civil_status_doc),
+                    ):
+                        if uploaded:
+                            document = TrainerDocument(trainer=trainer, document_type=document_type)
+                            staged.append(stage_upload(document, 'file', uploaded))
+                            document.save()
+            except Exception:
+                # Rolled back: the uploads were never queued, nothing else removes these files
+                discard_staged(staged)
+                raise
             
             message = f"تمت إضافة المتدرب {first_name} إلى {organization.name} بنجاح"
             return render(request, "pages/sucss.html", {
@@ -326,107 +360,12 @@ def payment_edit(request, id):
         # إذا كانت الطلبية GET، عرض النموذج مع البيانات الحالية
         return render(request, "pages/edit_payment.html", {"payment": payment})
 
-from docx import Document
-from docx.oxml import parse_xml
-from docx.oxml.ns import qn
-from docx.enum.table import WD_ALIGN_VERTICAL
-from docx.enum.text import WD_ALIGN_PARAGRAPH, WD_BREAK
-from django.http import HttpResponse
-
-
-
-def add_table_borders(table):
-    tbl = table._element
-    borders = parse_xml(r'''
-    <w:tblBorders xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main">
-        <w:top w:val="single" w:sz="4" w:space="0" w:color="000000"/>
-        <w:left w:val="single" w:sz="4" w:space="0" w:color="000000"/>
-        <w:bottom w:val="single" w:sz="4" w:space="0" w:color="000000"/>
-        <w:right w:val="single" w:sz="4" w:space="0" w:color="000000"/>
-        <w:insideH w:val="single" w:sz="4" w:space="0" w:color="000000"/>
-        <w:insideV w:val="single" w:sz="4" w:space="0" w:color="000000"/>
-    </w:tblBorders>
-    ''')
-    tbl.tblPr.append(borders)
-
-
-def clone_table_style(src_table, dst_table):
-    dst_table.style = src_table.style
-    dst_table.autofit = src_table.autofit
-
-
-def copy_header_row(src_table, dst_table):
-
-    src_row = src_table.rows[0]
-    dst_row = dst_table.rows[0]
-
-    for i in range(len(src_row.cells)):
-        dst_cell = dst_row.cells[i]
-        dst_cell.vertical_alignment = WD_ALIGN_VERTICAL.CENTER
-
-        # Clear default content and use bold text
-        paragraph = dst_cell.paragraphs[0]
-        paragraph.clear()
-        run = paragraph.add_run(src_row.cells[i].text)
-        run.bold = True
-        paragraph.alignment = WD_ALIGN_PARAGRAPH.CENTER
-
-def update_word_table(word_file_path, payments, payment_category='assurance'):
-    """
-    Open Word document, clear existing table, and populate with new data.
-    Starts a new table every 18 rows, each on a new page, preserving original table style and headers.
-    """
-    doc = Document(word_file_path)
-
-    # Get the original table and its style
-    original_table = doc.tables[0]
-
-    # Clear all rows except the header
-    for i in range(len(original_table.rows) - 1, 0, -1):
-        original_table._element.remove(original_table.rows[i]._element)
-
-    table = original_table
-    add_table_borders(table)
-
-    for i, p in enumerate(payments, start=1):
-        if i > 1 and (i) % 16 == 0:
-            # start a new page
-            # Add new table
-            table = doc.add_table(rows=1, cols=5) 
-            table.autofit = original_table.autofit
-            clone_table_style(original_table, table)
-            add_table_borders(table)
-            copy_header_row(original_table, table)
-
-        row = table.add_row()
-        
-        cell_texts = [
-            str(i),
-            f"{p.trainer.last_name}",
-            f"{p.trainer.first_name}",
-            f" ",
-            f"{p.trainer.birth_day}",
-        ]
-
-        for cell, text in zip(row.cells, cell_texts):
-            cell.text = text
-            cell.vertical_alignment = WD_ALIGN_VERTICAL.CENTER  # Vertical centering
-            for paragraph in cell.paragraphs:
-                paragraph.alignment = WD_ALIGN_PARAGRAPH.CENTER  # Horizontal centering
-
-    # Prepare the Word response
-    response = HttpResponse(content_type='application/vnd.openxmlformats-officedocument.wordprocessingml.document')
-    response['Content-Disposition'] = f'attachment; filename="payments_{payment_category}_{datetime.today()}.docx"'
-    doc.save(response)
-
-    return response
-
-
-import xlwt
 from django.http import HttpResponse
 
 @login_required(login_url='/login/')
 @require_organization
+@throttle('export', max_concurrent=2)
+@timed('export_xls')
 def export_xls(request):
     organization = request.organization
     payment_category = request.GET.get("category")
@@ -434,10 +373,8 @@ def export_xls(request):
     end_date = request.GET.get("end_date")
     trainer_category = request.GET.get("trainer_category")
 
-    payments = Payments.objects.select_related('trainer').all()
-
+    payments = Payments.objects.select_related('trainer').filter(organization=organization)
 
-    
     if payment_category and payment_category != "all":
         payments = payments.filter(organization=organization, paymentCategry=payment_category)
     
@@ -446,45 +383,20 @@ def export_xls(request):
         if end_date and end_date != "None":
             payments = payments.filter(organization=organization, paymentdate__lte=end_date)
     if payment_category == 'assurance':
-        current_dir = os.path.dirname(os.path.abspath(__file__))
-        word_file_path = os.path.join(current_dir, "NOJOUM ARGANA ASSURANCE  N°14.docx")
-        
-        # Update the Word document
-        return update_word_table(word_file_path, payments, payment_category)
-        
-        
+        from .payments.assurance_roster import build_assurance_roster
+
+        # Word roster built from the cached template
+        response = HttpResponse(content_type='application/vnd.openxmlformats-officedocument.wordprocessingml.document')
+        response['Content-Disposition'] = f'attachment; filename="payments_{payment_category}_{datetime.today()}.docx"'
+        response.write(build_assurance_roster(payments))
+        return response
+
     else:
-        # Define header style
-        header_style = xlwt.XFStyle()
-        header_font = xlwt.Font()
-        header_font.bold = True
-        header_style.font = header_font
-        wb = xlwt.Workbook(encoding='utf-8')
-        ws = wb.add_sheet('Payments')
-    
-        # Define header style
-        header_style = xlwt.XFStyle()
-        header_font = xlwt.Font()
-        header_font.bold = True
-        header_style.font = header_font
-       
-        # Headers
-        columns = ['المدرب', 'فئة المتدرب', 'تاريخ الدفع', 'نوع الدفع', 'المبلغ']
-        for col_num, column_title in enumerate(columns):
-            ws.write(0, col_num, column_title, header_style)
-
-        # Data rows
-        for row_num, p in enumerate(payments, start=1):
-            ws.write(row_num, 0, f"{p.trainer.first_name} {p.trainer.last_name}")
-            ws.write(row_num, 1, p.trainer.get_category_display())
-            ws.write(row_num, 2, p.paymentdate.strftime("%Y-%m-%d"))
-            ws.write(row_num, 3, p.get_paymentCategry_display())
-            ws.write(row_num, 4, p.paymentAmount)
-        
+        from .spreadsheets import write_payments_xls
+
         response = HttpResponse(content_type='application/ms-excel')
         response['Content-Disposition'] = f'attachment; filename="payments_{datetime.today()}.xls"'
-
-        wb.save(response)
+        write_payments_xls(payments, response)
         return response
     
 @login_required(login_url='/login/')
@@ -574,19 +486,13 @@ def download_documents(request):
     end_date = request.GET.get("end_date")
     trainer_category = request.GET.get("trainer_category")
 
-    payments = Payments.objects.select_related('trainer').filter(organization=organization)
-
-    if payment_category:
-        payments = payments.filter(organization=organization,paymentCategry=payment_category)
-
-    if start_date:
-        payments = payments.filter(organization=organization,paymentdate__gte=start_date)
-
-    if end_date:
-        payments = payments.filter(organization=organization,paymentdate__lte=end_date)
-
-    if trainer_category:
-        payments = payments.filter(organization=organization,trainer__category=trainer_category)
+    payments = filter_report_payments(
+        organization,
+        payment_category=payment_category,
+        start_date=start_date,
+        end_date=end_date,
+        trainer_category=trainer_category,
+    )
 
     context = {
         "payments": payments,
@@ -662,8 +568,7 @@ def trainee_profile(request, id):
             try:
                 doc = TrainerDocument.objects.get(id=doc_id, trainer=trainer)
                 doc_type = doc.document_type
-                doc.file.delete()  # Delete the file from storage
-                doc.delete()  # Delete the database record
+                doc.delete()  # Delete the database record (file removal is queued)
                 messages.success(request, f"تم حذف {doc_type} بنجاح")
             except TrainerDocument.DoesNotExist:
                 messages.error(request, "الوثيقة غير موجودة")
@@ -901,6 +806,7 @@ def subscription_renew_view(request):
                 recipient_list=[settings.ADMIN_EMAIL],  # Configure this
                 fail_silently=False,
             )
+            count_emails('renewal_request', 1)
             
             messages.success(
                 request,
@@ -909,6 +815,7 @@ def subscription_renew_view(request):
             return redirect('subscription_status')
             
         except Exception as e:
+            count_emails('renewal_request', 0, failed=1)
             messages.error(
                 request,
                 f'حدث خطأ أثناء إرسال الطلب: {str(e)}'
@@ -1367,6 +1274,7 @@ def logout_view(request):
         return redirect('login')
 
 
+@query_budget(max_queries=15)
 @login_required(login_url='/login/')
 @require_organization
 def dashboard(request):
@@ -1402,42 +1310,46 @@ def dashboard(request):
         payment_status = {}
 
         for category, category_info in payment_categories.items():
-            trainers = Trainer.objects.filter(organization=organization, is_active=True)
+            # Last payment date of every trainer in this category, in the same query
+            trainers = Trainer.objects.filter(organization=organization, is_active=True).annotate(
+                last_paymentdate=Subquery(
+                    Payments.objects.filter(
+                        organization=organization,
+                        trainer=OuterRef('pk'),
+                        paymentCategry=category
+                    ).order_by('-paymentdate').values('paymentdate')[:1]
+                )
+            ).only('first_name', 'last_name')
             unpaid_trainers = []
 
             for trainer in trainers:
-                # Retrieve the last payment for the trainer in this category
-                last_payment = Payments.objects.filter(
-                    organization=organization,
-                    trainer=trainer,
-                    paymentCategry=category
-                ).order_by('-paymentdate').first()
+                last_paymentdate = trainer.last_paymentdate
 
-                if last_payment:
+                if last_paymentdate:
                     payment_due_date = None
                     
                     if category_info['frequency'] == 'monthly':
                         # Get the last day of the month for the last payment
                         last_day_of_payment_month = calendar.monthrange(
-                            last_payment.paymentdate.year, 
-                            last_payment.paymentdate.month
+                            last_paymentdate.year, 
+                            last_paymentdate.month
                         )[1]  # E.g., 28, 29, 30, or 31
-                        payment_due_date = last_payment.paymentdate.replace(
-                            day=min(last_payment.paymentdate.day,last_day_of_payment_month),
+                        payment_due_date = last_paymentdate.replace(
+                            day=min(last_paymentdate.day,last_day_of_payment_month),
                             month=today.month,
                             year=today.year
                         )
                     
                     elif category_info['frequency'] == 'yearly':
-                        payment_due_date = last_payment.paymentdate.replace(
-                            year=last_payment.paymentdate.year + 1
+                        payment_due_date = last_paymentdate.replace(
+                            year=last_paymentdate.year + 1
                         ) + timedelta(days=category_info['grace_days'])
 
                     # Check if payment is overdue
                     if today > payment_due_date:
                         unpaid_trainers.append({
                             'trainer_name': f"{trainer.first_name} {trainer.last_name}",
-                            'last_payment_date': last_payment.paymentdate
+                            'last_payment_date': last_paymentdate
                         })
                         
                         
@@ -1633,11 +1545,10 @@ def edit_article(request, id):
     return render(request, 'pages/edit_article.html', context)
 
 
-import pandas as pd
-
-
 @login_required(login_url='/login/')
 @require_organization
+@throttle('export', max_concurrent=2)
+@timed('export_data')
 def export_data(request,category):
     organization = request.organization
     data = None
@@ -1657,17 +1568,16 @@ def export_data(request,category):
         messages.error(request, 'الفئة غير معروفة')
     # Query the Person model to get all records
     if data:
-        # Convert the QuerySet to a DataFrame
-        df = pd.DataFrame(list(data))
-        # Define the Excel file response
+        from .spreadsheets import write_rows_xlsx
+
         response = HttpResponse(content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
         response['Content-Disposition'] = f'attachment; filename={category}.xlsx'
-        # Use Pandas to write the DataFrame to an Excel file
-        df.to_excel(response, index=False, engine='openpyxl')
+        write_rows_xlsx(data, response)
         return response
 
 
 from datetime import datetime, timedelta
+@query_budget(max_queries=10)
 @login_required(login_url='/login/')
 @require_organization
 def unpaid_trainees(request):
@@ -1711,15 +1621,14 @@ def unpaid_trainees(request):
             # Exclude trainees who have made ANY payment during the selected month
             unpaid_trainees = all_trainees.exclude(id__in=paid_trainees_ids)
 
-            # Fetch the last payment date for each unpaid trainee
-            last_payment_dates = {}
-            for trainee in unpaid_trainees:
-                last_payment = Payments.objects.filter(trainer=trainee, paymentCategry='month', organization=org).order_by('-paymentdate').first()
-                last_payment_dates[trainee] = last_payment.paymentdate if last_payment else None
-
-            # Attach last payment date to each trainee
-            for trainee in unpaid_trainees:
-                trainee.last_payment_date = last_payment_dates.get(trainee, None)
+            # Last monthly payment date of each unpaid trainee, in the same query
+            unpaid_trainees = unpaid_trainees.annotate(
+                last_payment_date=Subquery(
+                    Payments.objects.filter(
+                        trainer=OuterRef('pk'), paymentCategry='month', organization=org
+                    ).order_by('-paymentdate').values('paymentdate')[:1]
+                )
+            )
 
             return render(request, 'pages/unpaid_trainees.html', {
                 'unpaid_trainees': unpaid_trainees,
@@ -1737,38 +1646,34 @@ def unpaid_trainees(request):
         'months': months,
     })
 
-import openpyxl  
-# adjust to your actual model import
-
 #upload trainers from excel
 @login_required(login_url='/login/')
 @require_organization
+@timed('import_trainers_excel')
 def upload_trainers_excel(request):
     org = request.organization
     if request.method == 'POST' and request.FILES.get('excel_file'):
         excel_file = request.FILES['excel_file']
+        from .spreadsheets import iter_sheet_rows
 
         try:
-            wb = openpyxl.load_workbook(excel_file)
-            sheet = wb.active
-
             added_count = 0
-            for i, row in enumerate(sheet.iter_rows(min_row=2), start=2):  # Skip header
+            for i, row in iter_sheet_rows(excel_file):  # Skip header
                 try:
-                    first_name = row[0].value
-                    last_name = row[1].value
-                    birthday = row[2].value
-                    gender = row[3].value
-                    phone = row[4].value or 0
-                    phone_parent = row[5].value or 0
-                    email = row[6].value or "None@email.com"
-                    address = row[7].value or org.location
-                    cin = row[8].value or "لا يوجد"
-                    education = row[9].value
-                    belt = row[10].value
-                    category = row[11].value
-                    height = row[12].value or 0
-                    weight = row[13].value or 0
+                    first_name = row[0]
+                    last_name = row[1]
+                    birthday = row[2]
+                    gender = row[3]
+                    phone = row[4] or 0
+                    phone_parent = row[5] or 0
+                    email = row[6] or "None@email.com"
+                    address = row[7] or org.location
+                    cin = row[8] or "لا يوجد"
+                    education = row[9]
+                    belt = row[10]
+                    category = row[11]
+                    height = row[12] or 0
+                    weight = row[13] or 0
 
                     if first_name and last_name and birthday and gender and education and category:
                         Trainer.objects.create(
@@ -1803,23 +1708,22 @@ def upload_trainers_excel(request):
 
 @login_required(login_url='/login/')
 @require_organization
+@timed('import_payments_excel')
 def upload_payments_excel(request):
 
     org = request.organization
     if request.method == 'POST' and request.FILES.get('excel_file'):
         excel_file = request.FILES['excel_file']
+        from .spreadsheets import iter_sheet_rows
 
         try:
-            wb = openpyxl.load_workbook(excel_file)
-            sheet = wb.active
-
             added = 0
-            for i, row in enumerate(sheet.iter_rows(min_row=2), start=2):  # skip headers
+            for i, row in iter_sheet_rows(excel_file):  # skip headers
                 try:
-                    trainer_id = row[0].value
-                    payment_date = row[1].value or datetime.today()
-                    payment_category = row[2].value or 'month'
-                    payment_amount = row[3].value or 0
+                    trainer_id = row[0]
+                    payment_date = row[1] or datetime.today()
+                    payment_category = row[2] or 'month'
+                    payment_amount = row[3] or 0
 
                     trainer = Trainer.objects.get(id=trainer_id)
 
@@ -1933,6 +1837,7 @@ from django.http import JsonResponse
 from django.views.decorators.http import require_http_methods
 
 @require_http_methods(["GET"])
+@throttle('availability')
 def check_username(request):
     """
     API endpoint to check if username is available
@@ -1952,8 +1857,8 @@ def check_username(request):
             'message': 'اسم المستخدم يجب أن يكون 3 أحرف على الأقل'
         })
     
-    # Check if username exists
-    if User.objects.filter(username=username).exists():
+    # Check if username exists (Bloom filter, DB only on a possible hit)
+    if is_taken('username', username):
         return JsonResponse({
             'available': False,
             'message': 'اسم المستخدم موجود بالفعل'
@@ -1966,6 +1871,7 @@ def check_username(request):
 
 
 @require_http_methods(["GET"])
+@throttle('availability')
 def check_slug(request):
     """
     API endpoint to check if organization slug is available
@@ -1995,8 +1901,8 @@ def check_slug(request):
             'message': 'المعرف يجب أن يحتوي على حروف إنجليزية صغيرة وأرقام وشرطات فقط'
         })
     
-    # Check if slug exists
-    if OrganizationInfo.objects.filter(slug=slug).exists():
+    # Check if slug exists (Bloom filter, DB only on a possible hit)
+    if is_taken('slug', slug):
         return JsonResponse({
             'available': False,
             'message': 'المعرف مستخدم بالفعل'
@@ -2150,6 +2056,7 @@ def signup(request):
     return render(request, 'pages/signup.html')
 
 
+@throttle('availability')
 def check_username_availability(request):
     """
     AJAX endpoint to check if username is available
@@ -2162,7 +2069,7 @@ def check_username_availability(request):
             'message': 'اسم المستخدم يجب أن يكون 3 أحرف على الأقل'
         })
     
-    available = not User.objects.filter(username=username).exists()
+    available = not is_taken('username', username)
     
     return JsonResponse({
         'available': available,
@@ -2170,6 +2077,7 @@ def check_username_availability(request):
     })
 
 
+@throttle('availability')
 def check_slug_availability(request):
     """
     AJAX endpoint to check if organization slug is available
@@ -2183,7 +2091,7 @@ def check_slug_availability(request):
             'message': 'المعرف غير صالح'
         })
     
-    available = not OrganizationInfo.objects.filter(slug=slug).exists()
+    available = not is_taken('slug', slug)
     
     return JsonResponse({
         'available': available,
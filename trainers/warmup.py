@@ -0,0 +1,152 @@
+"""
+Warm start
+warm_process() does the per-process work every worker would otherwise repeat
+on its first requests: URL resolver, compiled templates, invoice fonts.
+Run in the gunicorn master (preload_app), it is inherited by every forked
+worker. warm_organization() fills the dashboard/report caches of one
+organization by calling the API views themselves, so keys and payloads are
+exactly the ones the views read.
+"""
+import logging
+import os
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache, caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import connections
+from django.db.models import Q
+from django.template import TemplateDoesNotExist, TemplateSyntaxError, engines
+from django.test import RequestFactory
+from django.urls import get_resolver
+from django.utils import timezone
+
+from .models import OrganizationInfo, Staff
+
+logger = logging.getLogger(__name__)
+
+
+# ======================================================
+# Process warm-up (before fork)
+# ======================================================
+
+def _project_templates():
+    """(engine, template name) for every .html under BASE_DIR template dirs"""
+    for engine in engines.all():
+        for directory in engine.template_dirs:
+            directory = str(directory)
+            if not directory.startswith(str(settings.BASE_DIR)):
+                continue  # admin & third-party templates compile on demand
+            for root, _dirs, files in os.walk(directory):
+                for filename in files:
+                    if filename.endswith('.html'):
+                        yield engine, os.path.relpath(os.path.join(root, filename), directory)
+
+
+def warm_process():
+    """Populate per-process caches; returns {step: seconds} + templates_compiled"""
+    timings = {}
+
+    started = time.perf_counter()
+    get_resolver().reverse_dict  # property: populates the resolver
+    timings['urls'] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    compiled = 0
+    for engine, name in _project_templates():
+        try:
+            engine.get_template(name)  # kept by the cached template loader
+            compiled += 1
+        except (TemplateDoesNotExist, TemplateSyntaxError) as e:
+            logger.warning('warm_process: %s: %s', name, e)
+    timings['templates'] = time.perf_counter() - started
+    timings['templates_compiled'] = compiled
+
+    started = time.perf_counter()
+    try:
+        from .payments.invoice_template import get_invoice_template
+        get_invoice_template()  # ReportLab, TTF fonts, logo
+    except RuntimeError as e:
+        logger.warning('warm_process: invoice template: %s', e)
+    timings['invoice_fonts'] = time.perf_counter() - started
+
+    # Never hand an open database connection to forked workers
+    connections.close_all()
+    return timings
+
+
+# ======================================================
+# Cache warm-up (dashboard & financial report)
+# ======================================================
+
+def cache_is_shared():
+    """False when every process has its own cache (LocMem)"""
+    return not isinstance(caches['default'], LocMemCache)
+
+
+def recent_organizations(days):
+    """Active organizations with a payment or a staff login in the last `days` days"""
+    since = timezone.now() - timedelta(days=days)
+    return list(
+        OrganizationInfo.objects.filter(is_active=True).filter(
+            Q(payments__paymentdate__gte=since.date()) | Q(staff_members__user__last_login__gte=since)
+        ).distinct().order_by('id').values_list('id', flat=True)
+    )
+
+
+def _requests():
+    """(view, query params) the dashboard and the financial report load first"""
+    from .index_views import api_chart_data, api_kpis, api_paid_today, api_payment_status
+    from .payments.payments_views import api_financial_report, api_timeseries
+
+    today = timezone.now().date()
+    requests = [(api_kpis, {'period': period}) for period in ('today', 'week', 'month', 'year')]
+    requests += [
+        (api_chart_data, {}),
+        (api_payment_status, {}),
+        (api_paid_today, {}),
+        # financial_report.js default range: the current calendar year
+        (api_financial_report, {'start': f'{today.year}-01-01', 'end': f'{today.year}-12-31'}),
+        (api_timeseries, {'start': f'{today.year}-01-01', 'end': f'{today.year}-12-31', 'bucket': 'month',
+                          'fields': 'label,income,expenses,fixed_costs'}),
+    ]
+    return requests
+
+
+def warm_organization(organization_id, refresh=False):
+    """Compute the cached API payloads of one organization; returns (id, seconds, errors)"""
+    from .index_views import clear_organization_cache
+    from .payments.payments_views import (
+        api_financial_report, api_timeseries, financial_report_cache_key, timeseries_cache_key,
+    )
+
+    started = time.perf_counter()
+    organization = OrganizationInfo.objects.get(pk=organization_id)
+    staff = Staff.objects.filter(organization=organization).order_by('-is_admin', 'id').first()
+    user = staff.user if staff else User(is_active=True)
+
+    requests = _requests()
+    if refresh:
+        clear_organization_cache(organization.id)
+        report = dict(requests)[api_financial_report]
+        cache.delete(financial_report_cache_key(organization.id, report['start'], report['end']))
+        series = dict(requests)[api_timeseries]
+        cache.delete(timeseries_cache_key(
+            organization.id, series['start'], series['end'], series['bucket'], series['fields'].split(',')
+        ))
+
+    factory = RequestFactory()
+    errors = 0
+    for view, params in requests:
+        request = factory.get('/', params)
+        request.user = user
+        request.organization = organization
+        try:
+            response = view(request)
+            errors += response.status_code != 200
+        except Exception:
+            logger.exception('warm_organization: %s %s', organization.slug, view.__name__)
+            errors += 1
+    return organization_id, time.perf_counter() - started, errors